@@ -0,0 +1,195 @@
+# audiocache.py
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import urllib.error
+import urllib.request
+import queue as queue_mod
+from collections import OrderedDict
+from utils import safe_write_json
+
+CHUNK = 10 * 1024 * 1024    # googlevideo throttles big single GETs, pull it in ranges like yt-dlp
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0"
+
+_SAFE_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def _filename(key):
+    if not _SAFE_RE.match(key):
+        key = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return key + ".audio"
+
+def download(url, dest, chunk=CHUNK, timeout=30):
+    # ranged GETs into dest.part, renamed into place only when complete
+    tmp = dest + ".part"
+    pos = 0
+    total = None
+    with open(tmp, "wb") as f:
+        while total is None or pos < total:
+            req = urllib.request.Request(url, headers={
+                "User-Agent": USER_AGENT,
+                "Range": f"bytes={pos}-{pos + chunk - 1}",
+            })
+            try:
+                resp = urllib.request.urlopen(req, timeout=timeout)
+            except urllib.error.HTTPError as e:
+                if e.code == 416 and pos > 0:
+                    break   # asked past the end of a file with unknown length
+                raise
+            with resp:
+                rng = resp.headers.get("Content-Range")
+                if rng and "/" in rng and rng.rsplit("/", 1)[1].isdigit():
+                    total = int(rng.rsplit("/", 1)[1])
+                data = resp.read()
+                if resp.status == 200:
+                    # server ignored Range: that's the whole file
+                    total = len(data)
+                    f.seek(0)
+                    f.truncate()
+                    pos = 0
+            if not data:
+                break
+            f.write(data)
+            pos += len(data)
+    os.replace(tmp, dest)
+    return pos
+
+
+class AudioCache:
+    # video id -> downloaded audio file, LRU evicted down to budget bytes
+    def __init__(self, root, budget=512 * 1024 * 1024):
+        self.root = root
+        self.budget = budget
+        self.index_path = os.path.join(root, "index.json")
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # key -> {"file", "size", "atime"}, oldest first
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._pending = set()
+        self._jobs = queue_mod.Queue()
+        self._worker = None
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            data = {}
+        known = set()
+        for key, ent in sorted(data.items(), key=lambda kv: kv[1].get("atime", 0)):
+            if os.path.exists(os.path.join(self.root, ent["file"])):
+                self._entries[key] = ent
+                known.add(ent["file"])
+        # leftovers from a crash mid-download / files the index lost track of;
+        # only our own names, the dir may be shared with anything else
+        for fn in os.listdir(self.root):
+            if fn.endswith((".audio", ".audio.part")) and fn not in known:
+                try:
+                    os.remove(os.path.join(self.root, fn))
+                except OSError:
+                    pass
+        self._evict()
+
+    def _save(self):
+        with self._lock:
+            data = dict(self._entries)
+        with self._save_lock:
+            try:
+                safe_write_json(self.index_path, data)
+            except Exception:
+                pass
+
+    def used(self):
+        with self._lock:
+            return sum(e["size"] for e in self._entries.values())
+
+    def path_for(self, key):
+        with self._lock:
+            ent = self._entries.get(key)
+            if ent is None:
+                self.misses += 1
+                return None
+            path = os.path.join(self.root, ent["file"])
+            if not os.path.exists(path):
+                del self._entries[key]
+                self.misses += 1
+                return None
+            ent["atime"] = time.time()
+            self._entries.move_to_end(key)
+            self.hits += 1
+        self._save()
+        return path
+
+    def remove(self, key):
+        with self._lock:
+            ent = self._entries.pop(key, None)
+        if ent:
+            try:
+                os.remove(os.path.join(self.root, ent["file"]))
+            except OSError:
+                pass
+            self._save()
+
+    def fetch(self, key, stream_url):
+        # background download, one at a time; no-op if cached or already queued
+        with self._lock:
+            if key in self._entries or key in self._pending:
+                return
+            self._pending.add(key)
+        self._jobs.put((key, stream_url))
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._download_loop, daemon=True)
+            self._worker.start()
+
+    def _download_loop(self):
+        while True:
+            key, url = self._jobs.get()
+            fn = _filename(key)
+            dest = os.path.join(self.root, fn)
+            try:
+                size = download(url, dest)
+            except Exception:
+                size = None
+                try:
+                    os.remove(dest + ".part")
+                except OSError:
+                    pass
+            with self._lock:
+                self._pending.discard(key)
+                if size:
+                    self._entries[key] = {"file": fn, "size": size, "atime": time.time()}
+                    self._entries.move_to_end(key)
+            if size:
+                self._evict()
+                self._save()
+
+    def _evict(self):
+        victims = []
+        with self._lock:
+            total = sum(e["size"] for e in self._entries.values())
+            while total > self.budget and self._entries:
+                key, ent = self._entries.popitem(last=False)
+                total -= ent["size"]
+                victims.append(ent["file"])
+        for fn in victims:
+            try:
+                os.remove(os.path.join(self.root, fn))
+            except OSError:
+                pass
+        return len(victims)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "bytes": sum(e["size"] for e in self._entries.values()),
+                "budget": self.budget,
+                "hits": self.hits,
+                "misses": self.misses,
+                "pending": len(self._pending),
+            }
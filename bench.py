@@ -0,0 +1,682 @@
+# bench.py
+# python bench.py [name ...] [--out results.jsonl]  -> one JSON object per benchmark
+# python bench.py --compare old.jsonl new.jsonl
+# Everything except 'startup' runs offline against benchfakes.py / fakempv.py.
+import os
+import sys
+import json
+import time
+import pty
+import select
+import statistics
+import subprocess
+import argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "min": samples[0],
+        "median": statistics.median(samples),
+        "max": samples[-1],
+    }
+
+def _first_frame_once(root, timeout=20.0):
+    # run main.py in a pty, time until the header line shows up; root is an
+    # isolated_env() dir, so the user's session, downloads and mpv socket are
+    # never touched
+    t0 = time.perf_counter()
+    pid, fd = pty.fork()
+    if pid == 0:
+        os.environ.setdefault("TERM", "xterm-256color")
+        os.environ["TMPDIR"] = root     # mpv ipc socket
+        os.chdir(HERE)
+        os.execvp(sys.executable, [sys.executable, "main.py"])
+    out = b""
+    elapsed = None
+    try:
+        while time.perf_counter() - t0 < timeout:
+            r, _, _ = select.select([fd], [], [], 0.05)
+            if not r:
+                continue
+            try:
+                out += os.read(fd, 65536)
+            except OSError:
+                break
+            if b"Termux Music Player" in out:
+                elapsed = time.perf_counter() - t0
+                break
+        os.write(fd, b"q")
+        end = time.perf_counter() + 5
+        while time.perf_counter() < end:
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                break
+            r, _, _ = select.select([fd], [], [], 0.05)
+            if r:
+                try:
+                    os.read(fd, 65536)
+                except OSError:
+                    pass
+        else:
+            os.kill(pid, 9)
+            os.waitpid(pid, 0)
+    finally:
+        os.close(fd)
+    return elapsed
+
+def _import_time(stmt):
+    code = f"import time; t = time.perf_counter(); {stmt}; print(time.perf_counter() - t)"
+    res = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True)
+    if res.returncode != 0:
+        return None
+    return float(res.stdout.strip())
+
+def bench_startup(runs=5):
+    from benchfakes import isolated_env
+    with isolated_env() as root:
+        frames = [t for t in (_first_frame_once(root) for _ in range(runs)) if t is not None]
+    result = {
+        "bench": "startup",
+        "first_frame_s": _summary(frames) if frames else None,
+        "import_player_s": _import_time("import player"),
+        "import_yt_dlp_s": _import_time("import yt_dlp"),
+    }
+    try:
+        import miniytdlp
+        t = time.perf_counter()
+        miniytdlp._ytdlp()
+        result["lazy_import_s"] = time.perf_counter() - t
+        fresh, reused = [], []
+        for _ in range(runs):
+            t = time.perf_counter()
+            miniytdlp._ytdlp().YoutubeDL(dict(miniytdlp.RESOLVE_OPTS))
+            fresh.append(time.perf_counter() - t)
+        pool = miniytdlp._resolve_pool
+        pool.release(pool.acquire())
+        for _ in range(runs):
+            t = time.perf_counter()
+            pool.release(pool.acquire())
+            reused.append(time.perf_counter() - t)
+        result["ydl_new_instance_s"] = _summary(fresh)
+        result["ydl_pooled_instance_s"] = _summary(reused)
+    except ImportError as e:
+        result["error"] = str(e)
+    return result
+
+def _fake_dicts(n):
+    return [{"title": f"Track {i} - Some Artist feat. Someone Else", "duration_str": f"{i % 10}:{i % 60:02d}",
+             "url": f"https://www.youtube.com/watch?v={i:011d}"} for i in range(n)]
+
+def _fake_queue(n):
+    from track import Track
+    return [Track.from_dict(d) for d in _fake_dicts(n)]
+
+def bench_playlist(sizes=(10_000, 100_000)):
+    import tempfile
+    import playlists
+    from utils import safe_write_json
+    result = {"bench": "playlist"}
+    with tempfile.TemporaryDirectory() as d:
+        for n in sizes:
+            q = _fake_queue(n)
+            jl = os.path.join(d, f"p{n}.jsonl")
+            js = os.path.join(d, f"p{n}.json")
+            r = {}
+            t = time.perf_counter()
+            playlists.save_playlist_to(jl, q)
+            r["save_jsonl_s"] = time.perf_counter() - t
+            t = time.perf_counter()
+            safe_write_json(js, [t.to_dict() for t in q])
+            r["save_json_s"] = time.perf_counter() - t
+            more = q + _fake_queue(100)
+            t = time.perf_counter()
+            playlists.save_playlist_to(jl, more, previous=q)
+            r["append_100_s"] = time.perf_counter() - t
+            t = time.perf_counter()
+            next(playlists.iter_playlist_batches(jl))
+            r["first_batch_jsonl_s"] = time.perf_counter() - t
+            t = time.perf_counter()
+            loaded = playlists.load_playlist_from(jl)
+            r["load_jsonl_s"] = time.perf_counter() - t
+            t = time.perf_counter()
+            playlists.load_playlist_from(js)
+            r["load_json_s"] = time.perf_counter() - t
+            r["entries"] = len(loaded)
+            r["save_entries_per_s"] = n / r["save_jsonl_s"]
+            r["load_entries_per_s"] = len(loaded) / r["load_jsonl_s"]
+            r["bytes_jsonl"] = os.path.getsize(jl)
+            r["bytes_json"] = os.path.getsize(js)
+            result[str(n)] = r
+    return result
+
+def bench_queue(n=100_000):
+    # memory of dict entries vs Track, and shuffle toggle: copy+shuffle vs ShuffleOrder
+    import random
+    import tracemalloc
+    from track import ShuffleOrder
+    result = {"bench": "queue", "entries": n}
+    for name, make in (("dict", _fake_dicts), ("track", _fake_queue)):
+        tracemalloc.start()
+        q = make(n)
+        result[f"{name}_bytes"] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del q
+    q = _fake_queue(n)
+    t = time.perf_counter()
+    copy = list(q)
+    random.shuffle(copy)
+    result["toggle_copy_shuffle_s"] = time.perf_counter() - t
+    t = time.perf_counter()
+    order = ShuffleOrder(n, n // 2)
+    result["toggle_shuffle_order_s"] = time.perf_counter() - t
+    t = time.perf_counter()
+    for _ in range(1000):
+        order.jump(order.peek(1, wrap=True))
+    result["next_x1000_s"] = time.perf_counter() - t
+    t = time.perf_counter()
+    order = None
+    result["toggle_off_s"] = time.perf_counter() - t
+    return result
+
+def _wait(pred, timeout=15.0, step=0.002):
+    end = time.perf_counter() + timeout
+    while time.perf_counter() < end:
+        if pred():
+            return True
+        time.sleep(step)
+    return False
+
+def _time_to_audio(p, index, timeout=15.0):
+    # the player's own play_to_audio span; the snapshot only moves once a second
+    hist = lambda: p.metrics.hists.get("play_to_audio")
+    before = hist().count if hist() else 0
+    p.play_index(index)
+    ok = _wait(lambda: hist() is not None and hist().count > before, timeout)
+    return hist().samples[-1] if ok else None
+
+def bench_play(resolve_latency=0.5, runs=3):
+    # time from play_index to the first time-pos > 0 reported by (fake) mpv
+    from benchfakes import FakeYtdlp, isolated_env, make_player
+    result = {"bench": "play", "resolve_latency_s": resolve_latency}
+    with isolated_env(duration=30.0) as root, FakeYtdlp(resolve_latency=resolve_latency) as fake:
+        p = make_player(root)
+        p.add_items([(f"t{i}", "0:30", f"https://www.youtube.com/watch?v={i:011d}") for i in range(20)])
+        _wait(lambda: len(p.snapshot().queue) == 20)
+        cold = [_time_to_audio(p, i) for i in range(0, 2 * runs, 2)]
+        warm = [_time_to_audio(p, i) for i in range(0, 2 * runs, 2)]
+        result["cold_s"] = _summary([t for t in cold if t is not None])
+        result["cached_s"] = _summary([t for t in warm if t is not None])
+        # input burst: 10 play requests back to back
+        before = fake.resolves
+        t = time.perf_counter()
+        for i in range(10, 20):
+            p.play_index(i)
+        _wait(lambda: (lambda s: s.idx == 19 and not s.loading and s.elapsed > 0)(p.snapshot()))
+        result["burst10_s"] = time.perf_counter() - t
+        result["burst10_extractions"] = fake.resolves - before
+        result["stream_cache"] = p.stream_cache.stats()
+        result["spans"] = p.metrics.summary()
+        p.shutdown()
+    return result
+
+def bench_gap(tracks=6, duration=0.8, resolve_latency=0.3):
+    # track-to-track gap with prefetch + gapless handoff
+    from benchfakes import FakeYtdlp, isolated_env, make_player
+    with isolated_env() as root, FakeYtdlp(resolve_latency=resolve_latency, duration=duration):
+        p = make_player(root)
+        p.add_items([(f"t{i}", "0:01", f"https://www.youtube.com/watch?v={i:011d}") for i in range(tracks)])
+        _wait(lambda: len(p.snapshot().queue) == tracks)
+        p.play_index(0)
+        _wait(lambda: (lambda s: s.idx == tracks - 1 and not s.playing and not s.loading)(p.snapshot()),
+              timeout=tracks * (duration + resolve_latency) + 10)
+        gaps = list(p.gaps)
+        p.shutdown()
+    return {"bench": "gap", "tracks": tracks, "gaps_s": _summary(gaps) if gaps else None}
+
+def bench_profiles(tracks=5, duration=240.0, listen=2.0):
+    # bytes mpv reads per stream profile when tracks are skipped after `listen`
+    # seconds (readahead is what it costs), and the format each profile picks
+    from benchfakes import FakeYtdlp, isolated_env, make_player
+    from streamprofile import select_format, format_bytes
+    from utils import get_config_dir
+    from config import config_path
+    result = {"bench": "profiles", "tracks": tracks, "track_s": duration, "listen_s": listen}
+    for name in ("data-saver", "balanced", "best"):
+        with isolated_env() as root, FakeYtdlp(resolve_latency=0.05, duration=duration):
+            os.makedirs(get_config_dir(), exist_ok=True)
+            with open(config_path(), "w") as f:
+                json.dump({"stream_profile": name}, f)
+            p = make_player(root)
+            p.add_items([(f"t{i}", "4:00", f"https://www.youtube.com/watch?v={i:011d}") for i in range(tracks)])
+            _wait(lambda: len(p.snapshot().queue) == tracks)
+            for i in range(tracks):
+                p.play_index(i)
+                _wait(lambda: (lambda s: s.idx == i and not s.loading and s.elapsed > 0)(p.snapshot()))
+                time.sleep(listen)
+            p.stop()
+            _wait(lambda: p.stream_stats.tracks >= tracks, timeout=3)
+            fmt = select_format(FakeYtdlp.formats("x"), name)
+            result[name] = dict(p.stream_stats.summary(), format=fmt["format_id"],
+                                full_track_bytes=format_bytes(fmt, duration))
+            p.shutdown()
+    return result
+
+def bench_hedge(n=60, latency=0.15, slow_every=8, slow_latency=3.0, delay=0.5):
+    # time to stream url when every n-th default-client extraction hangs:
+    # one strategy vs hedging with a second client after `delay`
+    from benchfakes import FakeYtdlp
+    from metrics import Metrics
+    from resolver import HedgedResolver
+    result = {"bench": "hedge", "n": n, "latency_s": latency, "slow_every": slow_every,
+              "slow_latency_s": slow_latency, "delay_s": delay}
+    for label, clients in (("single", [None]), ("hedged", [None, "ios"])):
+        with FakeYtdlp(resolve_latency=latency, slow_every=slow_every, slow_latency=slow_latency) as fake:
+            m = Metrics()
+            r = HedgedResolver(m, clients, delay=delay)
+            times = []
+            for i in range(n):
+                t = time.perf_counter()
+                r.resolve(f"https://www.youtube.com/watch?v={i:011d}")
+                times.append(time.perf_counter() - t)
+            time.sleep(0.1)
+            times.sort()
+            result[label] = {"p50_s": times[len(times) // 2], "p95_s": times[int(len(times) * 0.95)],
+                             "p99_s": times[min(len(times) - 1, int(len(times) * 0.99))],
+                             "resolver": r.stats(), "cancelled": fake.cancelled,
+                             "per_strategy": {k: v for k, v in m.summary().items() if k.startswith("resolve:")}}
+            r.close()
+    return result
+
+def bench_search(latency=0.3):
+    from benchfakes import FakeYtdlp, isolated_env
+    from search import Searcher
+    import threading
+    result = {"bench": "search", "latency_s": latency}
+    with isolated_env(), FakeYtdlp(search_latency=latency) as fake:
+        import player
+        got = {}
+        done = threading.Event()
+        def on_update(query, results, final):
+            if results and "first" not in got:
+                got["first"] = time.perf_counter()
+            if final:
+                got["done"] = time.perf_counter()
+                done.set()
+        s = Searcher(lambda q, cb: player.search_youtube(q, max_results=8, on_result=cb), on_update, debounce=0.2)
+        for query in ("lofi", "lofi"):
+            got.clear()
+            done.clear()
+            t = time.perf_counter()
+            s.request(query)
+            done.wait(10)
+            key = "cold" if "cold_first_s" not in result else "cached"
+            result[f"{key}_first_s"] = got.get("first", t) - t
+            result[f"{key}_done_s"] = got.get("done", t) - t
+        # typing "lofi beats" one key at a time, 60 ms apart
+        before = fake.searches
+        for i in range(1, len("lofi beats") + 1):
+            s.request("lofi beats"[:i])
+            time.sleep(0.06)
+        time.sleep(0.2 + latency + 0.5)
+        result["typed_10_chars_searches"] = fake.searches - before
+    return result
+
+def _wide_queue(n):
+    # every third title CJK / emoji, two terminal cells per char
+    from track import Track
+    wide = ("東京の夜に聴きたい曲 — 夜行バス 🎧🌃", "아이유 (IU) - 밤편지 Through the Night 🌙", "周杰倫 晴天 Jay Chou 🎸")
+    return [Track(f"{wide[i % 3]} #{i}" if i % 3 == 0 else f"Track {i} - Some Artist feat. Someone Else",
+                  f"https://www.youtube.com/watch?v={i:011d}", 60 + i % 600) for i in range(n)]
+
+def bench_render(n=100_000, h=50, w=120):
+    # TUI frame times on a headless screen with a large queue; the scroll part
+    # pages through it top to bottom (titles partly double-width)
+    from benchfakes import FakeScreen, headless_curses, isolated_env, make_player
+    from ui import TUI
+    result = {"bench": "render", "queue": n, "size": [h, w]}
+    with isolated_env() as root, headless_curses():
+        p = make_player(root)
+        p.set_queue(_fake_queue(n))
+        _wait(lambda: len(p.snapshot().queue) == n)
+        scr = FakeScreen(h, w)
+        tui = TUI(scr, p)
+        tui.screen = "queue"
+        tui.cursor = n // 2
+        tui.render()
+        full, bar, move = [], [], []
+        for _ in range(50):
+            tui.invalidate()
+            t = time.perf_counter()
+            tui.render()
+            full.append(time.perf_counter() - t)
+            tui.mark("bar")
+            t = time.perf_counter()
+            tui.render()
+            bar.append(time.perf_counter() - t)
+            tui.cursor += 1
+            tui.mark("body")
+            t = time.perf_counter()
+            tui.render()
+            move.append(time.perf_counter() - t)
+        result["full_frame_s"] = _summary(full)
+        result["bar_frame_s"] = _summary(bar)
+        result["cursor_move_frame_s"] = _summary(move)
+        result["lines_written"] = tui.stats["lines"]
+        p.set_queue(_wide_queue(n))
+        _wait(lambda: p.snapshot().queue[0].title.startswith("東京"))
+        page = tui._body_end(h) - 5
+        scroll = {"top": [], "middle": [], "bottom": []}
+        tui.cursor = 0
+        while tui.cursor < n - 1:
+            tui.cursor = min(n - 1, tui.cursor + page)
+            tui.mark("body")
+            t = time.perf_counter()
+            tui.render()
+            part = "top" if tui.cursor < n // 3 else "middle" if tui.cursor < 2 * n // 3 else "bottom"
+            scroll[part].append(time.perf_counter() - t)
+        for _ in range(200):        # and back up one row at a time, mostly cached rows
+            tui.cursor -= 1
+            tui.mark("body")
+            t = time.perf_counter()
+            tui.render()
+            scroll["bottom"].append(time.perf_counter() - t)
+        result["scroll_frame_s"] = {k: _summary(v) for k, v in scroll.items()}
+        result["row_cache"] = {"hits": tui.queue_view.hits, "misses": tui.queue_view.misses}
+        result["addstr_errors"] = scr.errors
+        p.shutdown()
+    return result
+
+def bench_jump(n=100_000):
+    # fuzzy jump index: build, incremental append, per-keystroke query time
+    from queueindex import QueueIndex
+    from track import Track
+    q = _fake_queue(n)
+    ix = QueueIndex()
+    t = time.perf_counter()
+    ix.sync(q)
+    build = time.perf_counter() - t
+    more = q + [Track(f"Appended {i}", f"https://www.youtube.com/watch?v=a{i:010d}", 60) for i in range(2000)]
+    t = time.perf_counter()
+    ix.sync(more)
+    append = time.perf_counter() - t
+    times = []
+    for target in ("track 54321 some artist", "someone 777", "trakc 1234"):
+        for i in range(1, len(target) + 1):
+            t = time.perf_counter()
+            ix.search(target[:i], limit=200)
+            times.append(time.perf_counter() - t)
+    return {"bench": "jump", "queue": n, "build_s": build, "append_2000_s": append,
+            "keystroke_s": _summary(times)}
+
+def _tone_wav(path, secs, amp, rate=44100):
+    # stereo 16-bit noise-ish tone, written in 10 s pieces
+    import wave
+    import numpy as np
+    rng = np.random.default_rng(len(path))
+    with wave.open(path, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        for lo in range(0, int(secs), 10):
+            t = np.arange(lo * rate, min(secs, lo + 10) * rate) / rate
+            x = amp * (0.6 * np.sin(2 * np.pi * 440 * t) + 0.4 * rng.standard_normal(len(t)))
+            x = np.clip(x, -1, 1)
+            w.writeframes((np.stack([x, x], axis=1) * 32767).astype("<i2").tobytes())
+
+def bench_loudness(files=4, minutes=6):
+    # offline loudness analysis throughput (audio seconds per wall second), one worker
+    import tempfile
+    from loudness import analyze_file, available
+    if not available():
+        return {"bench": "loudness", "skipped": "numpy not installed"}
+    with tempfile.TemporaryDirectory() as d:
+        paths = []
+        for i in range(files):
+            p = os.path.join(d, f"track{i}.wav")
+            _tone_wav(p, minutes * 60, 0.05 * (i + 1))
+            paths.append(p)
+        per_file = []
+        levels = []
+        audio = 0.0
+        t0 = time.perf_counter()
+        for p in paths:
+            t = time.perf_counter()
+            r = analyze_file(p)
+            per_file.append(time.perf_counter() - t)
+            levels.append(r["lufs"])
+            audio += r["secs"]
+        wall = time.perf_counter() - t0
+    return {"bench": "loudness", "files": files, "audio_s": audio, "wall_s": wall,
+            "realtime_x": audio / wall, "per_file_s": _summary(per_file), "lufs": levels}
+
+def bench_session(n=100_000, hours=1):
+    # session journal: bytes written for a playlist load + an hour of playback
+    # + enrichment, vs rewriting the whole session on each change; replay time
+    import tempfile
+    from player import Snapshot
+    from session import SessionJournal
+    from track import Track
+    q = _fake_queue(n)
+    snap = lambda queue, idx, t: Snapshot(queue, idx, True, False, False, False, t, 200, 80, False, False, False)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "session.jsonl")
+        j = SessionJournal(path)
+        j.load()
+        j._file = open(path, "ab")
+        changes = 0
+        t = time.perf_counter()
+        cur = []
+        for lo in range(0, n, 2000):
+            cur = cur + q[lo:lo + 2000]
+            j._write(snap(cur, 0, 0))
+            changes += 1
+        for sec in range(hours * 3600):
+            idx = sec // 200
+            if sec % 60 == 0:
+                cur = list(cur)
+                cur[idx + 5] = Track("Enriched title", cur[idx + 5].url, 210)
+                changes += 1
+            j._write(snap(cur, idx, sec % 200))
+            changes += 1
+        write_s = time.perf_counter() - t
+        j._file.close()
+        full = len(json.dumps([t.to_dict() for t in cur], ensure_ascii=False))
+        stats = j.stats()
+        t = time.perf_counter()
+        state = SessionJournal(path).load()
+        replay = time.perf_counter() - t
+        assert len(state["queue"]) == n
+    return {"bench": "session", "queue": n, "changes": changes, "journal_bytes_written": stats["written"],
+            "rewrite_bytes_estimate": full * changes, "compactions": stats["compactions"],
+            "write_s": write_s, "journal_bytes": stats["bytes"], "replay_s": replay}
+
+def bench_soak(changes=3000, tracks=500, low_memory=True, sample_every=250):
+    # RSS over thousands of track changes with the TUI following the playing
+    # row (cursor, marquee, jump index), as in a long session; flat means no leak
+    import gc
+    from benchfakes import FakeScreen, FakeYtdlp, headless_curses, isolated_env, make_player
+    from memwatch import rss_bytes
+    from ui import TUI
+    from utils import APPNAME, safe_write_json
+    result = {"bench": "soak", "changes": changes, "tracks": tracks, "low_memory": low_memory}
+    with isolated_env(startup=0.0, duration=600.0) as root, headless_curses(), \
+            FakeYtdlp(resolve_latency=0.0, duration=600.0):
+        cfg_dir = os.path.join(root, "config", APPNAME)
+        os.makedirs(cfg_dir)
+        safe_write_json(os.path.join(cfg_dir, "config.json"), {"low_memory": low_memory})
+        p = make_player(root)
+        p.add_items([(f"Soak track {i} with a title long enough to scroll in the queue row " * 2, "10:00",
+                      f"https://www.youtube.com/watch?v={i:011d}") for i in range(tracks)])
+        _wait(lambda: len(p.snapshot().queue) == tracks)
+        tui = TUI(FakeScreen(40, 100), p)
+        tui.screen = "queue"
+        samples = []
+        failed = 0
+        t = time.perf_counter()
+        for n in range(changes):
+            i = n % tracks
+            if _time_to_audio(p, i) is None:
+                failed += 1
+            tui.cursor = i
+            tui.mark("body", "bar")
+            tui._tick_marquee()
+            tui.render()
+            if n % sample_every == 0 or n == changes - 1:
+                gc.collect()
+                samples.append(round(rss_bytes() / 1e6, 1))
+        result["secs"] = time.perf_counter() - t
+        result["failed"] = failed
+        result["rss_mb"] = samples
+        # growth after warm-up (first sample taken once caches are full)
+        warm = samples[min(2, len(samples) - 1)]
+        result["growth_mb"] = round(samples[-1] - warm, 1)
+        result["marquee_slots"] = len(tui.marquee_offsets)
+        result["jump_index"] = len(tui.jump_index)
+        result["stream_cache"] = len(p.stream_cache)
+        result["memory"] = p.memory_report(5)
+        p.shutdown()
+    return result
+
+def bench_history(plays=200_000, tracks=5000, per_day=180):
+    # play history: record years of listening (albums played in order, some
+    # skips), then radio / hot queries at a small and at the full history size;
+    # they're index lookups, so the two should cost about the same
+    import random
+    import sqlite3
+    import tempfile
+    from history import PlayHistory
+    from track import Track
+    rng = random.Random(1)
+    lib = [Track(f"Artist {i // 12} - Song {i}", f"https://www.youtube.com/watch?v={i:011d}", 180 + i % 120)
+           for i in range(tracks)]
+    result = {"bench": "history", "plays": plays, "tracks": tracks}
+
+    def queries(h, now):
+        times = []
+        for _ in range(200):
+            i = rng.randrange(tracks)
+            seeds = [lib[i].key, lib[i - 1].key]
+            t = time.perf_counter()
+            h.radio(seeds, 3, exclude=seeds, now=now, rng=rng)
+            h.hot(20, now=now)
+            times.append(time.perf_counter() - t)
+        return _summary(times)
+
+    with tempfile.TemporaryDirectory() as d:
+        h = PlayHistory(os.path.join(d, "history.db"))
+        ts = time.time() - plays / per_day * 86400
+        step = 86400 / per_day
+        prev = None
+        i = 0
+        write = 0.0
+        for n in range(plays):
+            if rng.random() < 0.1:
+                i = rng.randrange(tracks)       # jump to another album
+            track = lib[i % tracks]
+            skipped = rng.random() < 0.15
+            secs = rng.uniform(5, 40) if skipped else track.duration
+            t = time.perf_counter()
+            h.record(track, secs, track.duration, not skipped, prev, ts=ts)
+            write += time.perf_counter() - t
+            if not skipped:
+                prev = track.key
+            ts += step
+            i += 1
+            if n + 1 == plays // 20:
+                h.flush()
+                result["query_at_5pct_s"] = queries(h, ts)
+        t = time.perf_counter()
+        h.flush()
+        result["record_call_s"] = write / plays      # what the player's thread pays
+        result["drain_s"] = time.perf_counter() - t
+        result["query_s"] = queries(h, ts)
+        result["db_bytes"] = sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d))
+        result["stats"] = h.stats()
+        h.close()
+        db = sqlite3.connect(os.path.join(d, "history.db"))
+        plans = []
+        for sql in ("SELECT b, n FROM pairs WHERE a = ? ORDER BY n DESC LIMIT 25",
+                    "SELECT key, heat FROM tracks WHERE heat IS NOT NULL ORDER BY heat DESC LIMIT 50",
+                    "SELECT title, url, duration, plays, skips, last_played FROM tracks WHERE key = ?"):
+            plans += [r[-1] for r in db.execute("EXPLAIN QUERY PLAN " + sql, ("x",) * sql.count("?"))]
+        db.close()
+        result["query_plans"] = plans
+        result["full_scans"] = sum(1 for p in plans if p.startswith("SCAN") and "INDEX" not in p)
+    return result
+
+BENCHES = {
+    "startup": bench_startup,
+    "playlist": bench_playlist,
+    "queue": bench_queue,
+    "play": bench_play,
+    "gap": bench_gap,
+    "profiles": bench_profiles,
+    "hedge": bench_hedge,
+    "search": bench_search,
+    "render": bench_render,
+    "jump": bench_jump,
+    "loudness": bench_loudness,
+    "session": bench_session,
+    "soak": bench_soak,
+    "history": bench_history,
+}
+
+def _commit():
+    try:
+        res = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True)
+        return res.stdout.strip() or None
+    except OSError:
+        return None
+
+def _flatten(d, prefix=""):
+    out = {}
+    for k, v in d.items():
+        if isinstance(v, dict):
+            out.update(_flatten(v, f"{prefix}{k}."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[f"{prefix}{k}"] = v
+    return out
+
+def compare(old_path, new_path):
+    # numeric fields of the last run of each bench in two result files
+    def load(path):
+        runs = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    r = json.loads(line)
+                    runs[r["bench"]] = _flatten(r)
+        return runs
+    old, new = load(old_path), load(new_path)
+    for bench in sorted(set(old) & set(new)):
+        for key in sorted(set(old[bench]) & set(new[bench])):
+            a, b = old[bench][key], new[bench][key]
+            ratio = (b / a) if a else float("inf")
+            print(f"{bench}.{key}: {a:.6g} -> {b:.6g} (x{ratio:.2f})")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="music player benchmarks")
+    ap.add_argument("names", nargs="*", help=f"benchmarks to run ({', '.join(BENCHES)}); default all")
+    ap.add_argument("--out", help="append results as JSON lines to this file")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two --out files")
+    args = ap.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+    commit = _commit()
+    for name in args.names or list(BENCHES):
+        if name not in BENCHES:
+            ap.error(f"unknown benchmark {name}")
+        result = BENCHES[name]()
+        result["commit"] = commit
+        result["time"] = time.time()
+        line = json.dumps(result)
+        print(line, flush=True)
+        if args.out:
+            with open(args.out, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+if __name__ == "__main__":
+    main()
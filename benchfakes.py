@@ -0,0 +1,175 @@
+# benchfakes.py
+# Offline stand-ins used by bench.py: a fake yt-dlp layer with configurable
+# latency, an mpv shim that runs fakempv.py, an isolated config/cache dir
+# and a headless curses screen.
+import os
+import sys
+import time
+import curses
+import shutil
+import tempfile
+import contextlib
+import miniytdlp
+from listview import text_width
+from streamprofile import select_format
+import player
+import enrich
+import resolver
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class FakeYtdlp:
+    # replaces search_youtube / get_audio_url / get_metadata (in miniytdlp and where they were imported)
+    def __init__(self, resolve_latency=0.5, search_latency=0.3, per_result=0.01, duration=2.0, meta_latency=0.2,
+                 slow_every=0, slow_latency=10.0):
+        self.resolve_latency = resolve_latency
+        self.slow_every = slow_every        # every n-th default-client resolve hangs for slow_latency
+        self.slow_latency = slow_latency
+        self.default_resolves = 0
+        self.cancelled = 0
+        self.search_latency = search_latency
+        self.per_result = per_result
+        self.duration = duration
+        self.meta_latency = meta_latency
+        self.resolves = 0
+        self.searches = 0
+        self.metadata = 0
+        self._saved = []
+
+    def search_youtube(self, query, max_results=5, on_result=None):
+        self.searches += 1
+        time.sleep(self.search_latency)
+        results = []
+        for i in range(max_results):
+            time.sleep(self.per_result)
+            results.append((f"{query} result {i}", "3:30", f"https://www.youtube.com/watch?v=fake{i:07d}"))
+            if on_result is not None and on_result(results[-1]) is False:
+                break
+        return results
+
+    def get_audio_url(self, video_url, profile=None, client=None, cancel=None):
+        self.resolves += 1
+        latency = self.resolve_latency
+        if client is None:
+            self.default_resolves += 1
+            if self.slow_every and self.default_resolves % self.slow_every == 0:
+                latency = self.slow_latency
+        end = time.perf_counter() + latency
+        while time.perf_counter() < end:
+            if cancel is not None and cancel.is_set():
+                self.cancelled += 1
+                return None
+            time.sleep(min(0.01, max(0.0, end - time.perf_counter())))
+        vid = video_url.rsplit("=", 1)[-1]
+        expire = int(time.time()) + 6 * 3600
+        base = f"http://fake.googlevideo.invalid/videoplayback?id={vid}&expire={expire}&dur={self.duration}"
+        f = select_format(self.formats(base), profile) if profile else None
+        return f["url"] if f else base + "&abr=160"
+
+    @staticmethod
+    def formats(base):
+        # the audio formats youtube usually lists (itag, codec, kbps) plus one muxed
+        fmts = [{"format_id": str(itag), "acodec": codec, "vcodec": "none", "abr": abr,
+                 "protocol": "https", "url": f"{base}&itag={itag}&abr={abr}"}
+                for itag, codec, abr in ((249, "opus", 50), (250, "opus", 70), (251, "opus", 135),
+                                         (139, "mp4a.40.5", 48), (140, "mp4a.40.2", 129))]
+        fmts.append({"format_id": "18", "acodec": "mp4a.40.2", "vcodec": "avc1", "abr": 96, "tbr": 500,
+                     "protocol": "https", "url": f"{base}&itag=18&abr=500"})
+        return fmts
+
+    def get_metadata(self, url):
+        self.metadata += 1
+        time.sleep(self.meta_latency)
+        vid = miniytdlp.re.search(r"v=([\w-]{11})", url)
+        return {"title": f"Title of {url.rsplit('/', 1)[-1]}", "duration": 210,
+                "id": vid.group(1) if vid else None, "extractor": "Youtube" if vid else "Generic"}
+
+    def __enter__(self):
+        for mod in (miniytdlp, player, enrich, resolver):
+            for name in ("search_youtube", "get_audio_url", "get_metadata"):
+                if hasattr(mod, name):
+                    self._saved.append((mod, name, getattr(mod, name)))
+                    setattr(mod, name, getattr(self, name))
+        return self
+
+    def __exit__(self, *exc):
+        for mod, name, fn in reversed(self._saved):
+            setattr(mod, name, fn)
+        self._saved = []
+
+
+@contextlib.contextmanager
+def isolated_env(startup=0.05, duration=3.0):
+    # temp config/cache dirs and an `mpv` on PATH that is really fakempv.py
+    root = tempfile.mkdtemp(prefix="musicbench_")
+    shim_dir = os.path.join(root, "bin")
+    os.makedirs(shim_dir)
+    shim = os.path.join(shim_dir, "mpv")
+    with open(shim, "w") as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.join(HERE, "fakempv.py")}" '
+                f'--fake-startup={startup} --fake-duration={duration} "$@"\n')
+    os.chmod(shim, 0o755)
+    saved = {k: os.environ.get(k) for k in ("PATH", "XDG_CONFIG_HOME", "XDG_CACHE_HOME")}
+    os.environ["PATH"] = shim_dir + os.pathsep + os.environ.get("PATH", "")
+    os.environ["XDG_CONFIG_HOME"] = os.path.join(root, "config")
+    os.environ["XDG_CACHE_HOME"] = os.path.join(root, "cache")
+    try:
+        yield root
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def make_player(root):
+    # PlayerState with its mpv socket inside the bench dir, not the user's
+    p = player.PlayerState()
+    p._ipc_path = os.path.join(root, "mpv.sock")
+    return p
+
+
+class FakeScreen:
+    # the subset of a curses window the TUI uses, nothing is drawn
+    def __init__(self, h=40, w=120):
+        self.h = h
+        self.w = w
+        self.writes = 0
+        self.errors = 0
+
+    def getmaxyx(self):
+        return (self.h, self.w)
+
+    def addstr(self, y, x, text, attr=0):
+        # wide chars take two cells, like a real terminal
+        if y >= self.h or x + text_width(text) > self.w:
+            self.errors += 1
+            raise curses.error("addstr out of range")
+        self.writes += 1
+
+    def erase(self):
+        pass
+
+    def noutrefresh(self):
+        pass
+
+    def nodelay(self, flag):
+        pass
+
+    def keypad(self, flag):
+        pass
+
+
+@contextlib.contextmanager
+def headless_curses():
+    # color_pair/doupdate need initscr(); make them no-ops for FakeScreen
+    saved = (curses.color_pair, curses.doupdate)
+    curses.color_pair = lambda n: n << 8
+    curses.doupdate = lambda: None
+    try:
+        yield
+    finally:
+        curses.color_pair, curses.doupdate = saved
@@ -0,0 +1,247 @@
+# client.py
+# RemotePlayer: the PlayerState surface the TUI uses, backed by a daemon.py
+# socket instead of a local player. State arrives as pushed events and is kept
+# in a local Snapshot, so snapshot() never touches the socket. Searching runs
+# here (it isn't player state) so results still stream in as you type.
+#
+#   python client.py next            -> one command, prints the reply data
+#   python client.py play_index 3
+import os
+import sys
+import json
+import time
+import subprocess
+from track import Track
+from mpvipc import MpvIPC, MpvError
+from metrics import Metrics
+from daemon import control_path
+from player import Snapshot, fetch_info, is_url, search_with_library
+from config import load_config
+from library import open_library
+from miniytdlp import warm as warm_ytdlp
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _connect(path, timeout, **callbacks):
+    ipc = MpvIPC(path, **callbacks)
+    ipc.connect(timeout=timeout)
+    return ipc
+
+def spawn_daemon(path=None, timeout=5.0):
+    # start daemon.py detached from this terminal and wait for its socket
+    path = path or control_path()
+    cmd = [sys.executable, os.path.join(HERE, "daemon.py"), path]
+    subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, start_new_session=True)
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if time.monotonic() > deadline:
+            raise MpvError(f"daemon did not start ({path})")
+        time.sleep(0.02)
+
+
+class _RemoteMetrics:
+    # daemon spans (fetched at most once a second) + our own search span
+    def __init__(self, remote):
+        self.remote = remote
+        self.local = Metrics()
+        self._cached = {}
+        self._at = 0.0
+
+    def span(self, name, **extra):
+        return self.local.span(name, **extra)
+
+    def summary(self):
+        now = time.monotonic()
+        if now - self._at > 1.0:
+            self._at = now
+            try:
+                self._cached = self.remote.request("metrics", timeout=1.0) or {}
+            except MpvError:
+                pass
+        merged = dict(self._cached)
+        merged.update(self.local.summary())
+        return merged
+
+
+class RemotePlayer:
+    def __init__(self, path=None, spawn=True):
+        path = path or control_path()
+        self._listeners = []
+        self._queue = []
+        self._state = None
+        self._downloads = None
+        self._snap = Snapshot([], -1, False, False, False, False, 0, 0, 80, False, False, False)
+        self.metrics = _RemoteMetrics(self)
+        self.library = open_library(load_config())     # same index file; the daemon rescans it
+        callbacks = {"on_event": self._on_event, "on_close": lambda ipc: self._notify("state")}
+        try:
+            ipc = _connect(path, 0.2, **callbacks)
+        except MpvError:
+            if not spawn:
+                raise
+            spawn_daemon(path)
+            ipc = _connect(path, 5.0, **callbacks)
+        self._ipc = ipc
+        ipc.command("subscribe")
+
+    @property
+    def connected(self):
+        return self._ipc.connected
+
+    # --- pushed state (ipc reader thread) ---
+    def _on_event(self, msg):
+        ev, data = msg.get("event"), msg.get("data")
+        if ev == "queue":
+            items = [Track.from_dict(d) for d in data.get("items", ())]
+            # copy on write like PlayerState, the ui may be iterating the old list
+            op = data.get("op")
+            if op == "append":
+                self._queue = self._queue + items
+            elif op == "update":
+                q = list(self._queue)
+                for i, t in zip(data.get("index", ()), items):
+                    if i < len(q):
+                        q[i] = t
+                self._queue = q
+            else:
+                self._queue = items
+            self._publish()
+            self._notify("queue")
+        elif ev in ("state", "progress"):
+            self._state = data
+            self._publish()
+            self._notify(ev)
+        elif ev == "downloads":
+            self._downloads = data
+            self._notify(ev)
+
+    def _publish(self):
+        st = self._state
+        if st is None:
+            self._snap = self._snap._replace(queue=self._queue)
+        else:
+            self._snap = Snapshot(queue=self._queue, **{k: st[k] for k in Snapshot._fields if k != "queue"})
+
+    def _notify(self, what):
+        for cb in self._listeners:
+            try:
+                cb(what)
+            except Exception:
+                pass
+
+    def add_listener(self, cb):
+        self._listeners.append(cb)
+
+    def snapshot(self):
+        return self._snap
+
+    # --- requests ---
+    def request(self, *args, timeout=5.0):
+        return self._ipc.command(*args, timeout=timeout)
+
+    def _send(self, *args):
+        try:
+            self._ipc.command_nowait(*args)
+        except MpvError:
+            pass
+
+    def warm(self):
+        return warm_ytdlp()
+
+    def fetch_info(self, query, top_only=True, max_results=5, on_result=None):
+        if is_url(query):
+            return fetch_info(query, max_results, on_result)
+        return search_with_library(self.library, self.metrics, query, max_results, on_result)
+
+    def add_items(self, items):
+        self._send("add_items", [list(it) for it in items])
+
+    def add_top(self, item):
+        self.add_items([item])
+
+    def append_entries(self, entries):
+        self._send("append_entries", [t.to_dict() for t in entries])
+
+    def set_queue(self, items):
+        self._send("set_queue", [t.to_dict() for t in items])
+
+    def play_index(self, index, auto=False):
+        self._send("play_index", index)
+
+    def next(self):
+        self._send("next")
+
+    def prev(self):
+        self._send("prev")
+
+    def toggle_pause(self):
+        self._send("toggle_pause")
+
+    def set_visible(self, start, end):
+        self._send("set_visible", start, end)
+
+    def download_offline(self, entries):
+        return self.request("download", [t.to_dict() for t in entries], timeout=30.0)
+
+    def cancel_downloads(self):
+        self._send("download_cancel")
+
+    def download_status(self):
+        if self._downloads is None:
+            try:
+                self._downloads = self.request("download_status", timeout=1.0)
+            except MpvError:
+                pass
+        return self._downloads
+
+    def set_volume(self, vol):
+        self._send("set_volume", max(0, min(100, int(vol))))
+
+    def set_shuffle(self, on):
+        self._send("set_shuffle", bool(on))
+
+    def set_repeat_song(self, on):
+        self._send("set_repeat_song", bool(on))
+
+    def set_repeat_playlist(self, on):
+        self._send("set_repeat_playlist", bool(on))
+
+    def set_radio(self, on):
+        self._send("set_radio", bool(on))
+
+    def stop(self):
+        self._send("stop")
+
+    def gap_stats(self):
+        return self.request("gap_stats")
+
+    def shutdown(self):
+        # detach only; the daemon (and the music) keeps going
+        self._ipc.close()
+
+
+def main(argv):
+    # one-shot command for scripts: python client.py <command> [json args...]
+    if not argv:
+        print("usage: client.py <command> [args...]", file=sys.stderr)
+        return 2
+    args = []
+    for a in argv[1:]:
+        try:
+            args.append(json.loads(a))
+        except ValueError:
+            args.append(a)
+    try:
+        ipc = _connect(control_path(), 0.5)
+        data = ipc.command(argv[0], *args, timeout=30.0)
+    except MpvError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if data is not None:
+        print(json.dumps(data, ensure_ascii=False))
+    ipc.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,68 @@
+# config.py
+import os
+import json
+from utils import get_config_dir
+
+DEFAULTS = {
+    # stream url cache (urlcache.py)
+    "stream_cache_size": 256,
+    "stream_cache_margin": 300,     # detik sebelum expire= dianggap basi
+    "stream_cache_persist": True,
+    # format + mpv buffering (streamprofile.py): "data-saver", "balanced", "best"
+    "stream_profile": "balanced",
+    # hedged extraction (resolver.py): this youtube player_client starts too
+    # if the first extraction is slower than the delay; None = no hedging
+    "resolve_alt_client": "ios",
+    "resolve_hedge_delay": 2.0,     # detik, or "auto" (p95 of the first one)
+    # local audio cache (audiocache.py), off by default
+    "audio_cache": False,
+    "audio_cache_bytes": 512 * 1024 * 1024,
+    "audio_cache_dir": None,        # default: <cache dir>/audio
+    # offline downloads (offline.py), never evicted
+    "offline_dir": None,            # default: <cache dir>/offline
+    "offline_workers": 2,
+    "offline_rate_limit": None,     # bytes/s shared by all workers, None = no cap
+    # background titles/durations for entries without them (enrich.py)
+    "enrich": True,
+    "enrich_workers": 3,
+    # local music (library.py): directories to index, tag reader processes
+    "library_dirs": [],
+    "library_workers": None,        # default: one per cpu
+    # volume normalization (loudness.py); needs numpy, local/cached files only
+    "loudness_normalize": True,
+    "loudness_target": -14.0,       # LUFS
+    "loudness_workers": 1,
+    # queue/position/flags kept across restarts and crashes (session.py)
+    "session_restore": True,
+    "session_checkpoint": 5,        # detik playback antar position record
+    # play history (history.py) and radio mode: the queue is extended from
+    # the history before it runs out
+    "history": True,
+    "history_halflife_days": 30,    # how fast old plays stop counting as "hot"
+    "radio": False,
+    "radio_ahead": 3,               # tracks kept queued past the current one
+    # long sessions on low-RAM devices (memwatch.py): smaller caches, lean
+    # yt-dlp instances; over the budget rebuildable state is dropped and a
+    # tracemalloc report of the biggest holders goes to <cache>/memory_report.json
+    "low_memory": False,
+    "memory_budget_mb": None,
+    "memory_check_interval": 30,    # detik antar RSS sample
+    "memory_trace_frames": 0,       # >0: tracemalloc from startup (slower)
+    # hot-path timing spans (metrics.py)
+    "metrics_file": None,           # append every span as a JSON line here
+    "metrics_window": 200,          # samples kept per span for p50/p95
+}
+
+def config_path():
+    return os.path.join(get_config_dir(), "config.json")
+
+def load_config(path=None):
+    cfg = dict(DEFAULTS)
+    try:
+        with open(path or config_path(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+            if isinstance(data, dict):
+                cfg.update(data)
+    except Exception:
+        pass
+    return cfg
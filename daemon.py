@@ -0,0 +1,386 @@
+# daemon.py
+# Headless player: one PlayerState (queue, resolver, mpv) behind a Unix socket.
+# The protocol mirrors mpv's JSON IPC, one JSON object per line:
+#   -> {"command": ["play_index", 3], "request_id": 7}
+#   <- {"request_id": 7, "error": "success", "data": null}
+# After ["subscribe"] the client also gets pushed events:
+#   {"event": "state" | "progress", "data": {...snapshot without the queue}}
+#   {"event": "queue", "data": {"op": "replace" | "append", "items": [...]}}
+#   {"event": "queue", "data": {"op": "update", "index": [...], "items": [...]}}
+#   {"event": "downloads", "data": {...offline download status}}
+# Snapshot and download events are coalesced per client (a slow client only ever gets the
+# latest one), queue events are never dropped. Every event is encoded once
+# for all subscribers.
+import os
+import sys
+import json
+import signal
+import socket
+import threading
+from collections import deque
+from utils import APPNAME, get_socket_path
+from track import Track
+from importer import CollectionImport
+
+MAX_PENDING = 10000     # a client this far behind is dropped
+COALESCED = ("snap", "dl")  # only the newest one of these is worth sending
+
+def control_path():
+    return get_socket_path(f"{APPNAME}_ctl")
+
+def bind_control(path):
+    # listening socket at `path`; RuntimeError if another daemon has it
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            raise RuntimeError(f"daemon already running on {path}")
+        except OSError:
+            os.remove(path)     # stale socket from a crash
+        finally:
+            probe.close()
+    srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    srv.bind(path)
+    os.chmod(path, 0o600)
+    srv.listen(16)
+    return srv
+
+def snapshot_dict(snap):
+    d = snap._asdict()
+    del d["queue"]
+    return d
+
+def _encode(msg):
+    return (json.dumps(msg, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+def _queue_event(op, items, index=None):
+    data = {"op": op, "items": [t.to_dict() for t in items]}
+    if index is not None:
+        data["index"] = index
+    return _encode({"event": "queue", "data": data})
+
+def _queue_diff(old, new):
+    # smallest queue op that turns old into new (both are copy-on-write lists)
+    if len(old) <= len(new) and all(a is b for a, b in zip(old, new)):
+        return _queue_event("append", new[len(old):])
+    if len(old) == len(new):
+        changed = [i for i, (a, b) in enumerate(zip(old, new)) if a is not b]
+        if len(changed) <= max(100, len(new) // 4):
+            return _queue_event("update", [new[i] for i in changed], changed)
+    return _queue_event("replace", new)
+
+
+class _Client:
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self.subscribed = False
+        self.alive = True
+        self._out = deque()         # (kind, bytes); COALESCED kinds can be replaced
+        self._cv = threading.Condition()
+        threading.Thread(target=self._read_loop, daemon=True).start()
+        threading.Thread(target=self._write_loop, daemon=True).start()
+
+    def push(self, kind, data):
+        with self._cv:
+            if not self.alive:
+                return
+            if kind in COALESCED:
+                # keep only the newest snapshot, behind any queue ops already pending
+                for i, (k, _) in enumerate(self._out):
+                    if k == kind:
+                        del self._out[i]
+                        break
+            elif len(self._out) >= MAX_PENDING:
+                self.alive = False
+            self._out.append((kind, data))
+            self._cv.notify()
+
+    def _write_loop(self):
+        while True:
+            with self._cv:
+                while self.alive and not self._out:
+                    self._cv.wait()
+                if not self.alive:
+                    break
+                batch = b"".join(data for _, data in self._out)
+                self._out.clear()
+            try:
+                self.sock.sendall(batch)
+            except OSError:
+                break
+        self.close()
+
+    def _read_loop(self):
+        f = self.sock.makefile("rb")
+        try:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(msg, dict):
+                    continue
+                self.push("reply", _encode(self.server.handle(self, msg)))
+        except OSError:
+            pass
+        self.close()
+
+    def close(self):
+        with self._cv:
+            was, self.alive = self.alive, False
+            self._cv.notify()
+        self.server.drop(self)
+        if was:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+
+
+class PlayerDaemon:
+    def __init__(self, player, path=None):
+        self.player = player
+        self.path = path or control_path()
+        self.clients = set()
+        self._lock = threading.Lock()
+        self._sent_queue = player.snapshot().queue     # last queue version pushed
+        self._srv = None
+        self._import = None
+        self._done = threading.Event()
+        player.add_listener(self._on_change)
+
+    # --- events (owner thread) ---
+    def _on_change(self, what):
+        snap = self.player.snapshot()
+        with self._lock:
+            subs = [c for c in self.clients if c.subscribed]
+            if what == "downloads":
+                data = _encode({"event": "downloads", "data": self.player.download_status()})
+                for c in subs:
+                    c.push("dl", data)
+                return
+            if what == "queue":
+                old, new = self._sent_queue, snap.queue
+                self._sent_queue = new
+                if not subs:
+                    return
+                data = _queue_diff(old, new)
+                for c in subs:
+                    c.push("queue", data)
+            if not subs:
+                return
+            data = _encode({"event": "progress" if what == "progress" else "state",
+                            "data": snapshot_dict(snap)})
+            for c in subs:
+                c.push("snap", data)
+
+    # --- requests (client reader threads) ---
+    def handle(self, client, msg):
+        rid = msg.get("request_id", 0)
+        cmd = msg.get("command")
+        if not isinstance(cmd, list) or not cmd:
+            return {"request_id": rid, "error": "invalid command"}
+        fn = getattr(self, "cmd_" + str(cmd[0]), None)
+        if fn is None:
+            return {"request_id": rid, "error": f"unknown command {cmd[0]}"}
+        try:
+            data = fn(client, *cmd[1:])
+        except Exception as e:
+            # a malformed request must not take the client's reader thread down
+            return {"request_id": rid, "error": f"{cmd[0]}: {e!r}"}
+        return {"request_id": rid, "error": "success", "data": data}
+
+    def cmd_ping(self, client):
+        return "pong"
+
+    def cmd_subscribe(self, client):
+        with self._lock:
+            client.subscribed = True
+            client.push("queue", _queue_event("replace", self._sent_queue))
+            client.push("snap", _encode({"event": "state", "data": snapshot_dict(self.player.snapshot())}))
+        return None
+
+    def cmd_unsubscribe(self, client):
+        client.subscribed = False
+        return None
+
+    def cmd_snapshot(self, client):
+        return snapshot_dict(self.player.snapshot())
+
+    def cmd_queue(self, client, start=0, count=None):
+        q = self.player.snapshot().queue
+        end = len(q) if count is None else start + int(count)
+        return [t.to_dict() for t in q[int(start):end]]
+
+    def cmd_add_items(self, client, items):
+        self.player.add_items([tuple(it) for it in items])
+
+    def cmd_append_entries(self, client, entries):
+        self.player.append_entries([Track.from_dict(e) for e in entries])
+
+    def cmd_set_queue(self, client, entries):
+        self.player.set_queue([Track.from_dict(e) for e in entries])
+
+    def cmd_set_visible(self, client, start, end):
+        self.player.set_visible(int(start), int(end))
+
+    def cmd_enrich_stats(self, client):
+        return self.player.enricher.stats() if self.player.enricher is not None else None
+
+    def cmd_resolver_stats(self, client):
+        return self.player.resolver.stats()
+
+    def cmd_stream_stats(self, client):
+        return self.player.stream_stats.summary()
+
+    def cmd_loudness_stats(self, client):
+        return self.player.loudness.stats() if self.player.loudness is not None else None
+
+    def cmd_play_index(self, client, index):
+        self.player.play_index(int(index))
+
+    def cmd_next(self, client):
+        self.player.next()
+
+    def cmd_prev(self, client):
+        self.player.prev()
+
+    def cmd_toggle_pause(self, client):
+        self.player.toggle_pause()
+
+    def cmd_set_volume(self, client, vol):
+        self.player.set_volume(vol)
+
+    def cmd_set_shuffle(self, client, on):
+        self.player.set_shuffle(on)
+
+    def cmd_set_repeat_song(self, client, on):
+        self.player.set_repeat_song(on)
+
+    def cmd_set_radio(self, client, on):
+        self.player.set_radio(bool(on))
+
+    def cmd_set_repeat_playlist(self, client, on):
+        self.player.set_repeat_playlist(on)
+
+    def cmd_stop(self, client):
+        self.player.stop()
+
+    def cmd_search(self, client, query, max_results=5):
+        return [list(it) for it in self.player.fetch_info(query, max_results=int(max_results))]
+
+    def cmd_import_url(self, client, url):
+        # playlist / channel into the queue; one import at a time, a new one replaces it
+        if self._import is not None:
+            self._import.cancel()
+        self._import = CollectionImport(self.player, url).start()
+
+    def cmd_import_status(self, client):
+        return self._import.status() if self._import is not None else None
+
+    def cmd_import_cancel(self, client):
+        if self._import is not None:
+            self._import.cancel()
+
+    def cmd_download(self, client, entries=None):
+        # offline copies of these entries, or of the whole queue
+        if entries is None:
+            tracks = self.player.snapshot().queue
+        else:
+            tracks = [Track.from_dict(e) for e in entries]
+        return self.player.download_offline(tracks)
+
+    def cmd_download_status(self, client):
+        return self.player.download_status()
+
+    def cmd_download_cancel(self, client):
+        self.player.cancel_downloads()
+
+    def cmd_library_rescan(self, client):
+        lib = self.player.library
+        return lib.rescan() if lib is not None else None
+
+    def cmd_metrics(self, client):
+        return self.player.metrics.summary()
+
+    def cmd_history_stats(self, client):
+        return self.player.history_stats()
+
+    def cmd_gap_stats(self, client):
+        return self.player.gap_stats()
+
+    def cmd_memory(self, client, limit=10):
+        return self.player.memory_report(int(limit))
+
+    def cmd_quit(self, client):
+        self._done.set()
+        return None
+
+    # --- server ---
+    def drop(self, client):
+        with self._lock:
+            self.clients.discard(client)
+
+    def _bind(self):
+        return bind_control(self.path)
+
+    def _accept_loop(self):
+        while not self._done.is_set():
+            try:
+                sock, _ = self._srv.accept()
+            except OSError:
+                break
+            c = _Client(self, sock)
+            with self._lock:
+                self.clients.add(c)
+
+    def serve(self, srv=None):
+        # blocks until "quit", SIGTERM or SIGINT; srv: socket from bind_control()
+        self._srv = srv if srv is not None else self._bind()
+        # only once the socket is ours: a second daemon must not touch the session journal
+        self.player.restore_session()
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                signal.signal(sig, lambda *a: self._done.set())
+        try:
+            while not self._done.wait(1.0):
+                pass
+        finally:
+            self.close()
+
+    def close(self):
+        self._done.set()
+        if self._srv is not None:
+            self._srv.close()
+            self._srv = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        with self._lock:
+            clients = list(self.clients)
+        for c in clients:
+            c.close()
+        self.player.shutdown()
+
+
+def main(path=None):
+    from player import PlayerState
+    path = path or control_path()
+    try:
+        srv = bind_control(path)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    # the player only once the socket is ours: a second daemon must not resume
+    # offline downloads or rescan the library before finding it taken
+    PlayerDaemon(PlayerState(), path).serve(srv)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,250 @@
+# enrich.py
+# Background metadata for queue entries that came in without it (old
+# playlists, direct urls): title, numeric duration and youtube id. A small
+# pool of workers asks yt-dlp, visible rows and the next few tracks first,
+# then the rest of the queue in order. Results go to a JSON lines store in
+# the cache dir, so an entry is never fetched twice.
+import os
+import json
+import time
+import threading
+from track import Track
+from miniytdlp import get_metadata
+
+PLACEHOLDER_TITLES = {"", "Direct URL", "Unknown Title"}
+
+def needs_enrich(track):
+    if track.local:
+        return False    # the library index already read its tags
+    return track.duration is None or track.title in PLACEHOLDER_TITLES or track.title == track.url
+
+def merge(track, meta):
+    # new Track with the gaps filled from meta, None if nothing would change
+    title = track.title
+    if (title in PLACEHOLDER_TITLES or title == track.url) and meta.get("title"):
+        title = meta["title"]
+    dur = track.duration if track.duration is not None else meta.get("duration")
+    url = track.url
+    if track.vid is None and meta.get("vid"):
+        url = f"https://www.youtube.com/watch?v={meta['vid']}"
+    if title == track.title and dur == track.duration and url == track.url:
+        return None
+    return Track(title, url, dur)
+
+def _rate_limited(err):
+    msg = str(err)
+    return "429" in msg or "Too Many Requests" in msg
+
+
+class MetaStore:
+    # key -> {"title", "duration", "vid"}; append-only, compacted on load
+    def __init__(self, path):
+        self.path = path
+        self._data = {}
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def _load(self):
+        lines = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        d = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(d, dict) and d.get("key"):
+                        self._data[d.pop("key")] = d
+        except OSError:
+            return
+        if lines > 2 * len(self._data) + 100:
+            self._compact()
+
+    def _compact(self):
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                for key, meta in self._data.items():
+                    f.write(json.dumps(dict(meta, key=key), ensure_ascii=False) + "\n")
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def put(self, key, meta):
+        with self._lock:
+            self._data[key] = meta
+            if not self.path:
+                return
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(dict(meta, key=key), ensure_ascii=False) + "\n")
+            except OSError:
+                pass
+
+
+class Enricher:
+    # snapshot(): the player's Snapshot; on_results(): called (at most once
+    # until take()) when there are results for the owner thread to apply
+    def __init__(self, snapshot, on_results, store, workers=3, lookahead=3):
+        self.snapshot = snapshot
+        self.on_results = on_results
+        self.store = store
+        self.workers = workers
+        self.lookahead = lookahead
+        self.fetched = 0
+        self.store_hits = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self._cv = threading.Condition()
+        self._visible = (0, 0)
+        self._scan = 0              # next queue index for the in-order sweep
+        self._retry = []            # (index, track) put back after a 429
+        self._busy = set()          # keys being fetched or waiting to be applied
+        self._failed = set()
+        self._results = []
+        self._posted = False
+        self._backoff = 0.0
+        self._resume_at = 0.0
+        self._threads = []
+        self._running = True
+
+    # --- called by the player / ui ---
+    def poke(self, reset=False):
+        # queue changed; reset=True when it was replaced, not appended to
+        with self._cv:
+            if reset:
+                self._scan = 0
+                self._retry = []
+            if not self._threads:
+                for _ in range(self.workers):
+                    t = threading.Thread(target=self._worker, daemon=True)
+                    t.start()
+                    self._threads.append(t)
+            self._cv.notify_all()
+
+    def focus(self, start, end):
+        # rows on screen go first
+        with self._cv:
+            if (start, end) != self._visible:
+                self._visible = (start, end)
+                self._cv.notify_all()
+
+    def take(self):
+        # owner thread: [(index, key, meta)] found since the last take
+        with self._cv:
+            results, self._results = self._results, []
+            self._posted = False
+        return results
+
+    def applied(self, keys):
+        with self._cv:
+            self._busy.difference_update(keys)
+
+    def close(self):
+        with self._cv:
+            self._running = False
+            self._cv.notify_all()
+
+    def stats(self):
+        return {"fetched": self.fetched, "store_hits": self.store_hits, "failures": self.failures,
+                "rate_limited": self.rate_limited, "stored": len(self.store)}
+
+    # --- workers ---
+    def _add_result(self, i, key, meta):
+        # under _cv
+        self._busy.add(key)
+        self._results.append((i, key, meta))
+        if not self._posted:
+            self._posted = True
+            self.on_results()
+
+    def _check(self, q, i):
+        # under _cv: (i, track) if it needs a fetch; store hits are queued as results
+        t = q[i]
+        key = t.key
+        if key in self._busy or key in self._failed or not needs_enrich(t):
+            return None
+        meta = self.store.get(key)
+        if meta is not None:
+            if merge(t, meta) is not None:
+                self.store_hits += 1
+                self._add_result(i, key, meta)
+            return None
+        return (i, t)
+
+    def _next_job(self):
+        snap = self.snapshot()
+        q, n = snap.queue, len(snap.queue)
+        while self._retry:
+            i, t = self._retry.pop()
+            if i < n and q[i] is t and t.key not in self._busy:
+                return (i, t)
+        a, b = self._visible
+        first = [i for i in range(snap.idx, snap.idx + 1 + self.lookahead) if i >= 0]
+        for i in first + list(range(a, b)):
+            if i < n:
+                job = self._check(q, i)
+                if job:
+                    return job
+        while self._scan < n:
+            i = self._scan
+            self._scan += 1
+            job = self._check(q, i)
+            if job:
+                return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cv:
+                job = None
+                while self._running:
+                    job = self._next_job()
+                    if job is not None:
+                        break
+                    self._cv.wait()
+                if not self._running:
+                    return
+                i, track = job
+                key = track.key
+                self._busy.add(key)
+                wait = self._resume_at - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)    # shared backoff after a rate limit
+            try:
+                info = get_metadata(track.url)
+            except Exception as e:
+                with self._cv:
+                    self._busy.discard(key)
+                    if _rate_limited(e):
+                        self.rate_limited += 1
+                        self._backoff = min(60.0, max(1.0, self._backoff * 2))
+                        self._resume_at = time.monotonic() + self._backoff
+                        self._retry.append((i, track))
+                    else:
+                        self.failures += 1
+                        self._failed.add(key)
+                continue
+            meta = {"title": info.get("title"), "duration": info.get("duration")}
+            if info.get("extractor") == "Youtube" and info.get("id"):
+                meta["vid"] = info["id"]
+            self.store.put(key, meta)
+            with self._cv:
+                self.fetched += 1
+                self._backoff = 0.0
+                if merge(track, meta) is not None:
+                    self._add_result(i, key, meta)
+                else:
+                    self._busy.discard(key)
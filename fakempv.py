@@ -0,0 +1,240 @@
+# fakempv.py
+# Stand-in for mpv in benchmarks: speaks mpv's JSON IPC on --input-ipc-server
+# and "plays" files by ticking time-pos. Duration comes from a dur=<seconds>
+# query param in the url (default --fake-duration), start delay from
+# --fake-startup (simulated open + network buffering). Bytes read are
+# modelled from an abr=<kbps> query param and --demuxer-readahead-secs.
+import os
+import re
+import sys
+import json
+import time
+import socket
+import threading
+
+TICK = 0.05
+
+class FakeMpv:
+    def __init__(self, path, duration=3.0, startup=0.05, readahead=60.0):
+        self.path = path
+        self.readahead = readahead
+        self.default_duration = duration
+        self.startup = startup
+        self.lock = threading.RLock()
+        self.clients = []
+        self.observed = {}          # client -> {id: name}
+        self.playlist = []          # [(entry_id, url)]
+        self.cur = None
+        self.next_id = 1
+        self.gen = 0
+        self.pos = 0.0
+        self.props = {"pause": False, "volume": 100, "time-pos": None, "duration": None,
+                      "eof-reached": False, "idle-active": True, "speed": 1.0,
+                      "paused-for-cache": False, "file-size": None}
+        self.byte_rate = 16000
+
+    # --- output ---
+    def send(self, c, msg):
+        try:
+            c.sendall((json.dumps(msg) + "\n").encode("utf-8"))
+        except OSError:
+            pass
+
+    def broadcast(self, msg):
+        for c in list(self.clients):
+            self.send(c, msg)
+
+    def set_prop(self, name, value):
+        with self.lock:
+            self.props[name] = value
+            for c, obs in list(self.observed.items()):
+                for oid, n in list(obs.items()):
+                    if n == name:
+                        self.send(c, {"event": "property-change", "id": oid, "name": name, "data": value})
+
+    # --- playback ---
+    def _duration(self, url):
+        m = re.search(r"[?&]dur=([\d.]+)", url)
+        return float(m.group(1)) if m else self.default_duration
+
+    def _byte_rate(self, url):
+        m = re.search(r"[?&]abr=([\d.]+)", url)
+        return float(m.group(1)) * 1000 / 8 if m else 16000
+
+    def play(self, i, start=0.0):
+        with self.lock:
+            self.gen += 1
+            gen = self.gen
+            if i >= len(self.playlist):
+                self.cur = None
+                self.set_prop("time-pos", None)
+                self.set_prop("idle-active", True)
+                self.broadcast({"event": "idle"})
+                return
+            self.cur = i
+            eid, url = self.playlist[i]
+            self.set_prop("idle-active", False)
+            self.set_prop("eof-reached", False)
+            self.set_prop("path", url)
+            self.broadcast({"event": "start-file", "playlist_entry_id": eid})
+        threading.Thread(target=self._run, args=(gen, i, eid, url, start), daemon=True).start()
+
+    def _run(self, gen, i, eid, url, start):
+        time.sleep(self.startup)
+        dur = self._duration(url)
+        with self.lock:
+            if gen != self.gen:
+                return
+            self.broadcast({"event": "file-loaded"})
+            self.set_prop("duration", dur)
+            self.byte_rate = self._byte_rate(url)
+            self.set_prop("file-size", int(dur * self.byte_rate))
+            self.pos = start
+        while True:
+            time.sleep(TICK)
+            with self.lock:
+                if gen != self.gen:
+                    return
+                if not self.props["pause"]:
+                    self.pos += TICK * self.props["speed"]
+                    if self.pos >= dur:
+                        break
+                    self.set_prop("time-pos", round(self.pos, 3))
+        with self.lock:
+            if gen != self.gen:
+                return
+            self.set_prop("eof-reached", True)
+            self.broadcast({"event": "end-file", "reason": "eof", "playlist_entry_id": eid})
+            self.play(i + 1)
+
+    def _stop_current(self, reason="stop"):
+        if self.cur is not None and self.cur < len(self.playlist):
+            self.broadcast({"event": "end-file", "reason": reason, "playlist_entry_id": self.playlist[self.cur][0]})
+        self.gen += 1
+
+    # --- commands ---
+    def command(self, c, args):
+        name = args[0]
+        with self.lock:
+            if name == "loadfile":
+                url = args[1]
+                mode = args[2] if len(args) > 2 else "replace"
+                eid = self.next_id
+                self.next_id += 1
+                if mode == "replace":
+                    self._stop_current()
+                    self.playlist = [(eid, url)]
+                    self.play(0)
+                else:
+                    self.playlist.append((eid, url))
+                    if self.cur is None and mode == "append-play":
+                        self.play(len(self.playlist) - 1)
+                return {"playlist_entry_id": eid}
+            if name == "observe_property":
+                self.observed.setdefault(c, {})[args[1]] = args[2]
+                self.send(c, {"event": "property-change", "id": args[1], "name": args[2], "data": self.props.get(args[2])})
+                return None
+            if name == "get_property":
+                if args[1] == "stream-pos" and self.cur is not None:
+                    # demuxer reads ahead of the play position
+                    return int(min(self.props["file-size"] or 0, (self.pos + self.readahead) * self.byte_rate))
+                if args[1] not in self.props:
+                    raise KeyError("property not found")
+                return self.props[args[1]]
+            if name == "set_property":
+                self.set_prop(args[1], args[2])
+                return None
+            if name == "cycle":
+                self.set_prop(args[1], not self.props[args[1]])
+                return None
+            if name == "seek":
+                if self.cur is None:
+                    raise KeyError("no file")
+                target = float(args[1])
+                mode = args[2] if len(args) > 2 else "relative"
+                self.pos = target if mode.startswith("absolute") else self.pos + target
+                self.set_prop("time-pos", round(self.pos, 3))
+                return None
+            if name == "stop":
+                self._stop_current()
+                self.playlist = []
+                self.cur = None
+                self.set_prop("idle-active", True)
+                return None
+            if name == "playlist-clear":
+                if self.cur is not None:
+                    self.playlist = [self.playlist[self.cur]]
+                    self.cur = 0
+                else:
+                    self.playlist = []
+                return None
+            if name == "playlist-next":
+                if self.cur is None or self.cur + 1 >= len(self.playlist):
+                    raise KeyError("no next")
+                self._stop_current()
+                self.play(self.cur + 1)
+                return None
+            if name in ("af", "script-message", "show-text"):
+                return None
+            if name == "quit":
+                self.send(c, {"error": "success"})
+                os._exit(0)
+            raise KeyError("invalid command")
+
+    def handle(self, c):
+        buf = b""
+        while True:
+            try:
+                data = c.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+            buf += data
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                if not line.strip():
+                    continue
+                msg = json.loads(line)
+                reply = {"request_id": msg.get("request_id", 0)}
+                try:
+                    reply["data"] = self.command(c, msg["command"])
+                    reply["error"] = "success"
+                except (KeyError, IndexError, ValueError) as e:
+                    reply["error"] = str(e).strip("'")
+                self.send(c, reply)
+        with self.lock:
+            self.observed.pop(c, None)
+            if c in self.clients:
+                self.clients.remove(c)
+
+    def serve(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        srv.bind(self.path)
+        srv.listen(8)
+        while True:
+            c, _ = srv.accept()
+            with self.lock:
+                self.clients.append(c)
+            threading.Thread(target=self.handle, args=(c,), daemon=True).start()
+
+
+def main(argv):
+    opts = {}
+    for a in argv:
+        if a.startswith("--") and "=" in a:
+            k, v = a[2:].split("=", 1)
+            opts[k] = v
+    mpv = FakeMpv(opts["input-ipc-server"],
+                  duration=float(opts.get("fake-duration", 3.0)),
+                  startup=float(opts.get("fake-startup", 0.05)),
+                  readahead=float(opts.get("demuxer-readahead-secs", 60)))
+    mpv.props["volume"] = float(opts.get("volume", 100))
+    mpv.serve()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,218 @@
+# history.py
+# Play history for radio mode, in SQLite next to the library index. Every
+# finished or skipped track is one row in `plays` (the raw log, never read
+# back by queries) and updates aggregates in the same transaction:
+#   tracks: plays / skips / seconds listened / last played, plus `heat`, an
+#           exponentially decayed play count stored as log2(count) + t/halflife,
+#           so "hot right now" is an ORDER BY over its index at any later time
+#   pairs:  (a, b) -> how often b was played right after a
+# Radio picks are then index lookups (pairs of the last few tracks, hot
+# tracks as filler), whatever the size of the history.
+#
+# Writes come from the player's playback-end path via record(), which only
+# queues; a writer thread applies them in batches.
+import math
+import time
+import queue
+import random
+import sqlite3
+import threading
+from track import Track
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS plays (
+        ts REAL NOT NULL,
+        key TEXT NOT NULL,
+        secs REAL NOT NULL,
+        skipped INTEGER NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS tracks (
+        key TEXT PRIMARY KEY,
+        title TEXT,
+        url TEXT NOT NULL,
+        duration INTEGER,
+        plays INTEGER NOT NULL DEFAULT 0,
+        skips INTEGER NOT NULL DEFAULT 0,
+        secs REAL NOT NULL DEFAULT 0,
+        last_played REAL,
+        heat REAL
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS tracks_heat ON tracks(heat)",
+    """CREATE TABLE IF NOT EXISTS pairs (
+        a TEXT NOT NULL,
+        b TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        PRIMARY KEY (a, b)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS pairs_next ON pairs(a, n)",
+)
+
+PLAYED_SECS = 240           # listened this long, or half the track: a play, else a skip
+FANOUT = 25                 # followers looked at per seed track
+HOT = 50                    # hot tracks looked at as filler
+RECENT_SECS = 3 * 3600      # played this recently: much less likely to come back
+
+def is_skip(secs, duration, completed):
+    if completed:
+        return False
+    return secs < min(PLAYED_SECS, (duration or 0) / 2 or PLAYED_SECS)
+
+
+class PlayHistory:
+    def __init__(self, path, halflife_days=30):
+        self.path = path
+        self.halflife = halflife_days * 86400
+        self.recorded = 0
+        self._q = queue.Queue()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            for stmt in SCHEMA:
+                db.execute(stmt)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        # one connection per call/thread, like library.py; WAL lets radio read during writes
+        return sqlite3.connect(self.path, timeout=10)
+
+    # --- writing ---
+    def record(self, track, secs, duration=None, completed=False, prev=None, ts=None):
+        # a play of `track` ended after `secs` s; prev: key of the track played before it
+        self._q.put((ts or time.time(), track, float(secs or 0), duration, completed, prev))
+
+    def flush(self):
+        self._q.join()
+
+    def close(self):
+        self._q.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        db = self._connect()
+        try:
+            while True:
+                batch = [self._q.get()]
+                while True:
+                    try:
+                        batch.append(self._q.get_nowait())
+                    except queue.Empty:
+                        break
+                done = None in batch
+                try:
+                    with db:
+                        for ev in batch:
+                            if ev is not None:
+                                self._apply(db, *ev)
+                except sqlite3.Error:
+                    pass
+                for _ in batch:
+                    self._q.task_done()
+                if done:
+                    break
+        finally:
+            db.close()
+
+    def _apply(self, db, ts, track, secs, duration, completed, prev):
+        key = track.key
+        skipped = is_skip(secs, duration or track.duration, completed)
+        db.execute("INSERT INTO plays VALUES (?, ?, ?, ?)", (ts, key, secs, int(skipped)))
+        row = db.execute("SELECT heat FROM tracks WHERE key = ?", (key,)).fetchone()
+        heat = row[0] if row else None
+        if not skipped:
+            # decayed count at `ts`, plus this play
+            now = ts / self.halflife
+            count = (2 ** (heat - now) if heat is not None else 0) + 1
+            heat = math.log2(count) + now
+        db.execute("""INSERT INTO tracks (key, title, url, duration, plays, skips, secs, last_played, heat)
+                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                      ON CONFLICT(key) DO UPDATE SET
+                        title = excluded.title, url = excluded.url,
+                        duration = COALESCE(excluded.duration, duration),
+                        plays = plays + excluded.plays, skips = skips + excluded.skips,
+                        secs = secs + excluded.secs, last_played = excluded.last_played,
+                        heat = excluded.heat""",
+                   (key, track.title, track.url, track.duration, int(not skipped), int(skipped),
+                    secs, ts, heat))
+        if prev and prev != key and not skipped:
+            db.execute("""INSERT INTO pairs VALUES (?, ?, 1)
+                          ON CONFLICT(a, b) DO UPDATE SET n = n + 1""", (prev, key))
+        self.recorded += 1
+
+    # --- queries (index lookups only) ---
+    def track_stats(self, key):
+        with self._connect() as db:
+            row = db.execute("SELECT plays, skips, secs, last_played FROM tracks WHERE key = ?",
+                             (key,)).fetchone()
+        if row is None:
+            return None
+        plays, skips, secs, last = row
+        return {"plays": plays, "skips": skips, "skip_rate": skips / (plays + skips) if plays + skips else 0.0,
+                "secs": secs, "last_played": last}
+
+    def hot(self, limit=20, now=None):
+        # [(key, decayed play count)] hottest first
+        now = (now or time.time()) / self.halflife
+        with self._connect() as db:
+            rows = db.execute("SELECT key, heat FROM tracks WHERE heat IS NOT NULL "
+                              "ORDER BY heat DESC LIMIT ?", (limit,)).fetchall()
+        return [(k, 2 ** (h - now)) for k, h in rows]
+
+    def followers(self, key, limit=FANOUT):
+        # [(key, times)] played right after `key`, most often first
+        with self._connect() as db:
+            return db.execute("SELECT b, n FROM pairs WHERE a = ? ORDER BY n DESC LIMIT ?",
+                              (key, limit)).fetchall()
+
+    def radio(self, seeds, count, exclude=(), now=None, rng=random):
+        # `count` Tracks to follow `seeds` (keys, most recent first): what
+        # usually came after them, weighted by how rarely each gets skipped
+        # and pushed back if it played in the last hours; hot tracks fill in
+        # when the seeds have little history
+        now = now or time.time()
+        exclude = set(exclude)
+        weight = {}
+        with self._connect() as db:
+            for w, key in zip((1.0, 0.5, 0.25), seeds):
+                for b, n in db.execute("SELECT b, n FROM pairs WHERE a = ? ORDER BY n DESC LIMIT ?",
+                                       (key, FANOUT)):
+                    if b not in exclude:
+                        weight[b] = weight.get(b, 0.0) + w * n
+            if len(weight) < count * 3:
+                t = now / self.halflife
+                for key, heat in db.execute("SELECT key, heat FROM tracks WHERE heat IS NOT NULL "
+                                            "ORDER BY heat DESC LIMIT ?", (HOT,)):
+                    if key not in exclude and key not in weight:
+                        weight[key] = 0.1 * 2 ** (heat - t)
+            rows = {}
+            for key in weight:
+                row = db.execute("SELECT title, url, duration, plays, skips, last_played "
+                                 "FROM tracks WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    rows[key] = row
+        scored = []
+        for key, w in weight.items():
+            row = rows.get(key)
+            if row is None:
+                continue
+            title, url, duration, plays, skips, last = row
+            w *= (plays + 1) / (plays + skips + 2)
+            if last is not None and now - last < RECENT_SECS:
+                w *= 0.1
+            scored.append((w, key, row))
+        picks = []
+        while scored and len(picks) < count:
+            # weighted draw without replacement, so radio doesn't replay the same few
+            r = rng.random() * sum(s[0] for s in scored)
+            for j, (w, key, row) in enumerate(scored):
+                r -= w
+                if r <= 0:
+                    break
+            w, key, (title, url, duration, *_) = scored.pop(j)
+            picks.append(Track(title or url, url, duration))
+        return picks
+
+    def stats(self):
+        with self._connect() as db:
+            tracks = db.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+            plays = db.execute("SELECT MAX(rowid) FROM plays").fetchone()[0] or 0
+        return {"tracks": tracks, "plays": plays, "recorded": self.recorded, "pending": self._q.qsize()}
@@ -0,0 +1,85 @@
+# importer.py
+# Streams a YouTube playlist / channel into the queue: entries are appended in
+# batches as yt-dlp pages them in, so the first track can play while the rest
+# of a 5000-video playlist is still loading. Works with PlayerState and with
+# client.RemotePlayer (it only needs snapshot/append_entries/play_index).
+import time
+import threading
+from track import Track
+from miniytdlp import iter_collection
+
+class CollectionImport:
+    def __init__(self, player, url, on_progress=None, batch=100, interval=0.5):
+        self.player = player
+        self.url = url
+        self.on_progress = on_progress     # on_progress(self), from the import thread
+        self.batch = batch
+        self.interval = interval
+        self.title = None
+        self.added = 0
+        self.dupes = 0
+        self.done = False
+        self.error = None
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def status(self):
+        return {"url": self.url, "title": self.title, "added": self.added, "dupes": self.dupes,
+                "done": self.done, "cancelled": self.cancelled, "error": self.error}
+
+    def _progress(self):
+        if self.on_progress is not None:
+            try:
+                self.on_progress(self)
+            except Exception:
+                pass
+
+    def _flush(self, batch, autoplay):
+        self.player.append_entries(batch)
+        if autoplay and self.added == 0:
+            self.player.play_index(0)
+        self.added += len(batch)
+        self._progress()
+
+    def _run(self):
+        snap = self.player.snapshot()
+        seen = {t.key for t in snap.queue}      # dedupe against what's queued already
+        autoplay = not snap.queue
+        info = {}
+        batch = []
+        last = time.monotonic()
+        try:
+            for item in iter_collection(self.url, info):
+                if self._cancel.is_set():
+                    break
+                self.title = info.get("title")
+                track = Track.from_item(item)
+                if track.key in seen:
+                    self.dupes += 1
+                    continue
+                seen.add(track.key)
+                batch.append(track)
+                now = time.monotonic()
+                # first entry goes out alone so playback can start right away
+                if self.added == 0 or len(batch) >= self.batch or now - last >= self.interval:
+                    self._flush(batch, autoplay)
+                    batch = []
+                    last = now
+        except Exception as e:
+            self.error = str(e)
+        if batch and not self._cancel.is_set():
+            self._flush(batch, autoplay)    # cancelled: nothing more goes in the queue
+        self.done = True
+        self._progress()
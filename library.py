@@ -0,0 +1,206 @@
+# library.py
+# Local music library: configured directories are walked, tags/durations are
+# read in a process pool and kept in a SQLite index in the cache dir. Rescans
+# only re-read files whose mtime or size changed.
+#
+#   python library.py [dir ...]     -> rescan (config "library_dirs" by default)
+#
+# Tags come from mutagen when it's installed; without it titles come from the
+# file name ("Artist - Title.mp3") and only WAV/FLAC get a duration.
+import os
+import sys
+import time
+import wave
+import sqlite3
+import struct
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from track import format_duration
+from utils import get_cache_dir
+
+AUDIO_EXTS = {".mp3", ".flac", ".ogg", ".oga", ".opus", ".m4a", ".mp4", ".aac",
+              ".wav", ".wma", ".aiff", ".aif", ".ape", ".wv", ".mka", ".webm"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    duration INTEGER
+)
+"""
+
+def _flac_duration(path):
+    # STREAMINFO is always the first metadata block
+    with open(path, "rb") as f:
+        if f.read(4) != b"fLaC":
+            return None
+        f.read(4)
+        info = f.read(18)
+    if len(info) < 18:
+        return None
+    rate = int.from_bytes(info[10:13], "big") >> 4
+    samples = struct.unpack(">Q", info[10:18])[0] & 0xFFFFFFFFF
+    return int(samples / rate) if rate else None
+
+def _fallback_tags(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    artist, sep, title = stem.partition(" - ")
+    if not sep:
+        artist, title = None, stem
+    dur = None
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == ".wav":
+            with wave.open(path, "rb") as w:
+                dur = int(w.getnframes() / w.getframerate())
+        elif ext == ".flac":
+            dur = _flac_duration(path)
+    except (OSError, EOFError, wave.Error, ZeroDivisionError):
+        pass
+    return title, artist, None, dur
+
+def read_tags(path):
+    # (title, artist, album, duration); runs in the worker processes
+    title, artist, album, dur = _fallback_tags(path)
+    try:
+        import mutagen
+    except ImportError:
+        return title, artist, album, dur
+    try:
+        f = mutagen.File(path, easy=True)
+    except Exception:
+        f = None
+    if f is None:
+        return title, artist, album, dur
+    tags = f.tags or {}
+    first = lambda k: (tags.get(k) or [None])[0]
+    length = getattr(getattr(f, "info", None), "length", None)
+    return (first("title") or title, first("artist") or artist, first("album") or album,
+            int(length) if length else dur)
+
+def _read_many(paths):
+    return [(p,) + read_tags(p) for p in paths]
+
+def display_title(title, artist):
+    return f"{artist} - {title}" if artist else title
+
+
+class Library:
+    def __init__(self, db_path, dirs=(), workers=None):
+        self.db_path = db_path
+        self.dirs = [os.path.abspath(os.path.expanduser(d)) for d in dirs]
+        self.workers = workers
+        self.scanning = False
+        self.last_scan = None       # stats of the last rescan
+        self._scan_lock = threading.Lock()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(SCHEMA)
+
+    def _connect(self):
+        # one connection per call/thread; WAL lets searches run during a rescan
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _walk(self):
+        # path -> (mtime, size) for every audio file under the configured dirs
+        found = {}
+        stack = list(self.dirs)
+        while stack:
+            d = stack.pop()
+            try:
+                it = os.scandir(d)
+            except OSError:
+                continue
+            with it:
+                for e in it:
+                    try:
+                        if e.is_dir(follow_symlinks=False):
+                            stack.append(e.path)
+                        elif os.path.splitext(e.name)[1].lower() in AUDIO_EXTS:
+                            st = e.stat()
+                            found[e.path] = (st.st_mtime, st.st_size)
+                    except OSError:
+                        continue
+        return found
+
+    def rescan(self):
+        with self._scan_lock:
+            self.scanning = True
+            try:
+                self.last_scan = self._rescan()
+            finally:
+                self.scanning = False
+            return self.last_scan
+
+    def rescan_async(self):
+        t = threading.Thread(target=self.rescan, daemon=True)
+        t.start()
+        return t
+
+    def _rescan(self):
+        t0 = time.perf_counter()
+        found = self._walk()
+        with self._connect() as db:
+            known = {p: (m, s) for p, m, s in db.execute("SELECT path, mtime, size FROM files")}
+        changed = [p for p, ms in found.items() if known.get(p) != ms]
+        removed = [p for p in known if p not in found]
+        rows = []
+        if changed:
+            chunks = [changed[i:i + 64] for i in range(0, len(changed), 64)]
+            if len(changed) < 64:
+                results = [_read_many(c) for c in chunks]
+            else:
+                # spawn, not fork: the player process has threads (and mpv pipes) open
+                ctx = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx) as pool:
+                    results = list(pool.map(_read_many, chunks))
+            for chunk in results:
+                for path, title, artist, album, dur in chunk:
+                    mtime, size = found[path]
+                    rows.append((path, mtime, size, title, artist, album, dur))
+        with self._connect() as db:
+            db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            db.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in removed])
+        return {"files": len(found), "updated": len(rows), "removed": len(removed),
+                "secs": time.perf_counter() - t0}
+
+    def search(self, query, limit=5):
+        # (title, duration_str, path) for files whose title/artist/album/path has every word
+        words = query.lower().split()
+        if not words:
+            return []
+        where = " AND ".join(["lower(coalesce(title,'') || ' ' || coalesce(artist,'') || ' ' || "
+                              "coalesce(album,'') || ' ' || path) LIKE ?"] * len(words))
+        args = [f"%{w}%" for w in words] + [limit]
+        with self._connect() as db:
+            rows = db.execute(f"SELECT path, title, artist, duration FROM files WHERE {where} "
+                              f"ORDER BY artist, album, title LIMIT ?", args).fetchall()
+        return [(display_title(title or os.path.basename(p), artist), format_duration(dur), p)
+                for p, title, artist, dur in rows]
+
+    def count(self):
+        with self._connect() as db:
+            return db.execute("SELECT count(*) FROM files").fetchone()[0]
+
+
+def open_library(config):
+    # Library from config.json's library_dirs, or None when there are none
+    if not config.get("library_dirs"):
+        return None
+    return Library(os.path.join(get_cache_dir(), "library.db"), config["library_dirs"],
+                   workers=config.get("library_workers"))
+
+
+if __name__ == "__main__":
+    from config import load_config
+    cfg = load_config()
+    lib = open_library(dict(cfg, library_dirs=sys.argv[1:] or cfg.get("library_dirs")))
+    if lib is None:
+        print("no directories: pass some or set library_dirs in config.json", file=sys.stderr)
+        sys.exit(2)
+    print(lib.rescan())
@@ -0,0 +1,103 @@
+# listview.py
+# Virtualized list for the queue and search screens. Only the rows in view
+# are laid out, and a laid-out row is cached by (item, state) for the current
+# width, so a frame costs the same with 100 or 100k entries and scrolling
+# mostly hits the cache. The queue is copy-on-write and a changed entry is a
+# new Track object, so a mutation never hits a stale row; a resize clears it.
+#
+# Widths are terminal columns, not characters: CJK and most emoji take two
+# cells, combining marks and zero-width joiners none. Slicing by len() made
+# such titles run past the right edge, where curses raises.
+import unicodedata
+
+_ZERO = {0x200B, 0x200C, 0x200D, 0x2060, 0xFEFF}
+_widths = {}        # char -> cells, filled as chars are seen
+
+def char_width(ch):
+    w = _widths.get(ch)
+    if w is None:
+        o = ord(ch)
+        if o in _ZERO or 0xFE00 <= o <= 0xFE0F or unicodedata.combining(ch):
+            w = 0
+        elif unicodedata.category(ch) in ("Cc", "Cf"):
+            w = 0
+        elif unicodedata.east_asian_width(ch) in ("W", "F"):
+            w = 2
+        else:
+            w = 1
+        _widths[ch] = w
+    return w
+
+def text_width(text):
+    if text.isascii():
+        return len(text)
+    return sum(map(char_width, text))
+
+def clip(text, width):
+    # longest prefix of `text` that fits in `width` cells
+    if text.isascii():
+        return text[:width]
+    used = 0
+    for i, ch in enumerate(text):
+        used += char_width(ch)
+        if used > width:
+            return text[:i]
+    return text
+
+def fit(text, width):
+    # clipped and padded with spaces to exactly `width` cells
+    if text.isascii():
+        return text[:width].ljust(width)
+    text = clip(text, width)
+    return text + " " * (width - text_width(text))
+
+
+class ListView:
+    # layout(item, index, width, state) -> row text; state is what else the
+    # row shows (cursor, playing, selected) and must be hashable
+    MAX_CACHED = 2048
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.top = 0            # first row in view
+        self.hits = 0
+        self.misses = 0
+        self._width = None
+        self._cache = {}
+
+    def invalidate(self):
+        self._cache.clear()
+
+    def scroll_to(self, cursor, count, height):
+        # move the view only as far as needed to show `cursor`
+        if cursor < self.top:
+            self.top = cursor
+        elif cursor >= self.top + height:
+            self.top = cursor - height + 1
+        self.top = max(0, min(self.top, count - height))
+        return self.top
+
+    def row(self, item, index, width, state):
+        if width != self._width:
+            self._width = width
+            self._cache.clear()
+        key = (item, state)
+        text = self._cache.get(key)
+        if text is None:
+            self.misses += 1
+            text = self.layout(item, index, width, state)
+            if len(self._cache) >= self.MAX_CACHED:
+                self._cache.clear()
+            self._cache[key] = text
+        else:
+            self.hits += 1
+        return text
+
+    def rows(self, items, width, height, state_for, cursor=None):
+        # [(index, text)] for the rows in view, scrolled to `cursor` if given
+        if cursor is not None:
+            self.scroll_to(cursor, len(items), height)
+        else:
+            self.top = max(0, min(self.top, len(items) - height))
+        end = min(len(items), self.top + height)
+        return [(i, self.row(items[i], i, width, state_for(i))) for i in range(self.top, end)]
@@ -0,0 +1,236 @@
+# loudness.py
+# Offline loudness analysis for volume-normalized playback. Local and cached
+# files are decoded to PCM and measured in a background process pool:
+# integrated loudness per BS.1770 / EBU R128 (400 ms blocks, 75% overlap,
+# -70 LUFS absolute and -10 LU relative gate) and sample peak. The K-weighting
+# is applied in the frequency domain per 100 ms segment (|H(f)|^2 of the
+# standard filters on the rfft bins) so everything stays vectorized NumPy,
+# at the cost of ignoring the filters' phase/transient behaviour across
+# segment edges; close enough for a playback gain.
+#
+# numpy is optional (imported in the workers only); without it nothing is
+# analyzed and tracks play at the plain volume. Non-WAV files are decoded by
+# ffmpeg, or by mpv when ffmpeg isn't installed.
+import os
+import math
+import wave
+import shutil
+import threading
+import subprocess
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+RATE = 48000            # decode rate for ffmpeg/mpv; the K filter is defined here
+SEG = 0.1               # seconds per segment, gating blocks are 4 segments
+READ_SECS = 10          # PCM read per step, keeps memory flat on hour-long files
+ABS_GATE = -70.0
+MAX_BOOST = 12.0
+MAX_CUT = -20.0
+MAX_RESTARTS = 3        # broken pools replaced before analysis is switched off
+
+# BS.1770 K-weighting at 48 kHz: high-shelf pre-filter, then RLB high-pass
+_K_STAGES = (
+    ((1.53512485958697, -2.69169618940638, 1.19839281085285), (1.0, -1.69065929318241, 0.73248077421585)),
+    ((1.0, -2.0, 1.0), (1.0, -1.99004745483398, 0.99007225036621)),
+)
+
+def available():
+    return importlib.util.find_spec("numpy") is not None
+
+def _k_weights(np, n, rate):
+    # per-bin factors so that mean(k_weighted(x)**2) == sum(w * |rfft(x)|**2)
+    f = np.fft.rfftfreq(n, 1.0 / rate)
+    z = np.exp(-1j * 2 * np.pi * np.minimum(f, RATE / 2) / RATE)
+    h = np.ones_like(z)
+    for b, a in _K_STAGES:
+        h = h * (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+    parseval = np.full(len(f), 2.0)
+    parseval[0] = 1.0
+    if n % 2 == 0:
+        parseval[-1] = 1.0
+    return np.abs(h) ** 2 * parseval / (n * n)
+
+def _to_float(np, raw, width):
+    if width == 1:
+        return (np.frombuffer(raw, np.uint8).astype(np.float32) - 128) / 128
+    if width == 2:
+        return np.frombuffer(raw, "<i2").astype(np.float32) / 32768
+    if width == 3:
+        b = np.frombuffer(raw, np.uint8).reshape(-1, 3).astype(np.int32)
+        v = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        v = np.where(v >= 1 << 23, v - (1 << 24), v)
+        return v.astype(np.float32) / (1 << 23)
+    return np.frombuffer(raw, "<i4").astype(np.float32) / 2 ** 31
+
+def _wav_source(np, path):
+    w = wave.open(path, "rb")
+    ch, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+    def chunks():
+        with w:
+            while True:
+                raw = w.readframes(rate * READ_SECS)
+                if not raw:
+                    return
+                yield _to_float(np, raw, width).reshape(-1, ch)
+    return rate, chunks()
+
+def _decoder_cmd(path):
+    if shutil.which("ffmpeg"):
+        return ["ffmpeg", "-v", "error", "-nostdin", "-i", path, "-vn",
+                "-f", "f32le", "-ac", "2", "-ar", str(RATE), "-"]
+    if shutil.which("mpv"):
+        return ["mpv", "--no-config", "--really-quiet", "--no-video", "--ao=pcm",
+                "--ao-pcm-file=/dev/stdout", "--ao-pcm-waveheader=no", "--audio-format=float",
+                f"--audio-samplerate={RATE}", "--audio-channels=stereo", path]
+    raise RuntimeError("ffmpeg or mpv is needed to decode " + path)
+
+def _pipe_source(np, path):
+    cmd = _decoder_cmd(path)
+    def chunks():
+        proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL)
+        carry = b""
+        try:
+            while True:
+                raw = proc.stdout.read(RATE * 8 * READ_SECS)
+                if not raw:
+                    break
+                raw = carry + raw
+                cut = len(raw) - len(raw) % 8      # whole stereo float frames only
+                carry = raw[cut:]
+                yield np.frombuffer(raw[:cut], "<f4").reshape(-1, 2)
+        finally:
+            proc.stdout.close()
+            proc.kill()
+            proc.wait()
+    return RATE, chunks()
+
+def analyze_file(path):
+    # {"lufs", "peak", "secs"}; runs in the worker processes
+    import numpy as np
+    if path.lower().endswith(".wav"):
+        rate, chunks = _wav_source(np, path)
+    else:
+        rate, chunks = _pipe_source(np, path)
+    n = int(rate * SEG)
+    weights = _k_weights(np, n, rate)
+    seg_power = []
+    peak = 0.0
+    frames = 0
+    carry = None
+    for x in chunks:
+        if len(x):
+            peak = max(peak, float(np.abs(x).max()))
+            frames += len(x)
+        if carry is not None and len(carry):
+            x = np.concatenate([carry, x])
+        k = len(x) // n
+        carry = x[k * n:]
+        if k == 0:
+            continue
+        spec = np.fft.rfft(x[:k * n].reshape(k, n, x.shape[1]), axis=1)
+        # K-weighted mean square per segment, summed over channels (all weights 1)
+        seg_power.append(np.einsum("f,kfc->k", weights, spec.real ** 2 + spec.imag ** 2))
+    if not seg_power:
+        return {"lufs": None, "peak": peak, "secs": frames / rate}
+    z = np.concatenate(seg_power)
+    blocks = np.convolve(z, np.ones(4) / 4, mode="valid") if len(z) >= 4 else np.array([z.mean()])
+    with np.errstate(divide="ignore"):
+        levels = -0.691 + 10 * np.log10(blocks)
+    above = blocks[levels > ABS_GATE]
+    if not len(above):
+        return {"lufs": None, "peak": peak, "secs": frames / rate}    # silence
+    rel_gate = -0.691 + 10 * math.log10(above.mean()) - 10
+    gated = blocks[(levels > ABS_GATE) & (levels > rel_gate)]
+    lufs = -0.691 + 10 * math.log10(gated.mean())
+    return {"lufs": round(lufs, 2), "peak": round(peak, 5), "secs": round(frames / rate, 2)}
+
+def gain_db(result, target):
+    # playback gain for an analyzed track: to the target, without pushing the peak past 0 dBFS
+    g = target - result["lufs"]
+    if result.get("peak"):
+        g = min(g, -20 * math.log10(result["peak"]))
+    return max(MAX_CUT, min(MAX_BOOST, g))
+
+def _lower_priority():
+    try:
+        os.nice(10)     # never compete with mpv for the cpu
+    except OSError:
+        pass
+
+
+class LoudnessAnalyzer:
+    # store: enrich.MetaStore, key -> analyze_file() result
+    def __init__(self, store, target=-14.0, workers=1):
+        self.store = store
+        self.target = target
+        self.workers = workers
+        self.analyzed = 0
+        self.failures = 0
+        self.restarts = 0
+        self.disabled = False
+        self._pool = None
+        self._pending = set()
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def gain_for(self, key):
+        r = self.store.get(key)
+        if not r or r.get("lufs") is None:
+            return None
+        return gain_db(r, self.target)
+
+    def submit(self, key, path):
+        # analyze `path` for `key` in the background, once
+        if self.store.get(key) is not None:
+            return
+        broken = fut = None
+        with self._lock:
+            if self.disabled or key in self._pending or key in self._failed:
+                return
+            self._pending.add(key)
+            try:
+                if self._pool is None:
+                    # spawn, not fork: the player has threads and mpv pipes open
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_lower_priority,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+                fut = self._pool.submit(analyze_file, path)
+            except (BrokenProcessPool, RuntimeError, OSError):
+                # a worker died (oom killer, a crashing decoder) and the pool stays
+                # broken: start a fresh one next time, a few times at most.
+                # This runs in the resolver, so it must never fail a play
+                self._pending.discard(key)
+                broken, self._pool = self._pool, None
+                self.restarts += 1
+                self.disabled = self.restarts > MAX_RESTARTS
+        if broken is not None:
+            broken.shutdown(wait=False, cancel_futures=True)
+        if fut is not None:
+            fut.add_done_callback(lambda f: self._done(key, f))
+
+    def _done(self, key, fut):
+        try:
+            result = fut.result()
+        except Exception:
+            result = None
+        with self._lock:
+            self._pending.discard(key)
+            if result is None:
+                self.failures += 1
+                self._failed.add(key)
+                return
+            self.analyzed += 1
+        self.store.put(key, result)
+
+    def stats(self):
+        return {"analyzed": self.analyzed, "failures": self.failures, "restarts": self.restarts,
+                "disabled": self.disabled, "pending": len(self._pending), "stored": len(self.store)}
+
+    def close(self):
+        with self._lock:
+            self.disabled = True    # a late submit() while quitting starts no new pool
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
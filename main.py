@@ -1,12 +1,30 @@
 # main.py
+import sys
 import curses
-from player import PlayerState
+import argparse
 from ui import TUI
 
-def main(stdscr):
-    player = PlayerState()
+def main(stdscr, attach=False):
+    if attach:
+        from client import RemotePlayer
+        player = RemotePlayer()
+    else:
+        from player import PlayerState
+        player = PlayerState()
+        player.restore_session()
     tui = TUI(stdscr, player)
-    tui.start()
+    tui.stop_on_quit = not attach
+    try:
+        tui.start()
+    finally:
+        player.shutdown()
 
 if __name__ == "__main__":
-    curses.wrapper(main)
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--daemon", action="store_true", help="run headless, controlled over a unix socket")
+    ap.add_argument("--attach", action="store_true", help="ui for the daemon (started if not running); Q detaches")
+    args = ap.parse_args()
+    if args.daemon:
+        import daemon
+        sys.exit(daemon.main())
+    curses.wrapper(main, args.attach)
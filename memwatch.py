@@ -0,0 +1,134 @@
+# memwatch.py
+# Memory budget for long sessions on low-RAM devices (old phones, a Pi).
+# A background thread samples RSS every `interval` seconds; over budget it runs
+# the registered trimmers (drop rebuildable state: pooled yt-dlp instances,
+# the jump index, ...), collects garbage and hands freed heap back to the os.
+# Still over after that: tracemalloc is switched on so the next report can say
+# which allocation sites hold the memory and which ones grew since then. With
+# trace_frames > 0 tracing runs from the start (costs cpu and its own memory).
+import gc
+import os
+import time
+import ctypes
+import threading
+import tracemalloc
+from utils import safe_write_json
+
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def rss_bytes():
+    # resident set size of this process, None where /proc isn't there
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024   # peak, not current
+    except (ImportError, OSError):
+        return None
+
+def _malloc_trim():
+    # glibc keeps freed arenas mapped; other libcs don't have this
+    try:
+        return bool(ctypes.CDLL(None).malloc_trim(0))
+    except (OSError, AttributeError):
+        return False
+
+def _site(stat):
+    frame = stat.traceback[0]
+    return f"{os.path.basename(frame.filename)}:{frame.lineno}"
+
+
+class MemoryWatch:
+    def __init__(self, budget_mb=None, interval=30.0, trace_frames=0, report_path=None):
+        self.budget = int(budget_mb * 1024 * 1024) if budget_mb else None
+        self.interval = interval
+        self.trace_frames = trace_frames
+        self.report_path = report_path
+        self.peak = 0
+        self.trims = 0
+        self.over = False
+        self._trimmers = []
+        self._baseline = None       # tracemalloc snapshot to diff against
+        self._stop = threading.Event()
+        self._thread = None
+        if trace_frames > 0:
+            self._start_trace(trace_frames)
+
+    def add_trimmer(self, fn):
+        # fn() drops state that can be rebuilt; called from the watch thread
+        self._trimmers.append(fn)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                pass
+
+    def _start_trace(self, frames):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, frames))
+        self._baseline = tracemalloc.take_snapshot()
+
+    def trim(self):
+        for fn in list(self._trimmers):
+            try:
+                fn()
+            except Exception:
+                pass
+        gc.collect()
+        _malloc_trim()
+        self.trims += 1
+
+    def check(self):
+        rss = rss_bytes()
+        if rss is None:
+            return None
+        self.peak = max(self.peak, rss)
+        if self.budget is None or rss <= self.budget:
+            self.over = False
+            return rss
+        self.trim()
+        rss = rss_bytes() or rss
+        if rss > self.budget and not self.over:
+            # crossed it for real: trace from here so the next report has holders
+            self.over = True
+            if self._baseline is None:
+                self._start_trace(self.trace_frames or 1)
+            if self.report_path:
+                try:
+                    safe_write_json(self.report_path, self.report())
+                except OSError:
+                    pass
+        return rss
+
+    def report(self, limit=10):
+        # {"rss", "peak", "budget", "trims", "tracing", "top": [...], "growth": [...]}
+        rss = rss_bytes()
+        out = {"rss": rss, "peak": max(self.peak, rss or 0), "budget": self.budget,
+               "over": self.over, "trims": self.trims, "tracing": tracemalloc.is_tracing(),
+               "ts": round(time.time(), 1)}
+        if not tracemalloc.is_tracing():
+            return out
+        snap = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        out["traced"] = tracemalloc.get_traced_memory()[0]
+        out["top"] = [{"site": _site(s), "bytes": s.size, "blocks": s.count}
+                      for s in snap.statistics("lineno")[:limit]]
+        if self._baseline is not None:
+            diff = snap.compare_to(self._baseline, "lineno")
+            out["growth"] = [{"site": _site(s), "bytes": s.size_diff, "blocks": s.count_diff}
+                             for s in diff[:limit] if s.size_diff > 0]
+        return out
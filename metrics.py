@@ -0,0 +1,95 @@
+# metrics.py
+# Timing spans for the hot path (search, extraction, mpv spawn/connect, time
+# to first audio). Recording is a deque append; percentiles are only computed
+# when someone asks (perf panel, bench), so leaving it on costs nothing.
+import json
+import time
+import threading
+from collections import deque
+
+# display order for the perf panel
+SPANS = ("search", "extract", "mpv_spawn", "ipc_connect", "loadfile", "first_audio", "play_to_audio",
+         "rebuffer")
+
+def _pct(sorted_vals, p):
+    i = min(len(sorted_vals) - 1, int(round(p / 100 * (len(sorted_vals) - 1))))
+    return sorted_vals[i]
+
+
+class Histogram:
+    # last `size` samples (seconds) + lifetime count/max
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, secs):
+        self.samples.append(secs)
+        self.count += 1
+        if secs > self.max:
+            self.max = secs
+
+    def summary(self):
+        vals = sorted(self.samples)
+        if not vals:
+            return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None, "last": None}
+        return {"count": self.count, "p50": _pct(vals, 50), "p95": _pct(vals, 95), "p99": _pct(vals, 99),
+                "max": self.max, "last": self.samples[-1]}
+
+
+class Metrics:
+    def __init__(self, path=None, window=200):
+        self.window = window
+        self.hists = {}
+        self._file = None
+        self._lock = threading.Lock()
+        if path:
+            try:
+                self._file = open(path, "a", encoding="utf-8")
+            except OSError:
+                self._file = None
+
+    def record(self, name, secs, **extra):
+        hist = self.hists.get(name)
+        if hist is None:
+            hist = self.hists.setdefault(name, Histogram(self.window))
+        hist.add(secs)
+        if self._file is not None:
+            line = dict(extra, span=name, secs=round(secs, 6), ts=round(time.time(), 3))
+            with self._lock:
+                try:
+                    self._file.write(json.dumps(line) + "\n")
+                    self._file.flush()
+                except (OSError, ValueError):
+                    pass
+
+    def span(self, name, **extra):
+        return _Span(self, name, extra)
+
+    def summary(self):
+        return {name: hist.summary() for name, hist in list(self.hists.items())}
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class _Span:
+    # with metrics.span("extract"): ...   (failed spans are recorded too, as "<name>_error")
+    __slots__ = ("metrics", "name", "extra", "t0")
+
+    def __init__(self, metrics, name, extra):
+        self.metrics = metrics
+        self.name = name
+        self.extra = extra
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        name = self.name if exc_type is None else self.name + "_error"
+        self.metrics.record(name, time.perf_counter() - self.t0, **self.extra)
+        return False
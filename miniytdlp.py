@@ -1,53 +1,273 @@
-import yt_dlp
-
-def search_youtube(query, max_results=5):
-    ydl_opts = {
-        "quiet": True,
-        "skip_download": True,
-        "extract_flat": True,
-        "default_search": "ytsearch",
-    }
+# miniytdlp.py
+import re
+import threading
+import itertools
+from streamprofile import select_format
+
+# yt_dlp is imported on first use (or by warm()), not at startup:
+# on a phone the import alone costs hundreds of ms before curses draws anything
+_yt_dlp = None
+_import_lock = threading.Lock()
+
+SEARCH_OPTS = {
+    "quiet": True,
+    "skip_download": True,
+    "extract_flat": True,
+    "default_search": "ytsearch",
+}
+
+# playlists / channels: flat entries, pages fetched only as they're consumed
+COLLECTION_OPTS = {
+    "quiet": True,
+    "skip_download": True,
+    "extract_flat": "in_playlist",
+    "lazy_playlist": True,
+    "ignoreerrors": True,
+}
+
+# single video metadata (title/duration/id), no format selection
+META_OPTS = {
+    "quiet": True,
+    "skip_download": True,
+    "noplaylist": True,
+}
+
+RESOLVE_OPTS = {
+    "format": "bestaudio/best",
+    "quiet": True,
+    "noplaylist": True,
+    "skip_download": True,
+    "extract_flat": False,
+}
+
+class Cancelled(Exception):
+    pass
+
+def _ytdlp():
+    global _yt_dlp
+    if _yt_dlp is None:
+        with _import_lock:
+            if _yt_dlp is None:
+                import yt_dlp
+                _yt_dlp = yt_dlp
+    return _yt_dlp
+
+
+# low-memory mode: no translated caption lists (the bulk of a youtube info
+# dict), and pooled instances are retired after a while, their extractors
+# cache player js per player version
+LOW_MEMORY_ARGS = {"youtube": {"skip": ["translated_subs"]}}
+LOW_MEMORY_USES = 25
+_low_memory = False
+
+class _YdlPool:
+    # configured YoutubeDL objects are reused; one object is never used by
+    # two threads at once, extra threads get their own instance
+    def __init__(self, opts):
+        self.opts = opts
+        self.created = 0
+        self._free = []
+        self._uses = {}         # id(ydl) -> extractions, low-memory mode only
+        self._lock = threading.Lock()
+
+    def _opts(self):
+        opts = dict(self.opts)
+        if _low_memory:
+            args = {k: dict(v) for k, v in (opts.get("extractor_args") or {}).items()}
+            for ie, extra in LOW_MEMORY_ARGS.items():
+                args.setdefault(ie, {}).update(extra)
+            opts["extractor_args"] = args
+        return opts
+
+    def acquire(self):
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            self.created += 1
+        return _ytdlp().YoutubeDL(self._opts())
+
+    def release(self, ydl):
+        with self._lock:
+            if _low_memory:
+                n = self._uses.pop(id(ydl), 0) + 1
+                if n >= LOW_MEMORY_USES or self._free:
+                    return      # retired, or one spare is enough
+                self._uses[id(ydl)] = n
+            self._free.append(ydl)
+
+    def clear(self):
+        with self._lock:
+            self._free = []
+            self._uses = {}
+
+
+_search_pool = _YdlPool(SEARCH_OPTS)
+_collection_pool = _YdlPool(COLLECTION_OPTS)
+_meta_pool = _YdlPool(META_OPTS)
+_resolve_pool = _YdlPool(RESOLVE_OPTS)
+_client_pools = {}      # youtube player_client -> pool, for hedged resolves
+
+def _resolve_pool_for(client):
+    if client is None:
+        return _resolve_pool
+    with _import_lock:
+        pool = _client_pools.get(client)
+        if pool is None:
+            opts = dict(RESOLVE_OPTS, extractor_args={"youtube": {"player_client": [client]}})
+            pool = _client_pools[client] = _YdlPool(opts)
+    return pool
+
+def _watch(ydl, cancel):
+    # the losing side of a hedged resolve stops at its next http request
+    orig = type(ydl).urlopen
+    def urlopen(req):
+        if cancel.is_set():
+            raise Cancelled()
+        return orig(ydl, req)
+    ydl.urlopen = urlopen
+
+def _pools():
+    with _import_lock:
+        return [_search_pool, _collection_pool, _meta_pool, _resolve_pool, *_client_pools.values()]
+
+def set_low_memory(on):
+    global _low_memory
+    _low_memory = bool(on)
+    trim()
+
+def trim():
+    # drop idle instances (and what their extractors cached); rebuilt on next use
+    for pool in _pools():
+        pool.clear()
+
+def warm():
+    # import yt_dlp and build one instance of each kind, off the ui thread
+    def run():
+        try:
+            for pool in (_search_pool, _resolve_pool):
+                pool.release(pool.acquire())
+        except Exception:
+            pass
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    return t
+
+
+def _item(e):
+    # flat entry -> (title, duration_str, url)
+    dur = e.get("duration")
+    if dur is None:
+        dur_str = "??:??"
+    else:
+        m, s = divmod(int(dur), 60)
+        dur_str = f"{m}:{s:02d}"
+    return (e.get("title") or "Unknown Title", dur_str, f"https://www.youtube.com/watch?v={e.get('id')}")
+
+_COLLECTION_RE = re.compile(r"^https?://(?:www\.|m\.|music\.)?youtube\.com/(?:playlist\?|@|channel/|c/|user/)")
+
+def is_collection_url(url):
+    # playlist / channel pages; a watch url (even with &list=) stays one video
+    return bool(_COLLECTION_RE.match(url))
+
+
+def search_youtube(query, max_results=5, on_result=None):
+    # on_result(item) is called as each entry comes in; returning False stops the search
     results = []
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(query, download=False)
-            entries = info.get("entries", [])
-            for e in entries[:max_results]:
-                title = e.get("title", "Unknown Title")
-                dur = e.get("duration")
-                if dur is None:
-                    dur_str = "??:??"
-                else:
-                    m, s = divmod(int(dur), 60)
-                    dur_str = f"{m}:{s:02d}"
-                url = f"https://www.youtube.com/watch?v={e.get('id')}"
-                results.append((title, dur_str, url))
+        ydl = _search_pool.acquire()
+        try:
+            # process=False keeps entries a lazy generator, pages are fetched as we go
+            info = ydl.extract_info(f"ytsearch{max_results}:{query}", download=False, process=False)
+            for e in itertools.islice(info.get("entries") or [], max_results):
+                results.append(_item(e))
+                if on_result is not None and on_result(results[-1]) is False:
+                    break
+        finally:
+            _search_pool.release(ydl)
     except Exception as e:
         print(f"[search_youtube ERROR] {e}")
     return results
 
 
-def get_audio_url(video_url):
-    ydl_opts = {
-        "format": "bestaudio/best",
-        "quiet": True,
-        "noplaylist": True,
-        "skip_download": True,
-        "extract_flat": False,
+def iter_collection(url, info=None):
+    # Yields (title, duration_str, url) for every video of a playlist or
+    # channel, one page at a time as the caller consumes them. info is set to
+    # {"title": ...} once the collection itself is known. A channel's tabs
+    # (Videos, Shorts, Live) are walked in turn.
+    ydl = _collection_pool.acquire()
+    try:
+        pending = [url]
+        seen_tabs = set()
+        while pending:
+            res = ydl.extract_info(pending.pop(0), download=False, process=False)
+            if not res:
+                continue
+            if info is not None and "title" not in info:
+                info["title"] = res.get("title") or url
+            for e in res.get("entries") or ():
+                if not e:
+                    continue
+                if e.get("ie_key") == "YoutubeTab" or e.get("_type") == "playlist":
+                    tab = e.get("url") or e.get("webpage_url")
+                    if tab and tab not in seen_tabs:
+                        seen_tabs.add(tab)
+                        pending.append(tab)
+                    continue
+                if e.get("id"):
+                    yield _item(e)
+    finally:
+        _collection_pool.release(ydl)
+
+
+def get_metadata(url):
+    # {"title", "duration", "id", "extractor"}; errors are raised so the
+    # caller can tell a rate limit (HTTP 429) from a dead video
+    ydl = _meta_pool.acquire()
+    try:
+        info = ydl.extract_info(url, download=False, process=False)
+    finally:
+        _meta_pool.release(ydl)
+    info = info or {}
+    dur = info.get("duration")
+    return {
+        "title": info.get("title"),
+        "duration": int(dur) if isinstance(dur, (int, float)) else None,
+        "id": info.get("id"),
+        "extractor": info.get("extractor_key") or info.get("ie_key"),
     }
+
+
+def get_audio_url(video_url, profile=None, client=None, cancel=None):
+    # profile: streamprofile name; picks from the formats yt-dlp already listed
+    # client: youtube player_client to extract with (None: yt-dlp's default)
+    # cancel: threading.Event, setting it aborts the extraction (returns None)
+    pool = _resolve_pool_for(client)
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl = pool.acquire()
+        if cancel is not None:
+            _watch(ydl, cancel)
+        try:
             info = ydl.extract_info(video_url, download=False)
-            # direct url
-            if "url" in info:
-                return info["url"]
-            # playlist entry
-            if "entries" in info and info["entries"]:
-                return info["entries"][0].get("url")
-            # fallback: first available format
-            for f in info.get("formats", []):
-                if f.get("url"):
-                    return f["url"]
+        finally:
+            if cancel is not None:
+                del ydl.urlopen
+            pool.release(ydl)
+        if profile:
+            f = select_format(info.get("formats"), profile)
+            if f is not None:
+                return f["url"]
+        # direct url
+        if "url" in info:
+            return info["url"]
+        # playlist entry
+        if "entries" in info and info["entries"]:
+            return info["entries"][0].get("url")
+        # fallback: first available format
+        for f in info.get("formats", []):
+            if f.get("url"):
+                return f["url"]
+    except Cancelled:
+        pass
     except Exception as e:
         print(f"[get_audio_url ERROR] {e}")
     return None
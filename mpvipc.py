@@ -0,0 +1,137 @@
+# mpvipc.py
+import json
+import socket
+import threading
+import time
+import itertools
+
+class MpvError(Exception):
+    pass
+
+
+class MpvIPC:
+    # JSON IPC client for one long-lived mpv (--input-ipc-server).
+    # Replies are matched by request_id; events (incl. observe_property
+    # changes) are pushed to on_event from the reader thread.
+    # Jangan panggil command() dari dalam on_event: reader-nya lagi nunggu kita.
+    def __init__(self, path, on_event=None, on_close=None):
+        self.path = path
+        self.on_event = on_event
+        self.on_close = on_close
+        self.connected = False
+        self._sock = None
+        self._ids = itertools.count(1)
+        self._pending = {}          # request_id -> [Event, reply]
+        self._observed = {}         # observe id -> property name
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._reader = None
+
+    def connect(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                s.connect(self.path)
+                break
+            except OSError:
+                s.close()
+                if time.monotonic() > deadline:
+                    raise MpvError(f"cannot connect to {self.path}")
+                time.sleep(0.02)
+        self._sock = s
+        self.connected = True
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    def _send(self, payload):
+        data = (json.dumps(payload) + "\n").encode("utf-8")
+        with self._send_lock:
+            try:
+                self._sock.sendall(data)
+            except (OSError, AttributeError) as e:
+                raise MpvError(f"send failed: {e}")
+
+    def command(self, *args, timeout=5.0):
+        if not self.connected:
+            raise MpvError("not connected")
+        rid = next(self._ids)
+        slot = [threading.Event(), None]
+        with self._lock:
+            self._pending[rid] = slot
+        try:
+            self._send({"command": list(args), "request_id": rid})
+            if not slot[0].wait(timeout):
+                raise MpvError(f"timeout: {args[0]}")
+        finally:
+            with self._lock:
+                self._pending.pop(rid, None)
+        reply = slot[1]
+        if reply is None:
+            raise MpvError("disconnected")
+        if reply.get("error") != "success":
+            raise MpvError(f"{args[0]}: {reply.get('error')}")
+        return reply.get("data")
+
+    def command_nowait(self, *args):
+        # fire and forget; the reply is dropped by the reader
+        if self.connected:
+            self._send({"command": list(args), "request_id": next(self._ids)})
+
+    def observe(self, name):
+        oid = len(self._observed) + 1
+        self._observed[oid] = name
+        self.command("observe_property", oid, name)
+        return oid
+
+    def _dispatch(self, msg):
+        if "event" in msg:
+            if self.on_event:
+                try:
+                    self.on_event(msg)
+                except Exception:
+                    pass
+            return
+        with self._lock:
+            slot = self._pending.get(msg.get("request_id"))
+        if slot:
+            slot[1] = msg
+            slot[0].set()
+
+    def _read_loop(self):
+        buf = b""
+        try:
+            while True:
+                chunk = self._sock.recv(65536)
+                if not chunk:
+                    break
+                buf += chunk
+                while b"\n" in buf:
+                    line, buf = buf.split(b"\n", 1)
+                    if not line.strip():
+                        continue
+                    try:
+                        msg = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._dispatch(msg)
+        except OSError:
+            pass
+        self.connected = False
+        with self._lock:
+            for slot in self._pending.values():
+                slot[0].set()
+        if self.on_close:
+            try:
+                self.on_close(self)
+            except Exception:
+                pass
+
+    def close(self):
+        self.connected = False
+        if self._sock:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
@@ -0,0 +1,259 @@
+# offline.py
+# Offline downloads: a saved playlist or the whole queue fetched in one go
+# before going somewhere without coverage. A few workers share one bandwidth
+# cap; each file is pulled in HTTP ranges into <file>.part, so a transfer cut
+# by a dead connection or a restart continues where it stopped (with a fresh
+# stream url, the old one has expired by then). Jobs live in a JSON lines
+# store next to the files and are picked up again on the next start. Unlike
+# audiocache.py nothing here is evicted.
+import os
+import time
+import threading
+import http.client
+import urllib.error
+import urllib.request
+from collections import deque
+from track import Track
+from enrich import MetaStore
+from utils import log_error
+from audiocache import CHUNK, USER_AGENT, _filename
+
+BLOCK = 64 * 1024           # read size, also the bandwidth cap's granularity
+RETRIES = 2                 # fresh stream url + resume, per job
+
+class RateLimit:
+    # token bucket shared by the workers; rate in bytes/s, None = no cap
+    def __init__(self, rate=None):
+        self.rate = rate
+        self._tokens = 0
+        self._t = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, n):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._t) * self.rate)
+            self._t = now
+            self._tokens -= n
+            wait = -self._tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+def fetch_resumable(url, part, limit, cancel, on_data, total=None, timeout=30):
+    # ranged GETs appended to `part`; returns the total size, or None if cancelled.
+    # total: size expected from an earlier attempt, a different one means
+    # another format and the partial file is thrown away
+    pos = os.path.getsize(part) if os.path.exists(part) else 0
+    with open(part, "ab") as f:
+        while total is None or pos < total:
+            req = urllib.request.Request(url, headers={
+                "User-Agent": USER_AGENT,
+                "Range": f"bytes={pos}-{pos + CHUNK - 1}",
+            })
+            try:
+                resp = urllib.request.urlopen(req, timeout=timeout)
+            except urllib.error.HTTPError as e:
+                if e.code == 416 and pos > 0 and total is None:
+                    break   # asked past the end of a file with unknown length
+                raise
+            got = 0
+            with resp:
+                rng = resp.headers.get("Content-Range")
+                if rng and "/" in rng and rng.rsplit("/", 1)[1].isdigit():
+                    size = int(rng.rsplit("/", 1)[1])
+                    if total is not None and size != total and pos:
+                        f.truncate(0)       # not the file we were resuming
+                        pos = 0
+                        total = size
+                        on_data(0, pos, total)
+                        continue
+                    total = size
+                if resp.status == 200:
+                    # server ignored Range: the whole file follows
+                    f.truncate(0)
+                    pos = 0
+                    total = int(resp.headers.get("Content-Length") or 0) or None
+                while True:
+                    if cancel.is_set():
+                        return None
+                    block = resp.read(BLOCK)
+                    if not block:
+                        break
+                    limit.take(len(block))
+                    f.write(block)
+                    pos += len(block)
+                    got += len(block)
+                    on_data(len(block), pos, total)
+            if not got or resp.status == 200:
+                break
+    return pos
+
+
+class DownloadManager:
+    # resolve(track, fresh) -> stream url, fresh=True on a retry (the last one
+    # may have expired); on_progress() is called (from worker
+    # threads, at most every `interval` s) when status() changed
+    def __init__(self, root, resolve, workers=2, rate=None, on_progress=None, interval=0.5):
+        self.root = root
+        self.resolve = resolve
+        self.workers = workers
+        self.limit = RateLimit(rate)
+        self.on_progress = on_progress
+        self.interval = interval
+        os.makedirs(root, exist_ok=True)
+        self.store = MetaStore(os.path.join(root, "jobs.jsonl"))
+        self._queue = deque()
+        self._queued = set()
+        self._active = {}           # key -> [title, pos, total]
+        self._cancel = threading.Event()
+        self._cv = threading.Condition()
+        self._threads = []
+        self._batch = {"total": 0, "done": 0, "failed": 0, "error": None}
+        self._recent = deque()      # (monotonic, bytes) of the last few seconds
+        self.bytes = 0
+        self._last_progress = 0.0
+
+    def _path(self, key):
+        return os.path.join(self.root, _filename(key))
+
+    def path_for(self, key):
+        job = self.store.get(key)
+        if job is None or job.get("status") != "done":
+            return None
+        path = self._path(key)
+        return path if os.path.exists(path) else None
+
+    def resume(self):
+        # jobs a previous run didn't finish
+        pending = [Track(job.get("title") or job["url"], job["url"])
+                   for key, job in self.store.items() if job.get("status") == "queued"]
+        if pending:
+            self.add(pending)
+
+    def add(self, tracks):
+        # queue tracks for download; returns how many weren't offline yet
+        added = 0
+        with self._cv:
+            if not self._queue and not self._active:
+                self._batch = {"total": 0, "done": 0, "failed": 0, "error": None}
+            self._cancel.clear()
+            for t in tracks:
+                key = t.key
+                if t.local or key in self._active or key in self._queued or self.path_for(key):
+                    continue
+                job = self.store.get(key) or {}
+                self.store.put(key, {"title": t.title, "url": t.url, "status": "queued",
+                                     "total": job.get("total")})
+                self._queue.append(key)
+                self._queued.add(key)
+                added += 1
+            self._batch["total"] += added
+            while len(self._threads) < self.workers:
+                th = threading.Thread(target=self._worker, daemon=True)
+                th.start()
+                self._threads.append(th)
+            self._cv.notify_all()
+        self._progress(force=True)
+        return added
+
+    def cancel(self):
+        # stop everything; partial files stay for the next add()
+        with self._cv:
+            for key in self._queue:
+                job = self.store.get(key)
+                if job is not None:
+                    self.store.put(key, dict(job, status="cancelled"))
+            self._queue.clear()
+            self._queued.clear()
+            self._cancel.set()
+        self._progress(force=True)
+
+    def status(self):
+        now = time.monotonic()
+        with self._cv:
+            while self._recent and now - self._recent[0][0] > 5.0:
+                self._recent.popleft()
+            window = now - self._recent[0][0] if self._recent else 0
+            rate = sum(n for _, n in self._recent) / max(window, 1.0) if self._recent else 0.0
+            return dict(self._batch, queued=len(self._queue), bytes=self.bytes, rate=rate,
+                        active=[{"title": a[0], "pos": a[1], "total": a[2]} for a in self._active.values()])
+
+    def _progress(self, force=False):
+        if self.on_progress is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_progress < self.interval:
+            return
+        self._last_progress = now
+        try:
+            self.on_progress()
+        except Exception:
+            pass
+
+    def _worker(self):
+        while True:
+            with self._cv:
+                while not self._queue:
+                    self._cv.wait()
+                key = self._queue.popleft()
+                self._queued.discard(key)
+                job = self.store.get(key)
+                self._active[key] = [job["title"], 0, job.get("total")]
+            ok = False
+            error = None
+            try:
+                ok = self._download(key, job)
+            except Exception as e:
+                # one bad job fails on its own; the worker keeps going
+                # (player.log, not print: curses owns the terminal)
+                log_error(f"offline {job['url']}")
+                error = f"{job['title']}: {e!r}"
+            finally:
+                with self._cv:
+                    del self._active[key]
+                    cancelled = self._cancel.is_set() and not ok and error is None
+                    if ok:
+                        self._batch["done"] += 1
+                    elif not cancelled:
+                        self._batch["failed"] += 1
+                        if error is not None:
+                            self._batch["error"] = error
+                job = self.store.get(key)
+                status = "done" if ok else "cancelled" if cancelled else "failed"
+                self.store.put(key, dict(job, status=status, error=error))
+                self._progress(force=True)
+
+    def _download(self, key, job):
+        track = Track(job["title"], job["url"])
+        part = self._path(key) + ".part"
+        total = job.get("total")
+
+        def on_data(n, pos, size):
+            nonlocal total
+            with self._cv:
+                self.bytes += n
+                self._recent.append((time.monotonic(), n))
+                self._active[key][1:] = [pos, size]
+            if size != total:
+                total = size
+                self.store.put(key, dict(job, total=size))
+            self._progress()
+
+        for attempt in range(RETRIES):
+            if self._cancel.is_set():
+                return False
+            url = self.resolve(track, attempt > 0)
+            if not url:
+                continue
+            try:
+                size = fetch_resumable(url, part, self.limit, self._cancel, on_data, total)
+            except (OSError, http.client.HTTPException, ValueError):
+                continue    # expired url or a dropped connection: resume with a new one
+            if size is None:
+                return False
+            os.replace(part, self._path(key))
+            return True
+        return False
@@ -3,13 +3,65 @@ import threading
 import subprocess
 import time
 import os
-import socket
-import json
-import random
-from utils import get_socket_path
-from miniytdlp import search_youtube, get_audio_url   # 🔥 pakai wrapper lu
+import itertools
+import queue as queue_mod
+from collections import deque, namedtuple
+from utils import get_socket_path, get_cache_dir, log_error
+from track import Track, ShuffleOrder
+from config import load_config
+from urlcache import StreamCache
+from audiocache import AudioCache
+from mpvipc import MpvIPC, MpvError
+from metrics import Metrics
+from enrich import Enricher, MetaStore, merge
+from library import open_library
+from session import SessionJournal
+from streamprofile import PROFILES, DEFAULT_PROFILE, StreamStats, mpv_args
+from loudness import LoudnessAnalyzer, available as loudness_available
+from resolver import HedgedResolver
+from offline import DownloadManager
+from history import PlayHistory, is_skip
+from memwatch import MemoryWatch
+from miniytdlp import search_youtube, warm as warm_ytdlp, set_low_memory, trim as trim_ytdlp   # 🔥 pakai wrapper lu
+
+def is_url(query):
+    return query.startswith("http://") or query.startswith("https://")
+
+def fetch_info(query, max_results=5, on_result=None):
+    # search results as (title, duration_str, url); a url is taken as is
+    if is_url(query):
+        items = [("Direct URL", "??:??", query)]
+        if on_result is not None:
+            on_result(items[0])
+        return items
+    return search_youtube(query, max_results=max_results, on_result=on_result)
+
+def search_with_library(library, metrics, query, max_results=5, on_result=None):
+    # local library matches first (no network), youtube fills the rest
+    local = []
+    if library is not None:
+        try:
+            local = library.search(query, limit=max(1, max_results // 2))
+        except Exception:
+            log_error(f"library search {query!r}")    # not print: curses owns stdout
+    for item in local:
+        if on_result is not None and on_result(item) is False:
+            return local
+    if len(local) >= max_results:
+        return local    # "ytsearch0:" is an error, not an empty search
+    with metrics.span("search"):
+        return local + fetch_info(query, max_results - len(local), on_result)
+
+# what the ui reads; rebuilt by the owner thread, swapped in as one reference
+Snapshot = namedtuple("Snapshot", [
+    "queue", "idx", "playing", "paused", "loading", "stopped", "elapsed", "duration",
+    "volume", "repeat_song", "repeat_playlist", "shuffle", "radio", "error",
+], defaults=(False, None))
 
 class PlayerState:
+    # All state below is owned by one thread (_command_loop). Public methods
+    # only post commands; play requests carry a generation number so a newer
+    # request makes every older one a no-op, before or after extraction.
     def __init__(self):
         self.queue = []
         self.idx = -1
@@ -21,72 +73,932 @@ class PlayerState:
         self.repeat_song = False
         self.repeat_playlist = False
         self.shuffle = False
+        self._order = None      # ShuffleOrder while shuffle is on; queue keeps its order
         self.volume = 80
+        self.stopped = False
+        self.error = None             # last failed command, shown by the ui; traceback in player.log
         self._mpv_proc = None
+        self._ipc = None
         self._ipc_path = get_socket_path()
         self._ipc_lock = threading.Lock()
-        self._monitor_thread = None
-        self._monitor_stop = threading.Event()
+        # playlist_entry_id of the playing file / appended files -> queue index
+        self._current_entry = None
+        self._appended = {}
+        self._retried = False
+        self._fail_streak = 0
+        # prefetch / gapless handoff
+        self._prefetch_idx = None     # queue index yang udah di-append ke mpv
+        self._track_end_ts = None
+        self._track_started = False
+        self.gaps = deque(maxlen=100)  # detik antar lagu (track-to-track gap)
+        self._listeners = []
+        self.config = load_config()
+        low = self.config["low_memory"]
+        set_low_memory(low)
+        cache_path = None
+        if self.config["stream_cache_persist"]:
+            cache_path = os.path.join(get_cache_dir(), "stream_cache.json")
+        self.stream_cache = StreamCache(
+            maxsize=min(self.config["stream_cache_size"], 64) if low else self.config["stream_cache_size"],
+            margin=self.config["stream_cache_margin"],
+            path=cache_path,
+        )
+        self.stream_profile = self.config["stream_profile"]
+        if self.stream_profile not in PROFILES:
+            self.stream_profile = DEFAULT_PROFILE
+        self.stream_stats = StreamStats(self.stream_profile)
+        self._stall_t0 = None         # perf_counter when mpv paused for cache
+        self._file_size = None        # of the playing file, from mpv
+        self._counted = False         # its bytes are already in stream_stats
+        window = self.config["metrics_window"]
+        self.metrics = Metrics(self.config["metrics_file"], window=min(window, 50) if low else window)
+        alt = self.config["resolve_alt_client"]
+        self.resolver = HedgedResolver(self.metrics, [None, alt] if alt else [None],
+                                       delay=self.config["resolve_hedge_delay"])
+        self._play_t0 = None          # perf_counter of the play request / loadfile,
+        self._load_t0 = None          # cleared when the first time-pos arrives
+        offline_dir = self.config["offline_dir"] or os.path.join(get_cache_dir(), "offline")
+        self.audio_cache = None
+        if self.config["audio_cache"]:
+            audio_dir = self.config["audio_cache_dir"] or os.path.join(get_cache_dir(), "audio")
+            if os.path.realpath(audio_dir) == os.path.realpath(offline_dir):
+                # same file names there: the cache would evict offline downloads
+                audio_dir = os.path.join(audio_dir, "cache")
+            self.audio_cache = AudioCache(audio_dir, budget=self.config["audio_cache_bytes"])
+        self.downloads = DownloadManager(
+            offline_dir,
+            self.stream_url,
+            workers=self.config["offline_workers"],
+            rate=self.config["offline_rate_limit"],
+            on_progress=lambda: self._post("downloads"),
+        )
+        self.library = open_library(self.config)
+        if self.library is not None:
+            self.library.rescan_async()     # incremental, only changed files are re-read
+        self.loudness = None
+        if self.config["loudness_normalize"] and loudness_available():
+            self.loudness = LoudnessAnalyzer(
+                MetaStore(os.path.join(get_cache_dir(), "loudness.jsonl")),
+                target=self.config["loudness_target"],
+                workers=self.config["loudness_workers"],
+            )
+        self._gain = None             # dB currently set on mpv's @norm filter
+        self._resume = None           # (position, paused) for the play being resolved
+        self._seek_to = None          # restored position, seeked to once the file is loaded
+        self.session = None
+        # play history (history.py) and radio mode: when the queue runs low
+        # it's extended from the history, tracks resolved before they're due
+        self.history = None
+        if self.config["history"]:
+            self.history = PlayHistory(os.path.join(get_cache_dir(), "history.db"),
+                                       halflife_days=self.config["history_halflife_days"])
+        self.radio = bool(self.config["radio"]) and self.history is not None
+        self._heard = None            # Track playing now, recorded when it ends
+        self._heard_prev = None       # key of the last track actually listened to
+        self._radio_busy = False
+        self.enricher = None
+        if self.config["enrich"]:
+            self.enricher = Enricher(
+                self.snapshot, lambda: self._post("enriched"),
+                MetaStore(os.path.join(get_cache_dir(), "metadata.jsonl")),
+                workers=self.config["enrich_workers"],
+            )
+        # command pipeline
+        self._gens = itertools.count(1)
+        self._want_gen = 0
+        self._cmds = queue_mod.Queue()
+        self._resolve_cv = threading.Condition()
+        self._play_slot = None        # latest play request waiting for extraction
+        self._prefetch_slot = None
+        self._prefetch_cancel = None  # set by a play request to stop the running prefetch
+        self._running = True
+        self._snap = None
+        self._publish()
+        self._owner = threading.Thread(target=self._command_loop, daemon=True)
+        self._owner.start()
+        self._resolver = threading.Thread(target=self._resolve_loop, daemon=True)
+        self._resolver.start()
+        self.downloads.resume()       # offline jobs a previous run didn't finish
+        self.memwatch = None
+        if low or self.config["memory_budget_mb"] or self.config["memory_trace_frames"]:
+            self.memwatch = MemoryWatch(
+                self.config["memory_budget_mb"],
+                interval=self.config["memory_check_interval"],
+                trace_frames=self.config["memory_trace_frames"],
+                report_path=os.path.join(get_cache_dir(), "memory_report.json"),
+            )
+            self.memwatch.add_trimmer(trim_ytdlp)
+            self.memwatch.start()
+
+    # --- change notification (ui wakes on these instead of polling) ---
+    def add_listener(self, cb):
+        # cb(what): what is "state", "progress" or "queue"
+        self._listeners.append(cb)
+
+    def _notify(self, what="state"):
+        self._publish()
+        for cb in self._listeners:
+            try:
+                cb(what)
+            except Exception:
+                pass
+
+    def snapshot(self):
+        return self._snap
+
+    def _publish(self):
+        self._snap = Snapshot(
+            self.queue, self.idx, self.playing, self.paused, self.loading, self.stopped,
+            self.elapsed, self.duration, self.volume,
+            self.repeat_song, self.repeat_playlist, self.shuffle, self.radio, self.error,
+        )
+
+    # --- command pipeline ---
+    def _post(self, name, *args):
+        self._cmds.put((name, args))
+
+    def _new_gen(self):
+        gen = next(self._gens)
+        self._want_gen = gen
+        return gen
+
+    def _command_loop(self):
+        while self._running:
+            name, args = self._cmds.get()
+            try:
+                getattr(self, "_do_" + name)(*args)
+            except Exception as e:
+                log_error(f"_do_{name}")
+                # don't leave the bar on "Loading..." forever
+                self.loading = False
+                self.error = f"{name}: {e!r}"
+                try:
+                    self._notify("state")
+                except Exception:
+                    pass
+
+    def _resolve_loop(self):
+        # one extraction at a time; a play request always wins over prefetch,
+        # and cancels one that is already extracting
+        while self._running:
+            with self._resolve_cv:
+                while self._running and self._play_slot is None and self._prefetch_slot is None:
+                    self._resolve_cv.wait()
+                cancel = None
+                if self._play_slot is not None:
+                    kind, req = "loaded", self._play_slot
+                    self._play_slot = None
+                else:
+                    kind, req = "prefetched", self._prefetch_slot
+                    self._prefetch_slot = None
+                    cancel = self._prefetch_cancel = threading.Event()
+            if req is None or req[0] != self._want_gen:
+                continue    # superseded before extraction
+            gen, index, item = req[:3]
+            try:
+                stream_url = self.resolve(item, cancel=cancel)
+            except Exception as e:
+                # this is the only resolver thread: it must outlive any one track
+                log_error(f"resolve {item.url}")
+                if kind == "loaded":
+                    self._post("loaded", gen, index, item, None, f"resolve: {e!r}")
+                continue
+            finally:
+                with self._resolve_cv:
+                    self._prefetch_cancel = None
+            if cancel is not None and cancel.is_set():
+                continue    # a play came in; the prefetch is asked for again after it
+            self._post(kind, gen, index, item, stream_url, *req[3:])
+
+    def warm(self):
+        # import yt_dlp + build extractors in the background, after first frame
+        return warm_ytdlp()
 
     # --- fetch info pakai wrapper ---
-    def fetch_info(self, query, top_only=True, max_results=5):
-        if query.startswith("http://") or query.startswith("https://"):
-            # treat as URL
-            return [("Direct URL", "??:??", query)]
-        else:
-            return search_youtube(query, max_results=max_results)
+    def fetch_info(self, query, top_only=True, max_results=5, on_result=None):
+        if is_url(query):
+            return fetch_info(query, max_results, on_result)
+        return search_with_library(self.library, self.metrics, query, max_results, on_result)
+
+    # --- resolve (cached) ---
+    def resolve(self, item, cancel=None):
+        # local file if we have one, else a (cached) stream url;
+        # cancel: threading.Event, set it to give up on the extraction (None)
+        if item.local:
+            if not os.path.isfile(item.src):
+                return None
+            self._analyze(item.key, item.src)
+            return item.src
+        key = item.key
+        path = self.downloads.path_for(key)
+        if path is None and self.audio_cache is not None:
+            path = self.audio_cache.path_for(key)
+        if path:
+            self._analyze(key, path)
+            return path
+        stream_url = self.stream_url(item, cancel=cancel)
+        if stream_url and self.audio_cache is not None:
+            self.audio_cache.fetch(key, stream_url)
+        return stream_url
+
+    def stream_url(self, item, fresh=False, cancel=None):
+        # (cached) network url, also used by the offline downloader;
+        # fresh=True when the cached one didn't work.
+        # urls differ per profile (another format), the downloaded audio doesn't
+        skey = f"{item.key}@{self.stream_profile}"
+        if fresh:
+            self.stream_cache.invalidate(skey)
+        stream_url = self.stream_cache.get(skey)
+        if not stream_url:
+            with self.metrics.span("extract"):
+                stream_url = self.resolver.resolve(item.url, self.stream_profile, cancel)
+            if stream_url:
+                self.stream_cache.put(skey, stream_url)
+        return stream_url
+
+    # --- session ---
+    def restore_session(self):
+        # main.py / daemon: pick up where the last run quit (or crashed), then keep journaling
+        if not self.config["session_restore"] or self.session is not None:
+            return None
+        journal = SessionJournal(os.path.join(get_cache_dir(), "session.jsonl"),
+                                 checkpoint=self.config["session_checkpoint"])
+        state = journal.load()
+        if state is not None:
+            self._post("restore", state)
+        journal.attach(self)
+        self.session = journal
+        return state
 
+    # --- public api: everything below just posts ---
     def add_items(self, items):
         # items: list of (title, duration_str, url)
-        for t, d, u in items:
-            self.queue.append({"title": t, "duration_str": d, "url": u})
+        self._post("add", [Track.from_item(it) for it in items])
 
     def add_top(self, item):
-        t, d, u = item
-        self.queue.append({"title": t, "duration_str": d, "url": u})
+        self.add_items([item])
+
+    def append_entries(self, entries):
+        # entries: Tracks, e.g. from playlists.iter_playlist_batches
+        self._post("add", list(entries))
+
+    def set_queue(self, items):
+        self._post("set_queue", list(items))
+
+    def play_index(self, index, auto=False):
+        self._post("play", index, auto, self._new_gen())
+
+    def next(self):
+        self._post("next")
+
+    def prev(self):
+        self._post("prev")
+
+    def toggle_pause(self):
+        self._post("toggle_pause")
+
+    def set_visible(self, start, end):
+        # queue rows on screen, enriched before the rest
+        if self.enricher is not None:
+            self.enricher.focus(start, end)
+
+    def download_offline(self, entries):
+        # Tracks to keep on disk for offline playback; returns how many are new
+        return self.downloads.add(entries)
+
+    def cancel_downloads(self):
+        self.downloads.cancel()
+
+    def download_status(self):
+        return self.downloads.status()
 
-    # --- play control ---
-    def play_index(self, index):
+    def set_volume(self, vol):
+        self._post("volume", max(0, min(100, int(vol))))
+
+    def set_shuffle(self, on):
+        self._post("shuffle", bool(on))
+
+    def set_repeat_song(self, on):
+        self._post("flag", "repeat_song", bool(on))
+
+    def set_repeat_playlist(self, on):
+        self._post("flag", "repeat_playlist", bool(on))
+
+    def set_radio(self, on):
+        self._post("radio_mode", bool(on))
+
+    def stop(self):
+        self._new_gen()
+        self._post("stop")
+
+    def shutdown(self):
+        if self.session is not None:
+            self.session.close()    # before stop(), the journal keeps what was playing
+        self.stop()
+        self._post("quit")
+        self._owner.join(timeout=5)
+
+    # --- command handlers (owner thread) ---
+    def _step(self, step, wrap):
+        # queue index `step` tracks away in play order (shuffled or not)
+        if not self.queue or self.idx < 0:
+            return None
+        if self._order is not None:
+            return self._order.peek(step, wrap)
+        i = self.idx + step
+        if 0 <= i < len(self.queue):
+            return i
+        if wrap:
+            return i % len(self.queue)
+        return None
+
+    def next_index(self):
+        if self.repeat_song and 0 <= self.idx < len(self.queue):
+            return self.idx
+        return self._step(1, self.repeat_playlist)
+
+    def _set_idx(self, index):
+        self.idx = index
+        if self._order is not None:
+            self._order.jump(index)
+
+    def _do_add(self, entries):
+        nxt = self.next_index()
+        self.queue = self.queue + entries      # copy on write, ui keeps a consistent list
+        if self._order is not None:
+            self._order.extend(len(self.queue))
+        if self.next_index() != nxt:
+            self._invalidate_prefetch()
+        self._notify("queue")
+        if self.enricher is not None:
+            self.enricher.poke()
+
+    def _do_set_queue(self, entries):
+        self.queue = entries
+        if self.idx >= len(entries):
+            self.idx = -1
+        if self.shuffle:
+            self._order = ShuffleOrder(len(entries), self.idx)
+        self._invalidate_prefetch()
+        self._notify("queue")
+        if self.enricher is not None:
+            self.enricher.poke(reset=True)
+
+    def _do_restore(self, state):
+        self.queue = state["queue"]     # the journal's own list, so nothing gets rewritten
+        self.volume = max(0, min(100, int(state.get("volume", self.volume))))
+        self.repeat_song = bool(state.get("repeat_song"))
+        self.repeat_playlist = bool(state.get("repeat_playlist"))
+        self.shuffle = bool(state.get("shuffle"))
+        self.radio = bool(state.get("radio", self.radio)) and self.history is not None
+        idx = state.get("idx", -1)
+        self.idx = idx if isinstance(idx, int) and 0 <= idx < len(self.queue) else -1
+        self._order = ShuffleOrder(len(self.queue), self.idx) if self.shuffle else None
+        self._notify("queue")
+        if self.enricher is not None:
+            self.enricher.poke(reset=True)
+        if self.idx >= 0 and state.get("mode") in ("playing", "paused"):
+            self._do_play(self.idx, False, self._new_gen(), state.get("pos") or 0,
+                          state["mode"] == "paused")
+
+    def _do_downloads(self):
+        self._notify("downloads")
+
+    def _do_enriched(self):
+        # swap in filled-in Tracks; copy on write, so saved playlists see the change
+        results = self.enricher.take()
+        q = None
+        for i, key, meta in results:
+            if i < len(self.queue) and self.queue[i].key == key:
+                new = merge(self.queue[i], meta)
+                if new is not None:
+                    if q is None:
+                        q = list(self.queue)
+                    q[i] = new
+        self.enricher.applied([key for _, key, _ in results])
+        if q is not None:
+            self.queue = q
+            self._notify("queue")
+
+    def _do_shuffle(self, on):
+        # non-destructive: only the play order changes, idx/cursor stay valid
+        self.shuffle = on
+        self._order = ShuffleOrder(len(self.queue), self.idx) if on else None
+        self._invalidate_prefetch()
+        self._notify("state")
+
+    def _do_flag(self, name, on):
+        setattr(self, name, on)
+        self._invalidate_prefetch()
+        self._notify("state")
+
+    def _play(self, index, auto=False):
+        self._do_play(index, auto, self._new_gen())
+
+    def _do_play(self, index, auto, gen, start=None, paused=False):
+        # start/paused: resuming a restored session
+        if gen != self._want_gen:
+            return      # coalesced: a newer request is already queued
         if index < 0 or index >= len(self.queue):
             return
-        self.idx = index
+        self._history_end(False)
+        if self._appended and self._ipc is not None:
+            # mpv would go on to the prefetched entry when the old file ends
+            try:
+                self._ipc.command("playlist-clear")
+            except MpvError:
+                pass
+        self._appended.clear()
+        self._prefetch_idx = None
+        self._prefetch_slot = None
+        self._set_idx(index)
         item = self.queue[self.idx]
+        self._resume = (start, paused) if start is not None else None
         self.loading = True
         self.playing = False
+        self.paused = paused
+        self.stopped = False
+        self.elapsed = start or 0
+        self.duration = 0
+        if not auto:
+            # user jump, bukan gap antar lagu
+            self._track_end_ts = None
+        self._play_t0 = time.perf_counter()
+        self._load_t0 = None
+        self._notify("state")
+        with self._resolve_cv:
+            self._play_slot = (gen, index, item)
+            if self._prefetch_cancel is not None:
+                self._prefetch_cancel.set()
+            self._resolve_cv.notify()
+
+    def _do_loaded(self, gen, index, item, stream_url, error=None):
+        if gen != self._want_gen:
+            return      # superseded while extracting; the url still went into the cache
+        if not stream_url:
+            self.loading = False
+            self.playing = False
+            if error:
+                self.error = error
+            self._notify("state")
+            # skip tracks that fail to resolve, but don't spin on a dead queue
+            self._fail_streak += 1
+            nxt = self.next_index()
+            if nxt is not None and self._fail_streak < len(self.queue):
+                self._play(nxt, auto=True)
+            return
+        self._set_idx(index)
+        start, paused = self._resume or (None, False)
+        self._resume = None
+        try:
+            self._start_mpv(stream_url, paused)
+            self._seek_to = start or None
+            self._apply_gain(item.key)
+        except MpvError:
+            self.loading = False
+            self.playing = False
+            self._notify("state")
+            return
+        self._fail_streak = 0
+        self.error = None
+        self.playing = True
+        self.loading = False
+        self._notify("state")
+        self._history_begin(item)
+        self._prefetch_next()
+
+    def _do_next(self):
+        nxt = self._step(1, self.repeat_playlist)
+        if nxt is None:
+            return
+        if nxt == self._prefetch_idx and self._ipc is not None:
+            # already appended in mpv, just skip to it
+            try:
+                self._new_gen()
+                self._track_end_ts = None
+                self._history_end(False)
+                self._leave_track()
+                self._ipc.command("playlist-next", "force")
+                return
+            except MpvError:
+                pass
+        self._play(nxt)
+
+    def _do_prev(self):
+        prv = self._step(-1, self.repeat_playlist)
+        if prv is not None:
+            self._play(prv)
+
+    def _do_toggle_pause(self):
+        if self._ipc is None:
+            return
+        try:
+            self._ipc.command("cycle", "pause")
+        except MpvError:
+            pass
+
+    def _do_volume(self, vol):
+        self.volume = vol
+        if self._ipc is not None:
+            try:
+                self._ipc.command("set_property", "volume", self.volume)
+            except MpvError:
+                pass
+        self._notify("state")
+
+    def _do_stop(self):
+        self._history_end(False, count_skip=False)
+        self._leave_track()
+        self.stopped = True
+        self._prefetch_idx = None
+        self._appended.clear()
+        if self._ipc is not None:
+            try:
+                self._ipc.command("stop")
+            except MpvError:
+                pass
+        self.playing = False
+        self.paused = False
+        self.loading = False
         self.elapsed = 0
-        self.duration = 0  # kita gak punya durasi numerik, cuma string
+        self.duration = 0
+        self._play_t0 = self._load_t0 = None
+        self._seek_to = None
+        self._notify("state")
 
-        def worker():
-            stream_url = get_audio_url(item["url"])
-            if not stream_url:
-                self.loading = False
-                self.playing = False
+    def _do_quit(self):
+        self._running = False
+        with self._resolve_cv:
+            self._resolve_cv.notify_all()
+        with self._ipc_lock:
+            if self._ipc is not None:
+                try:
+                    self._ipc.command_nowait("quit")
+                except MpvError:
+                    pass
+            self._kill_mpv()
+        self.metrics.close()
+        self.resolver.close()
+        if self.history is not None:
+            self.history.close()
+        if self.memwatch is not None:
+            self.memwatch.close()
+        if self.enricher is not None:
+            self.enricher.close()
+        if self.loudness is not None:
+            self.loudness.close()
+
+    # --- mpv (one long-lived instance) ---
+    def _ensure_mpv(self):
+        with self._ipc_lock:
+            proc = self._mpv_proc
+            if self._ipc is not None and self._ipc.connected and proc and proc.poll() is None:
+                return self._ipc
+            self._kill_mpv()
+            try:
+                if os.path.exists(self._ipc_path):
+                    os.remove(self._ipc_path)
+            except Exception:
+                pass
+            cmd = [
+                "mpv", "--no-video", "--quiet", "--idle=yes", "--gapless-audio=yes",
+                f"--input-ipc-server={self._ipc_path}",
+                f"--volume={self.volume}",
+            ] + mpv_args(self.stream_profile)
+            with self.metrics.span("mpv_spawn"):
+                self._mpv_proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            ipc = MpvIPC(self._ipc_path,
+                         on_event=lambda msg: self._post("mpv_event", msg),
+                         on_close=lambda ipc: self._post("mpv_closed", ipc))
+            try:
+                with self.metrics.span("ipc_connect"):
+                    ipc.connect()
+                for name in ("time-pos", "duration", "pause", "eof-reached", "paused-for-cache", "file-size"):
+                    ipc.observe(name)
+            except MpvError:
+                ipc.close()
+                self._kill_mpv()
+                raise
+            self._ipc = ipc
+            return ipc
+
+    def _kill_mpv(self):
+        self._gain = None
+        ipc, self._ipc = self._ipc, None
+        if ipc is not None:
+            ipc.close()
+        proc, self._mpv_proc = self._mpv_proc, None
+        if proc and proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=2)
+            except Exception:
+                proc.kill()
+
+    def _start_mpv(self, stream_url, paused=False):
+        self._leave_track()
+        ipc = self._ensure_mpv()
+        self._seek_to = None
+        self._prefetch_idx = None
+        self._appended.clear()
+        self._track_started = False
+        self._load_t0 = time.perf_counter()
+        with self.metrics.span("loadfile"):
+            data = ipc.command("loadfile", stream_url, "replace")
+        self._current_entry = data.get("playlist_entry_id") if isinstance(data, dict) else None
+        self._new_file()
+        ipc.command("set_property", "pause", paused)
+
+    def _do_mpv_closed(self, ipc):
+        if ipc is self._ipc:
+            self._ipc = None
+            self.playing = False
+            self.paused = False
+            self._notify("state")
+
+    def _do_mpv_event(self, msg):
+        ev = msg.get("event")
+        if ev == "property-change":
+            name, data = msg.get("name"), msg.get("data")
+            if name == "time-pos" and isinstance(data, (int, float)):
+                if self.loading or self._seek_to is not None:
+                    return      # still the old file while the new one resolves, or not seeked yet
+                if not self._track_started and data > 0:
+                    self._mark_track_start(data)
+                    self._mark_first_audio()
+                # mpv sends time-pos many times a second, the bar only shows whole seconds
+                tick = int(data) != int(self.elapsed or 0)
+                self.elapsed = data
+                if tick:
+                    self._notify("progress")
+            elif name == "duration" and isinstance(data, (int, float)):
+                self.duration = data
+                self._notify("progress")
+            elif name == "pause":
+                self.paused = bool(data)
+                self._notify("state")
+            elif name == "eof-reached" and data:
+                self._mark_track_end(time.time())
+            elif name == "paused-for-cache":
+                self._on_cache_pause(bool(data))
+            elif name == "file-size" and isinstance(data, (int, float)):
+                self._file_size = data
+        elif ev == "file-loaded" and self._seek_to is not None:
+            pos, self._seek_to = self._seek_to, None
+            try:
+                self._ipc.command("seek", pos, "absolute")
+            except MpvError:
+                pass
+        elif ev == "start-file":
+            eid = msg.get("playlist_entry_id")
+            if eid is not None and eid in self._appended and not self.loading:
+                # gapless handoff to the prefetched entry
+                self._set_idx(self._appended.pop(eid))
+                self._apply_gain(self.queue[self.idx].key)
+                self._current_entry = eid
+                self._new_file()
+                self._prefetch_idx = None
+                self._track_started = False
+                self._retried = False
+                self.elapsed = 0
+                self.duration = 0
+                self._notify("state")
+                self._history_begin(self.queue[self.idx])
+                self._prefetch_next()
+        elif ev == "end-file":
+            eid = msg.get("playlist_entry_id")
+            if eid is not None and eid != self._current_entry:
                 return
-            # panggil mpv langsung
-            self._start_mpv(stream_url)
-            self.playing = True
-            self.loading = False
-            if self._mpv_proc:
-                self._mpv_proc.wait()
+            if self.loading:
+                return      # the old file ending while the requested one resolves
+            reason = msg.get("reason")
+            if reason == "eof":
+                self._mark_track_end(time.time())
+                self._count_track(self._file_size, True)
+                self._history_end(True)
+                if not self._appended:
+                    self.playing = False
+                    self._notify("state")
+                    if not self.stopped:
+                        nxt = self.next_index()
+                        if nxt is not None:
+                            self._play(nxt, auto=True)
+            elif reason == "error":
+                self._on_play_error()
+
+    def _on_play_error(self):
+        # most likely an expired stream url from the cache: drop it, retry once
+        self._heard = None
+        self.playing = False
+        self._notify("state")
+        if 0 <= self.idx < len(self.queue):
+            key = self.queue[self.idx].key
+            self.stream_cache.invalidate(f"{key}@{self.stream_profile}")
+            if self.audio_cache is not None:
+                self.audio_cache.remove(key)
+            if not self._retried:
+                self._retried = True
+                self._play(self.idx, auto=True)
+                return
+        self._retried = False
 
-        threading.Thread(target=worker, daemon=True).start()
+    # --- prefetch next + gapless handoff ---
+    def _prefetch_next(self):
+        nxt = self.next_index()
+        if nxt is None or self._prefetch_idx is not None or self.stopped or self._ipc is None:
+            return
+        with self._resolve_cv:
+            self._prefetch_slot = (self._want_gen, nxt, self.queue[nxt], self._ipc)
+            self._resolve_cv.notify()
 
-    def _start_mpv(self, stream_url):
+    def _do_prefetched(self, gen, nxt, item, stream_url, ipc):
+        if gen != self._want_gen or not stream_url or ipc is not self._ipc:
+            return
+        # queue berubah selama resolve -> buang
+        if self.next_index() != nxt or self.queue[nxt] is not item or self._prefetch_idx is not None:
+            return
         try:
-            if os.path.exists(self._ipc_path):
-                os.remove(self._ipc_path)
+            data = ipc.command("loadfile", stream_url, "append")
+        except MpvError:
+            return
+        eid = data.get("playlist_entry_id") if isinstance(data, dict) else None
+        if eid is not None:
+            self._appended[eid] = nxt
+            self._prefetch_idx = nxt
+
+    def _invalidate_prefetch(self):
+        # queue / repeat / shuffle changed: drop what mpv has queued after the current file
+        if self._prefetch_idx is not None and self._ipc is not None:
+            try:
+                self._ipc.command("playlist-clear")
+            except MpvError:
+                pass
+        self._prefetch_idx = None
+        self._prefetch_slot = None
+        self._appended.clear()
+        if self.playing:
+            self._prefetch_next()
+
+    # --- play history + radio ---
+    def _history_begin(self, item):
+        if self.history is None:
+            return
+        self._heard = item
+        self._radio_fill()
+
+    def _history_end(self, completed, count_skip=True):
+        # the playing track ends: finished, skipped, or stopped (count_skip=False:
+        # stopping or quitting halfway isn't held against it)
+        item, self._heard = self._heard, None
+        if item is None:
+            return
+        duration = self.duration or item.duration
+        if is_skip(self.elapsed, duration, completed):
+            if count_skip:
+                self.history.record(item, self.elapsed, duration, completed, self._heard_prev)
+            return
+        self.history.record(item, self.elapsed, duration, completed, self._heard_prev)
+        self._heard_prev = item.key
+
+    def _do_radio_mode(self, on):
+        self.radio = on and self.history is not None
+        self._notify("state")
+        self._radio_fill()
+
+    def _radio_fill(self):
+        # fewer than radio_ahead tracks left in play order: pick more off the owner thread
+        ahead = self.config["radio_ahead"]
+        if (not self.radio or self._radio_busy or self.repeat_song or self.repeat_playlist
+                or not 0 <= self.idx < len(self.queue)):
+            return
+        left = next((k for k in range(1, ahead + 1) if self._step(k, False) is None), ahead + 1) - 1
+        if left >= ahead:
+            return
+        seeds = [self.queue[i].key for i in range(self.idx, max(-1, self.idx - 3), -1)]
+        exclude = {t.key for t in self.queue[-500:]}
+        self._radio_busy = True
+        threading.Thread(target=self._radio_pick, args=(seeds, exclude, ahead - left),
+                         daemon=True).start()
+
+    def _radio_pick(self, seeds, exclude, count):
+        picks = []
+        try:
+            picks = self.history.radio(seeds, count, exclude)
+            for t in picks:
+                # resolved now, so the prefetch of each one is a cache hit
+                if not t.local and self.downloads.path_for(t.key) is None:
+                    self.stream_url(t)
         except Exception:
             pass
+        self._post("radio", picks)
+
+    def _do_radio(self, picks):
+        self._radio_busy = False
+        if not picks or not self.radio:
+            return
+        ended = not (self.playing or self.loading or self.stopped) and self.next_index() is None
+        first = len(self.queue)
+        self._do_add(picks)
+        if ended:
+            self._play(first, auto=True)    # the queue ran out while picking
+
+    # --- stream cost: bytes per track, rebuffers ---
+    def _new_file(self):
+        self._file_size = None
+        self._counted = False
+        self._stall_t0 = None
+
+    def _count_track(self, nbytes, complete):
+        if not self._counted and nbytes:
+            self._counted = True
+            self.stream_stats.track(nbytes, self.elapsed, complete)
+
+    def _leave_track(self):
+        # skipped / stopped mid-track: count what mpv has read so far (readahead included)
+        if self._ipc is None or self._counted or self._current_entry is None:
+            return
+        try:
+            pos = self._ipc.command("get_property", "stream-pos")
+        except MpvError:
+            return
+        if isinstance(pos, (int, float)):
+            self._count_track(pos, False)
+
+    def _on_cache_pause(self, stalled):
+        # a stall after the track started playing, the initial fill doesn't count
+        now = time.perf_counter()
+        if stalled and self._track_started and not self.paused:
+            self._stall_t0 = now
+        elif not stalled and self._stall_t0 is not None:
+            secs = now - self._stall_t0
+            self._stall_t0 = None
+            self.metrics.record("rebuffer", secs)
+            self.stream_stats.rebuffer(secs)
+
+    # --- loudness normalization ---
+    def _analyze(self, key, path):
+        # resolver thread: measure files we have on disk, once, in the background
+        if self.loudness is not None:
+            self.loudness.submit(key, path)
+
+    def _apply_gain(self, key):
+        # per-track gain through an mpv audio filter; unanalyzed tracks play flat
+        if self.loudness is None or self._ipc is None:
+            return
+        gain = self.loudness.gain_for(key) or 0.0
+        if gain == self._gain:
+            return
+        try:
+            self._ipc.command("af", "remove", "@norm")
+        except MpvError:
+            pass    # not set yet
+        try:
+            if gain:
+                self._ipc.command("af", "add", f"@norm:lavfi-volume=volume={gain:.2f}dB")
+            self._gain = gain
+        except MpvError:
+            self._gain = None
+
+    def _mark_track_end(self, ts):
+        if self._track_end_ts is None:
+            self._track_end_ts = ts
+
+    def _mark_track_start(self, time_pos):
+        # estimated start of audio for the new track vs end of the previous one
+        if self._track_end_ts is not None:
+            started = time.time() - (time_pos or 0)
+            self.gaps.append(max(0.0, started - self._track_end_ts))
+            self._track_end_ts = None
+        self._track_started = True
+
+    def _mark_first_audio(self):
+        # first time-pos of a loadfile'd track (gapless handoffs don't count)
+        now = time.perf_counter()
+        if self._load_t0 is not None:
+            self.metrics.record("first_audio", now - self._load_t0)
+        if self._play_t0 is not None:
+            self.metrics.record("play_to_audio", now - self._play_t0)
+        self._load_t0 = self._play_t0 = None
 
-        cmd = [
-            "mpv", "--no-video", "--quiet",
-            f"--input-ipc-server={self._ipc_path}",
-            f"--volume={self.volume}", "--idle=no", stream_url
-        ]
-        self._mpv_proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        self._monitor_stop.clear()
-        self._monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
-        self._monitor_thread.start()
+    def memory_report(self, limit=10):
+        # rss / budget, tracemalloc's biggest allocation sites if tracing,
+        # and the sizes of the player's own long-lived collections
+        mw = self.memwatch or MemoryWatch()
+        out = mw.report(limit)
+        out["holders"] = {
+            "queue": len(self.queue),
+            "stream_cache": len(self.stream_cache),
+            "metadata": len(self.enricher.store) if self.enricher is not None else 0,
+            "loudness": len(self.loudness.store) if self.loudness is not None else 0,
+            "offline_jobs": len(self.downloads.store),
+        }
+        return out
 
-    # (sisanya tetap sama: stop, toggle_pause, set_volume, dll)
+    def history_stats(self):
+        return self.history.stats() if self.history is not None else None
 
+    def gap_stats(self):
+        if not self.gaps:
+            return {"count": 0, "last": None, "avg": None, "max": None}
+        g = list(self.gaps)
+        return {"count": len(g), "last": g[-1], "avg": sum(g) / len(g), "max": max(g)}
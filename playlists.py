@@ -1,22 +1,87 @@
 # playlists.py
+# Playlists are JSON Lines: one {"title", "duration_str", "url", "duration"} object per line.
+# Old .json playlists (one big array) are still read transparently.
 import os
 import json
+import itertools
 from utils import safe_write_json
+from track import Track
 
-def save_playlist_to(path, queue):
-    # queue is list of {"title":..., "url":...}
-    if not path.endswith(".json"):
-        path = path + ".json"
+EXT = ".jsonl"
+
+def _line(track):
+    return json.dumps(track.to_dict(), ensure_ascii=False, separators=(",", ":")) + "\n"
+
+def _is_prefix(old, new):
+    # same entry objects in the same order (the queue is copy-on-write)
+    return len(old) <= len(new) and all(a is b for a, b in zip(old, new))
+
+def save_playlist_to(path, queue, previous=None):
+    # queue is a list of Track
+    # previous: the list last saved to this path; if queue only grew since,
+    # just the new tail is appended instead of rewriting the file
+    if not path.endswith(EXT) and not path.endswith(".json"):
+        path = path + EXT
     os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    safe_write_json(path, queue)
+    if path.endswith(".json"):
+        safe_write_json(path, [t.to_dict() for t in queue])
+        return path
+    if previous is not None and os.path.exists(path) and _is_prefix(previous, queue):
+        append_to_playlist(path, queue[len(previous):])
+        return path
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.writelines(map(_line, queue))
+    os.replace(tmp, path)
+    return path
+
+def append_to_playlist(path, entries):
+    if not entries:
+        return path
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(map(_line, entries))
     return path
 
+def _clean(entry):
+    if not isinstance(entry, dict) or not entry.get("url"):
+        return None
+    return Track.from_dict(entry)
+
+def iter_playlist(path):
+    # yields Tracks as the file is read; legacy json arrays are parsed in one go
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        if head == "[":
+            f.seek(0)
+            data = json.load(f)
+            for e in data if isinstance(data, list) else []:
+                e = _clean(e)
+                if e is not None:
+                    yield e
+            return
+        f.seek(0)
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                e = _clean(json.loads(line))
+            except ValueError:
+                continue    # half-written last line after a crash
+            if e is not None:
+                yield e
+
+def iter_playlist_batches(path, size=2000):
+    it = iter_playlist(path)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
 def load_playlist_from(path):
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return data
-            return []
+        return list(iter_playlist(path))
     except Exception:
         return []
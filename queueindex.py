@@ -0,0 +1,152 @@
+# queueindex.py
+# Trigram index over queue titles for fuzzy jump-to-track. The queue is
+# copy-on-write, so sync() can tell from object identity what changed: an
+# appended tail (add_items, streamed playlist load) or a few replaced entries
+# (metadata enrichment) are indexed incrementally; only a different queue
+# (set_queue) is a rebuild. Shuffle never reorders the queue, so it costs
+# nothing here.
+import re
+import heapq
+import threading
+from array import array
+from collections import Counter
+
+_CLEAN_RE = re.compile(r"[^\w]+")
+
+def normalize(text):
+    return " " + _CLEAN_RE.sub(" ", (text or "").lower()).strip() + " "
+
+def trigrams(norm):
+    return {norm[i:i + 3] for i in range(len(norm) - 2)}
+
+
+class QueueIndex:
+    CHUNK = 2000            # titles indexed per lock hold, queries can cut in between
+    SCAN_BUDGET = 8000      # postings counted per query before trusting the rarest ones
+
+    def __init__(self):
+        self.entries = []   # the Track objects indexed, by queue position
+        self.titles = []    # normalized titles
+        self.postings = {}  # trigram -> array of queue positions (may hold stale ones)
+        self.stale = 0      # replaced entries whose old positions are still posted
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _add(self, i, track):
+        norm = normalize(track.title)
+        if i == len(self.titles):
+            self.entries.append(track)
+            self.titles.append(norm)
+        else:
+            self.entries[i] = track
+            self.titles[i] = norm
+        post = self.postings
+        for tg in trigrams(norm):
+            p = post.get(tg)
+            if p is None:
+                post[tg] = p = array("i")
+            p.append(i)
+
+    def _reset(self):
+        with self._lock:
+            self.entries = []
+            self.titles = []
+            self.postings = {}
+            self.stale = 0
+
+    def clear(self):
+        # drop it all, the next sync() rebuilds
+        with self._sync_lock:
+            self._reset()
+
+    def sync(self, queue):
+        # bring the index up to date with `queue` (a snapshot list)
+        with self._sync_lock:
+            old = self.entries
+            n = min(len(old), len(queue))
+            changed = [i for i in range(n) if old[i] is not queue[i]]
+            if (len(queue) < len(old) or len(changed) > max(100, n // 4)
+                    or self.stale + len(changed) > max(1000, n)):
+                # a rebuild also sheds the stale postings piled up by enrichment
+                self._reset()
+                changed, start = [], 0
+            else:
+                start = len(old)
+            if changed:
+                self.stale += len(changed)
+                with self._lock:
+                    # replaced entries: old positions stay in the postings and
+                    # are filtered out by the re-check in search()
+                    for i in changed:
+                        self._add(i, queue[i])
+            for lo in range(start, len(queue), self.CHUNK):
+                with self._lock:
+                    for i in range(lo, min(len(queue), lo + self.CHUNK)):
+                        self._add(i, queue[i])
+
+    def search(self, query, limit=50):
+        # [(score, queue index)], best first
+        q = normalize(query)
+        words = q.split()
+        if not words:
+            return []
+        with self._lock:
+            titles = self.titles
+            needle = q.strip()
+            if len(needle) < 2:
+                # one character: first titles with a word starting with it
+                parts = [q.rstrip()]
+                cand = self._first(titles, parts, limit)
+                grams = set()
+            elif len(needle) == 2:
+                # " ab" is a trigram too: words starting with the two letters
+                grams = set()
+                parts = [" " + needle]
+                p = self.postings.get(parts[0], ())
+                cand = set(p) if len(p) <= self.SCAN_BUDGET else self._first(titles, parts, limit)
+            else:
+                # no word-end trigram for the last word, it's probably still being typed
+                grams = trigrams(q.rstrip())
+                lists = sorted((self.postings.get(tg, ()) for tg in grams), key=len)
+            if grams and len(lists[0]) > self.SCAN_BUDGET:
+                # nothing selective in the query (every title says "track"):
+                # take the first titles with all the words instead of ranking them all
+                cand = self._first(titles, words, limit)
+            elif grams:
+                counts = Counter()
+                used = scanned = 0
+                for p in lists:
+                    if used and scanned + len(p) > self.SCAN_BUDGET:
+                        break       # the rarest ones already picked the candidates
+                    counts.update(p)
+                    scanned += len(p)
+                    used += 1
+                # with several lists counted, one shared trigram is just noise
+                need = 1 if used < 3 else 2
+                cand = [i for i, c in counts.items() if c >= need]
+            scored = []
+            for i in cand:
+                t = titles[i]
+                if not grams and not all(p in t for p in parts):
+                    continue    # stale posting: the title changed since (enrichment)
+                hit = sum(1 for tg in grams if tg in t) / len(grams) if grams else 1.0
+                if all(w in t for w in words):
+                    hit += 1.0
+                    if t.startswith(" " + words[0]):
+                        hit += 0.5
+                if hit >= 0.5:
+                    scored.append((hit, -i))
+        return [(s, -ni) for s, ni in heapq.nlargest(limit, scored)]
+
+    @staticmethod
+    def _first(titles, parts, limit):
+        out = []
+        for i, t in enumerate(titles):
+            if all(p in t for p in parts):
+                out.append(i)
+                if len(out) >= limit:
+                    break
+        return out
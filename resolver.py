@@ -0,0 +1,107 @@
+# resolver.py
+# Hedged stream resolution. An extraction that hits a slow or failing yt-dlp
+# client path can take 10+ s; instead of waiting it out, a second strategy
+# (another youtube player_client) starts after a hedge delay, or right away
+# when the first one fails, and whichever url comes back first wins. The
+# other one is cancelled: it stops at its next http request. Time to url is
+# recorded per strategy ("resolve:<client>" in metrics, p95/p99) to tune the
+# delay; delay "auto" hedges at the primary's own p95.
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from miniytdlp import get_audio_url
+
+AUTO_SAMPLES = 20           # primary samples needed before "auto" trusts its p95
+AUTO_DEFAULT = 2.0
+AUTO_RANGE = (0.5, 8.0)
+CANCEL_POLL = 0.05          # how often a waiting resolve() looks at the caller's cancel
+
+def span_name(client):
+    return "resolve:" + (client or "default")
+
+
+class HedgedResolver:
+    # clients: youtube player_clients in order, None is yt-dlp's default
+    def __init__(self, metrics, clients=(None,), delay=2.0):
+        self.metrics = metrics
+        self.clients = list(clients)
+        self.delay = delay
+        self.hedged = 0             # resolves that started more than one strategy
+        self.failed = 0
+        self.wins = {span_name(c): 0 for c in self.clients}
+        self._pool = ThreadPoolExecutor(max_workers=2 * len(self.clients))
+
+    def hedge_delay(self):
+        if self.delay != "auto":
+            return float(self.delay)
+        hist = self.metrics.hists.get(span_name(self.clients[0]))
+        if hist is None or len(hist.samples) < AUTO_SAMPLES:
+            return AUTO_DEFAULT
+        return max(AUTO_RANGE[0], min(AUTO_RANGE[1], hist.summary()["p95"]))
+
+    def _attempt(self, client, url, profile, cancel):
+        t0 = time.perf_counter()
+        stream_url = get_audio_url(url, profile, client=client, cancel=cancel)
+        name = span_name(client)
+        if cancel.is_set():
+            name += "_cancelled"    # lost the race, its time is only a lower bound
+        elif not stream_url:
+            name += "_error"
+        self.metrics.record(name, time.perf_counter() - t0)
+        return stream_url
+
+    def resolve(self, url, profile=None, cancel=None):
+        # cancel: the caller's threading.Event; once set, resolve() returns None
+        # right away and the attempts stop at their next http request
+        poll = CANCEL_POLL if cancel is not None else None
+        cancel = cancel or threading.Event()
+        waiting = list(self.clients)
+        pending = {}
+
+        def launch():
+            client = waiting.pop(0)
+            pending[self._pool.submit(self._attempt, client, url, profile, cancel)] = client
+
+        launch()
+        delay = self.hedge_delay()
+        hedge_at = time.monotonic() + delay
+        result = None
+        while pending and not cancel.is_set():
+            timeout = max(0.0, hedge_at - time.monotonic()) if waiting else None
+            if poll is not None:
+                timeout = poll if timeout is None else min(timeout, poll)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if waiting and time.monotonic() >= hedge_at:
+                    self.hedged += 1
+                    launch()
+                    hedge_at = time.monotonic() + delay
+                continue
+            for fut in done:
+                client = pending.pop(fut)
+                try:
+                    stream_url = fut.result()
+                except Exception:
+                    stream_url = None
+                if stream_url and result is None:
+                    result = stream_url
+                    self.wins[span_name(client)] += 1
+            if result is not None:
+                break
+            if waiting and not pending:
+                launch()        # failed fast: no point waiting out the delay
+                hedge_at = time.monotonic() + delay
+        cancelled = cancel.is_set() and result is None
+        cancel.set()
+        if cancelled:
+            return None
+        if result is None:
+            self.failed += 1
+        return result
+
+    def stats(self):
+        return {"delay": self.hedge_delay(), "hedged": self.hedged, "failed": self.failed,
+                "wins": dict(self.wins)}
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,131 @@
+# search.py
+import time
+import threading
+from collections import OrderedDict
+
+def normalize(query):
+    return " ".join(query.lower().split())
+
+
+class SearchCache:
+    # normalized query -> results, LRU bounded, entries expire after ttl seconds
+    def __init__(self, maxsize=64, ttl=600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            ent = self._entries.get(key)
+            if ent is not None:
+                if ent[1] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return ent[0]
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, results):
+        with self._lock:
+            self._entries[key] = (list(results), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def best_prefix(self, key):
+        # results of the longest cached query that key extends ("lo" -> "lofi")
+        now = time.monotonic()
+        best = None
+        with self._lock:
+            for k, (res, exp) in self._entries.items():
+                if exp > now and k != key and key.startswith(k) and (best is None or len(k) > len(best[0])):
+                    best = (k, res)
+        return best
+
+
+class Searcher:
+    # search-as-you-type: debounced, one request in flight, stale ones cut off
+    # at the next result they produce; on_update(query, results, done)
+    def __init__(self, fetch, on_update, debounce=0.3, cache=None):
+        self.fetch = fetch          # fetch(query, on_result) -> list; stops when on_result returns False
+        self.on_update = on_update
+        self.debounce = debounce
+        self.cache = cache or SearchCache()
+        self._gen = 0
+        self._pending = None        # (gen, query, due)
+        self._cv = threading.Condition()
+        self._worker = threading.Thread(target=self._loop, daemon=True)
+        self._worker.start()
+
+    def request(self, query):
+        key = normalize(query)
+        with self._cv:
+            self._gen += 1
+            gen = self._gen
+            self._pending = None
+        if not key:
+            self.on_update(query, [], True)
+            return
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.on_update(query, cached, True)
+            return
+        prefix = self.cache.best_prefix(key)
+        if prefix:
+            # show what we already have while the real search runs
+            words = key.split()
+            guess = [r for r in prefix[1] if all(w in r[0].lower() for w in words)]
+            self.on_update(query, guess, False)
+        with self._cv:
+            if gen == self._gen:
+                self._pending = (gen, query, time.monotonic() + self.debounce)
+                self._cv.notify()
+
+    def cancel(self):
+        with self._cv:
+            self._gen += 1
+            self._pending = None
+
+    def _loop(self):
+        while True:
+            with self._cv:
+                while True:
+                    if self._pending is None:
+                        self._cv.wait()
+                        continue
+                    wait = self._pending[2] - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cv.wait(wait)
+                gen, query, _ = self._pending
+                self._pending = None
+            self._run(gen, query)
+
+    def _run(self, gen, query):
+        results = []
+
+        def on_result(item):
+            if gen != self._gen:
+                return False
+            results.append(item)
+            self.on_update(query, list(results), False)
+            return True
+
+        try:
+            final = self.fetch(query, on_result)
+        except Exception:
+            final = None
+            failed = True   # this worker is the only one, it must survive any fetch error
+        else:
+            failed = False
+        if gen != self._gen:
+            return      # cut short, don't cache a partial list
+        if final is None:
+            final = results
+        if final and not failed:
+            self.cache.put(normalize(query), final)
+        self.on_update(query, list(final), True)
@@ -0,0 +1,205 @@
+# session.py
+# Crash-safe session: queue, current track, position and the repeat/shuffle/
+# volume settings survive a quit or a crash. Instead of rewriting the whole
+# session on every change, small records are appended to a journal:
+#   {"op": "reset"}                                  empty queue
+#   {"op": "add", "items": [[title, url, dur], ...]}  queue grew
+#   {"op": "upd", "index": [...], "items": [...]}     entries replaced (enrichment)
+#   {"op": "state", "data": {"idx": 3, ...}}         only the fields that changed
+#   {"op": "pos", "t": 123.4}                         position checkpoint
+# Once the journal is much bigger than the session it describes, it's
+# compacted: rewritten as reset + add + state + pos, so replay stays fast.
+# Writes happen on a background thread that diffs player snapshots (the
+# queue is copy-on-write, identity tells what changed), so bursts of changes
+# collapse into one append.
+import os
+import json
+import threading
+from track import Track
+
+CHUNK = 2000                # queue entries per "add" record
+
+def _item(t):
+    return [t.title, t.url, t.duration]
+
+def _track(it):
+    return Track(it[0] or it[1], it[1], it[2])
+
+def _encode(recs):
+    return b"".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+                    for r in recs)
+
+def _mode(snap):
+    if snap.idx < 0 or snap.stopped:
+        return "idle"
+    if (snap.playing or snap.loading) and snap.paused:
+        return "paused"
+    if snap.playing or snap.loading:
+        return "playing"
+    return "idle"
+
+def _state(snap):
+    return {"idx": snap.idx, "mode": _mode(snap), "volume": snap.volume,
+            "repeat_song": snap.repeat_song, "repeat_playlist": snap.repeat_playlist,
+            "shuffle": snap.shuffle, "radio": snap.radio}
+
+
+class SessionJournal:
+    def __init__(self, path, checkpoint=5.0, compact_bytes=1 << 20):
+        self.path = path
+        self.checkpoint = checkpoint        # seconds of playback between "pos" records
+        self.compact_bytes = compact_bytes
+        self.written = 0                    # bytes appended since start, for the bench
+        self.compactions = 0
+        self._size = 0                      # bytes in the journal file
+        self._base = 0                      # of which the last compacted session
+        self._queue = []                    # session as last written
+        self._state = {}
+        self._pos = None
+        self._player = None
+        self._file = None
+        self._dirty = False
+        self._running = False
+        self._cv = threading.Condition()
+        self._thread = None
+
+    # --- replay ---
+    def load(self):
+        # session dict {"queue": [Track], "pos", "idx", "mode", ...} or None
+        queue, state, pos = [], {}, None
+        good = 0
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                        op = rec["op"]
+                        if op == "reset":
+                            queue = []
+                        elif op == "add":
+                            queue.extend(map(_track, rec["items"]))
+                        elif op == "upd":
+                            for i, it in zip(rec["index"], rec["items"]):
+                                queue[i] = _track(it)
+                        elif op == "state":
+                            state.update(rec["data"])
+                        elif op == "pos":
+                            pos = rec["t"]
+                    except (ValueError, KeyError, IndexError, TypeError):
+                        break       # torn write at the end from a crash
+                    good += len(line)
+        except OSError:
+            return None
+        if good < os.path.getsize(self.path):
+            # cut the torn tail, or the next append would be glued onto it
+            os.truncate(self.path, good)
+        self._size = self._base = good
+        self._queue = queue
+        self._state = dict(state)
+        self._pos = pos
+        if not queue and not state:
+            return None
+        return dict(state, queue=queue, pos=pos)
+
+    # --- recording ---
+    def attach(self, player):
+        # start journaling `player`; call after its session was restored
+        self._player = player
+        self._running = True
+        self._file = open(self.path, "ab")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        player.add_listener(self._on_change)
+
+    def _on_change(self, what):
+        # player's owner thread: only flags, the writer does the work
+        with self._cv:
+            self._dirty = True
+            self._cv.notify()
+
+    def close(self):
+        # last write (with the exact position), before the player stops
+        with self._cv:
+            if not self._running:
+                return
+            self._running = False
+            self._cv.notify()
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            with self._cv:
+                while self._running and not self._dirty:
+                    self._cv.wait()
+                self._dirty = False
+                final = not self._running
+            try:
+                self._write(self._player.snapshot(), final)
+            except OSError:
+                pass
+            if final:
+                break
+        self._file.close()
+
+    def _write(self, snap, final=False):
+        old, new = self._queue, snap.queue
+        recs = []
+        if new is not old:
+            if len(old) <= len(new) and all(a is b for a, b in zip(old, new)):
+                for lo in range(len(old), len(new), CHUNK):
+                    recs.append({"op": "add", "items": [_item(t) for t in new[lo:lo + CHUNK]]})
+            else:
+                changed = None
+                if len(old) == len(new):
+                    changed = [i for i, (a, b) in enumerate(zip(old, new)) if a is not b]
+                if changed is None or len(changed) > max(100, len(new) // 4):
+                    self._compact(snap)
+                    return
+                recs.append({"op": "upd", "index": changed, "items": [_item(new[i]) for i in changed]})
+            self._queue = new
+        state = _state(snap)
+        diff = {k: v for k, v in state.items() if self._state.get(k) != v}
+        if diff:
+            recs.append({"op": "state", "data": diff})
+            self._state = state
+        pos = round(snap.elapsed or 0, 1)
+        if pos != self._pos and (diff or final or self._pos is None
+                                 or abs(pos - self._pos) >= self.checkpoint):
+            recs.append({"op": "pos", "t": pos})
+            self._pos = pos
+        if not recs:
+            return
+        data = _encode(recs)
+        self._file.write(data)
+        self._file.flush()      # in the os before the next crash; no fsync, flash lasts longer
+        self._size += len(data)
+        self.written += len(data)
+        if self._size > max(self.compact_bytes, 2 * self._base):
+            self._compact(snap)
+
+    def _compact(self, snap):
+        # rewrite the journal as the current session only
+        recs = [{"op": "reset"}]
+        for lo in range(0, len(snap.queue), CHUNK):
+            recs.append({"op": "add", "items": [_item(t) for t in snap.queue[lo:lo + CHUNK]]})
+        state = _state(snap)
+        pos = round(snap.elapsed or 0, 1)
+        recs.append({"op": "state", "data": state})
+        recs.append({"op": "pos", "t": pos})
+        data = _encode(recs)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._file.close()
+        self._file = open(self.path, "ab")
+        self._queue, self._state, self._pos = snap.queue, state, pos
+        self._size = self._base = len(data)
+        self.written += len(data)
+        self.compactions += 1
+
+    def stats(self):
+        return {"bytes": self._size, "base": self._base, "written": self.written,
+                "compactions": self.compactions}
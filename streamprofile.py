@@ -0,0 +1,103 @@
+# streamprofile.py
+# Stream profiles: which audio format to take from the list yt-dlp returns,
+# and how much mpv buffers ahead. On mobile data "data-saver" plays ~50 kbps
+# opus and keeps little readahead, so skipping a track wastes little; "best"
+# takes the highest bitrate and buffers minutes ahead to ride out bad spots.
+# StreamStats keeps what each profile actually cost (bytes mpv read per track,
+# rebuffers) so they can be compared.
+from collections import deque
+
+PROFILES = {
+    "data-saver": {
+        "codecs": ("opus",),
+        "max_abr": 64,              # kbps
+        "mpv": {"demuxer-max-bytes": "2MiB", "demuxer-readahead-secs": 20, "cache-secs": 20},
+    },
+    "balanced": {
+        "codecs": ("opus", "mp4a"),
+        "max_abr": 160,
+        "mpv": {"demuxer-max-bytes": "16MiB", "demuxer-readahead-secs": 60, "cache-secs": 60},
+    },
+    "best": {
+        "codecs": (),
+        "max_abr": None,
+        "mpv": {"demuxer-max-bytes": "64MiB", "demuxer-readahead-secs": 300, "cache-secs": 300},
+    },
+}
+DEFAULT_PROFILE = "balanced"
+
+def get_profile(name):
+    return PROFILES.get(name) or PROFILES[DEFAULT_PROFILE]
+
+def mpv_args(name):
+    return [f"--{k}={v}" for k, v in get_profile(name)["mpv"].items()]
+
+def _abr(f):
+    return f.get("abr") or f.get("tbr") or 0
+
+def _audio_only(f):
+    return (f.get("url") and f.get("acodec") not in (None, "none")
+            and f.get("vcodec") in (None, "none"))
+
+def select_format(formats, name):
+    # format dict from yt-dlp's "formats" for profile `name`, None to leave it to yt-dlp
+    p = get_profile(name)
+    audio = [f for f in formats or () if _audio_only(f)]
+    plain = [f for f in audio if str(f.get("protocol") or "https").startswith("http")]
+    audio = plain or audio      # a single file over manifests, mpv reads it with fewer requests
+    if not audio:
+        return None
+    cap, codecs = p["max_abr"], p["codecs"]
+
+    def rank(f):
+        abr = _abr(f)
+        within = cap is None or abr <= cap
+        acodec = f.get("acodec") or ""
+        codec = next((i for i, c in enumerate(codecs) if acodec.startswith(c)), len(codecs))
+        # under the cap: best bitrate of the preferred codec; all over it: the smallest
+        return (not within, codec if within else 0, -abr if within else abr)
+    return min(audio, key=rank)
+
+def format_bytes(f, duration=None):
+    # size of a format as yt-dlp knows it, or estimated from its bitrate
+    size = f.get("filesize") or f.get("filesize_approx")
+    if size:
+        return int(size)
+    if duration and _abr(f):
+        return int(_abr(f) * 1000 / 8 * duration)
+    return None
+
+
+class StreamStats:
+    # what playback cost under one profile; written by the player's owner thread
+    def __init__(self, profile):
+        self.profile = profile
+        self.tracks = 0
+        self.bytes = 0
+        self.secs = 0.0             # played seconds of the tracks counted in bytes
+        self.rebuffers = 0
+        self.stall_secs = 0.0
+        self.recent = deque(maxlen=50)     # (bytes, secs, complete) per track
+
+    def track(self, nbytes, secs, complete):
+        if not nbytes:
+            return
+        self.tracks += 1
+        self.bytes += int(nbytes)
+        self.secs += secs or 0
+        self.recent.append((int(nbytes), secs, complete))
+
+    def rebuffer(self, secs):
+        self.rebuffers += 1
+        self.stall_secs += secs
+
+    def summary(self):
+        return {
+            "profile": self.profile,
+            "tracks": self.tracks,
+            "bytes": self.bytes,
+            "bytes_per_track": self.bytes // self.tracks if self.tracks else None,
+            "mb_per_hour": self.bytes / self.secs * 3600 / 1e6 if self.secs else None,
+            "rebuffers": self.rebuffers,
+            "stall_secs": round(self.stall_secs, 2),
+        }
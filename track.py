@@ -0,0 +1,126 @@
+# track.py
+import random
+from array import array
+from utils import video_id
+
+def parse_duration(s):
+    # "3:07" / "1:02:03" -> seconds, None if unknown ("??:??")
+    if isinstance(s, (int, float)):
+        return int(s)
+    try:
+        secs = 0
+        for part in str(s).split(":"):
+            secs = secs * 60 + int(part)
+        return secs
+    except ValueError:
+        return None
+
+def format_duration(secs):
+    if secs is None:
+        return "??:??"
+    h, rest = divmod(int(secs), 3600)
+    m, s = divmod(rest, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+
+class Track:
+    # one queue entry; youtube urls are kept as the 11-char id only
+    __slots__ = ("title", "duration", "vid", "src")
+
+    def __init__(self, title, url, duration=None):
+        vid = video_id(url)
+        self.title = title
+        self.duration = duration    # seconds or None
+        self.vid = vid if vid != url else None
+        self.src = None if self.vid else url
+
+    @property
+    def url(self):
+        return f"https://www.youtube.com/watch?v={self.vid}" if self.vid else self.src
+
+    @property
+    def local(self):
+        # a file from the local library, played without yt-dlp
+        return self.src is not None and self.src.startswith("/")
+
+    @property
+    def key(self):
+        # cache key: video id, or the url for anything that isn't youtube
+        return self.vid or self.src
+
+    @property
+    def duration_str(self):
+        return format_duration(self.duration)
+
+    @classmethod
+    def from_item(cls, item):
+        # (title, duration_str, url) as returned by search_youtube / fetch_info
+        t, d, u = item
+        return cls(t, u, parse_duration(d))
+
+    @classmethod
+    def from_dict(cls, d):
+        dur = d.get("duration")
+        if dur is None:
+            dur = parse_duration(d.get("duration_str"))
+        return cls(d.get("title") or d["url"], d["url"], dur)
+
+    def to_dict(self):
+        return {"title": self.title, "duration_str": self.duration_str, "url": self.url, "duration": self.duration}
+
+    def __repr__(self):
+        return f"Track({self.title!r}, {self.url!r}, {self.duration!r})"
+
+
+class ShuffleOrder:
+    # Permutation of queue indices, drawn lazily (Fisher-Yates one step at a
+    # time) so turning shuffle on costs two array copies, not a full shuffle,
+    # and next/prev/jump are O(1). The queue itself is never reordered.
+    def __init__(self, n, current=-1):
+        self.order = array("l", range(n))    # position -> queue index
+        self.where = array("l", range(n))    # queue index -> position
+        self.drawn = 0                       # positions < drawn are fixed
+        self.pos = -1
+        if 0 <= current < n:
+            self.jump(current)
+
+    def __len__(self):
+        return len(self.order)
+
+    def _swap(self, a, b):
+        o, w = self.order, self.where
+        ia, ib = o[a], o[b]
+        o[a], o[b] = ib, ia
+        w[ia], w[ib] = b, a
+
+    def _draw(self, p):
+        n = len(self.order)
+        while self.drawn <= p and self.drawn < n:
+            self._swap(self.drawn, random.randrange(self.drawn, n))
+            self.drawn += 1
+
+    def peek(self, step, wrap=False):
+        # queue index `step` positions away from the current one, or None
+        p = self.pos + step
+        n = len(self.order)
+        if not 0 <= p < n:
+            if not wrap or n == 0:
+                return None
+            p %= n
+        self._draw(p)
+        return self.order[p]
+
+    def jump(self, index):
+        # make `index` the current track; an undrawn one becomes the next draw
+        p = self.where[index]
+        if p >= self.drawn:
+            self._swap(self.drawn, p)
+            p = self.drawn
+            self.drawn += 1
+        self.pos = p
+
+    def extend(self, n):
+        # queue grew to n entries; new ones land in the undrawn part
+        for i in range(len(self.order), n):
+            self.order.append(i)
+            self.where.append(i)
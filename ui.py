@@ -1,10 +1,21 @@
 # ui.py
+import os
 import curses
+import signal
+import selectors
 import threading
 import time
-import random
 from utils import format_time
-from playlists import save_playlist_to, load_playlist_from
+from playlists import save_playlist_to, load_playlist_from, iter_playlist_batches
+from search import Searcher
+from metrics import SPANS
+from importer import CollectionImport
+from miniytdlp import is_collection_url
+from player import is_url
+from queueindex import QueueIndex
+from listview import ListView, clip, fit, text_width
+from config import load_config
+from memwatch import rss_bytes
 
 ASCII_ART = [
 r"  __   __  ___  __  __  ___  ",
@@ -14,7 +25,18 @@ r"|  _||  _|| |_| | |  | | |_| |",
 r"|_|  |_|   \___/|_|  |_|\___/ "
 ]
 
+CONTROLS = "Controls: L Queue | A Add | / Search | Space Pause | Enter Play | N Next | B Prev | R RepeatSong | T RepeatPlaylist | H Shuffle | E Radio | V Volume | S Save | O Load | W Offline | X StopDL | F Jump | D Debug | M Perf | Q Quit"
+
+MARQUEE_INTERVAL = 0.4
+
+# screen regions; only dirty ones get re-rendered
+REGIONS = ("header", "body", "perf", "bar", "message", "controls", "debug")
+
 class TUI:
+    _DRAW = {"header": "draw_header", "body": "draw_body", "bar": "draw_playing_bar",
+             "message": "draw_message", "controls": "draw_controls", "debug": "draw_debug",
+             "perf": "draw_perf"}
+
     def __init__(self, stdscr, player):
         self.stdscr = stdscr
         self.player = player
@@ -22,11 +44,112 @@ class TUI:
         self.cursor = 0
         self.scroll = 0
         self.running = True
-        self.marquee_offsets = {}
+        self.stop_on_quit = True    # False when attached to a daemon: Q only detaches
+        self.marquee_offsets = {}   # slot ("row", "now") -> [offset, text scrolled]
         self.search_results = []
         self.search_selected = set()
+        # virtualized rows, laid out once per (entry, state) at this width
+        self.queue_view = ListView(self._queue_row)
+        self.search_view = ListView(self._search_row)
         self.search_query = ""
-        self.message = ""
+        self._saved_playlist = (None, None)     # (path, queue list as saved)
+        self._load_gen = 0
+        self._import = None     # running playlist/channel import
+        self._visible = (0, 0)  # queue rows last drawn
+        # fuzzy jump-to-track; the index follows the queue from its own thread.
+        # low-memory: only built while the jump screen is open
+        self.lazy_index = bool(load_config()["low_memory"])
+        memwatch = getattr(player, "memwatch", None)
+        if memwatch is not None:
+            memwatch.add_trimmer(self._trim)
+        self.jump_index = QueueIndex()
+        self.jump_typing = False
+        self.jump_query = ""
+        self.jump_results = []  # [(score, queue index)]
+        self.jump_sel = 0
+        self._index_dirty = threading.Event()
+        self._index_dirty.set()
+        threading.Thread(target=self._index_loop, daemon=True).start()
+        self.search_typing = False
+        self.search_busy = False
+        self.searcher = Searcher(
+            lambda q, on_result: player.fetch_info(q, max_results=8, on_result=on_result),
+            self._on_search_update,
+        )
+        self._message = ""
+        self._shown_error = None    # player error already put on the message line
+        self.debug = False
+        self.perf = False       # hot-path latency panel above the playing bar
+        self.stats = {"frames": 0, "wakeups": 0, "idle_wakeups": 0, "lines": 0,
+                      "frame_ms": 0.0, "frame_ms_avg": 0.0, "frame_ms_max": 0.0}
+        self._dirty = set(REGIONS)
+        self._dirty_lock = threading.Lock()    # wake() adds from other threads
+        self._lines = {}        # y -> (text, attr) as last written
+        self._size = (0, 0)
+        self._marquee_regions = set()   # regions with scrolling text
+        self._drawing = None
+        self._resized = False
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        player.add_listener(self._on_player_change)
+
+    @property
+    def message(self):
+        return self._message
+
+    @message.setter
+    def message(self, text):
+        # workers set this from other threads
+        self._message = text
+        self.wake("message")
+
+    def mark(self, *regions):
+        with self._dirty_lock:
+            self._dirty.update(regions)
+
+    def wake(self, *regions):
+        self.mark(*regions)
+        self._poke()
+
+    def _poke(self):
+        try:
+            os.write(self._wake_w, b"x")
+        except (BlockingIOError, OSError):
+            pass
+
+    def _on_player_change(self, what):
+        err = self.player.snapshot().error
+        if err is not None and err != self._shown_error:
+            self._shown_error = err
+            self.message = f"Error: {err}"
+        if what == "downloads":
+            self._on_download_progress()
+        elif what == "progress":
+            self.wake("bar")
+        else:
+            if what == "queue":
+                self._index_dirty.set()
+            self.wake("bar", "body")
+
+    def _trim(self):
+        # memory budget exceeded (memwatch thread): from now on the jump index
+        # only lives while it's used
+        self.lazy_index = True
+        self._index_dirty.set()
+
+    def _index_loop(self):
+        while True:
+            self._index_dirty.wait()
+            self._index_dirty.clear()
+            if self.lazy_index and self.screen != "jump":
+                if len(self.jump_index):
+                    self.jump_index.clear()
+                continue
+            self.jump_index.sync(self.player.snapshot().queue)
+            if self.jump_typing and self.jump_query:
+                self._run_jump()    # results may have been from a partial index
+                self.wake("body")
 
     def start(self):
         curses.curs_set(0)
@@ -38,229 +161,580 @@ class TUI:
         curses.init_pair(4, curses.COLOR_RED, -1)
         curses.init_pair(5, curses.COLOR_MAGENTA, -1)
         self.stdscr.nodelay(True)
-        self.loop()
+        self.stdscr.keypad(True)
+        curses.set_escdelay(25)
+        prev = signal.signal(signal.SIGWINCH, self._on_sigwinch)
+        try:
+            self.loop()
+        finally:
+            signal.signal(signal.SIGWINCH, prev)
+
+    def _on_sigwinch(self, signum, frame):
+        # runs on the main thread, maybe inside mark()/render(): no lock here
+        self._resized = True
+        self._poke()
 
-    def _marquee(self, key, text, width):
-        if len(text) <= width:
+    def _marquee(self, slot, text, width):
+        # one offset per screen slot, restarted when another text lands in it
+        if text_width(text) <= width:
             return text
-        off = self.marquee_offsets.get(key, 0)
-        view = text[off:off+width]
-        off = (off + 1) % (len(text))
-        self.marquee_offsets[key] = off
-        return view
+        self._marquee_regions.add(self._drawing)
+        st = self.marquee_offsets.get(slot)
+        if st is None or st[1] != text:
+            st = self.marquee_offsets[slot] = [0, text]
+        off = st[0] % len(text)
+        return clip(text[off:], width)
+
+    def _tick_marquee(self):
+        for st in self.marquee_offsets.values():
+            st[0] = (st[0] + 1) % 200
+        self.mark(*self._marquee_regions)
+
+    # --- line-level differential output ---
+    def _put(self, y, text, attr=0):
+        h, w = self._size
+        if y < 0 or y >= h:
+            return
+        text = fit(text, w-1)     # by terminal cells: wide chars past the edge make curses raise
+        if self._lines.get(y) == (text, attr):
+            return
+        self._lines[y] = (text, attr)
+        try:
+            self.stdscr.addstr(y, 0, text, attr)
+        except curses.error:
+            pass
+        self.stats["lines"] += 1
 
-    def draw_home(self, h, w):
+    def invalidate(self):
+        self._lines.clear()
+        self.stdscr.erase()
+        self.mark(*REGIONS)
+
+    # --- regions ---
+    def draw_header(self, h, w):
+        self._put(0, "🎵 Termux Music Player (Home L:Queue A:Add /:Search Q:Quit)", curses.color_pair(1))
+
+    def draw_body(self, h, w):
+        rows = {}
+        if self.screen == "home":
+            self.draw_home(rows, h, w)
+        elif self.screen == "queue":
+            self.draw_queue(rows, h, w)
+        elif self.screen == "search":
+            self.draw_search(rows, h, w)
+        elif self.screen == "jump":
+            self.draw_jump(rows, h, w)
+        for y in range(1, self._body_end(h)):
+            text, attr = rows.get(y, ("", 0))
+            self._put(y, text, attr)
+
+    def draw_home(self, rows, h, w):
         y = 2
         for line in ASCII_ART:
-            self.stdscr.addstr(y, max(0,(w - len(line))//2), line, curses.color_pair(5))
+            rows[y] = (" " * max(0, (w - len(line))//2) + line, curses.color_pair(5))
             y += 1
-        self.stdscr.addstr(y+1, max(0,(w-30)//2), "Press L for Queue, A Add, / Search, Q Quit", curses.color_pair(1))
-
-    def draw_queue(self, h, w):
-        self.stdscr.addstr(1, 0, "Queue (↑↓ navigate, Enter play, R repeat, T repeat playlist, H shuffle, Space pause)".ljust(w), curses.color_pair(1))
-        q = self.player.queue
-        start = max(0, self.cursor - (h-10)//2)
-        for i in range(start, min(len(q), start + (h-10))):
-            t = q[i]["title"]
-            d = q[i].get("duration_str", "")
-            key = f"q{i}"
-            marker = "➤ " if i == self.cursor else "  "
-            display = self._marquee(key, t, w-20) if i == self.cursor else t[:w-20]
-            color = curses.color_pair(3) if i == self.player.idx else curses.color_pair(2)
-            line = f"{marker}{display} ({d})"
-            self.stdscr.addstr(3 + i - start, 0, line[:w-1], color)
+        rows[y+1] = (" " * max(0, (w-30)//2) + "Press L for Queue, A Add, / Search, Q Quit", curses.color_pair(1))
+
+    def draw_queue(self, rows, h, w):
+        rows[1] = ("Queue (↑↓ navigate, Enter play, R repeat, T repeat playlist, H shuffle, Space pause)", curses.color_pair(1))
+        snap = self.player.snapshot()
+        q = snap.queue
+        visible = self._body_end(h) - 5
+        cursor = self.cursor
+        view = self.queue_view.rows(q, w, visible, lambda i: i == cursor, cursor=cursor)
+        start = self.queue_view.top
+        end = start + len(view)
+        if (start, end) != self._visible:
+            self._visible = (start, end)
+            self.player.set_visible(start, end)
+        for i, text in view:
+            if i == cursor and text_width(q[i].title) > w-20:
+                text = f"➤ {self._marquee('row', q[i].title, w-20)} ({q[i].duration_str})"
+            color = curses.color_pair(3) if i == snap.idx else curses.color_pair(2)
+            rows[3 + i - start] = (text, color)
+
+    def _queue_row(self, track, i, w, is_cursor):
+        marker = "➤ " if is_cursor else "  "
+        return f"{marker}{clip(track.title, w-20)} ({track.duration_str})"
+
+    def _search_row(self, item, i, w, state):
+        t, d, u = item  # tuple
+        mark = "[x]" if state[1] else "[ ]"
+        where = "" if is_url(u) else " [local]"
+        return f"{i+1}. {mark} {clip(t, w-24-len(where))} ({d}){where}"
 
     def draw_playing_bar(self, h, w):
-        if 0 <= self.player.idx < len(self.player.queue):
-            cur = self.player.queue[self.player.idx]
-            title = cur["title"]
+        snap = self.player.snapshot()
+        if 0 <= snap.idx < len(snap.queue):
+            cur = snap.queue[snap.idx]
+            title = cur.title
             s = f"Now: {title}"
-            s_trunc = s if len(s) < w-2 else self._marquee("now", s, w-10)
-            self.stdscr.addstr(h-4, 0, s_trunc.ljust(w-1), curses.color_pair(3))
-            if self.player.duration:
-                dur = self.player.duration
-                elapsed = self.player.elapsed
+            s_trunc = s if text_width(s) < w-2 else self._marquee("now", s, w-10)
+            self._put(h-4, s_trunc, curses.color_pair(3))
+            # mpv's duration, else what the queue entry knows
+            dur = snap.duration or (0 if snap.loading else cur.duration)
+            if dur:
+                elapsed = snap.elapsed
                 barlen = max(10, w-30)
-                filled = int(barlen * (elapsed / dur))
+                filled = min(barlen, int(barlen * (elapsed / dur)))
                 bar = "█"*filled + "-"*(barlen-filled)
                 times = f"{format_time(elapsed)}/{format_time(dur)}"
-                self.stdscr.addstr(h-3, 0, f"[{bar}] {times}".ljust(w-1))
+                if snap.paused:
+                    times += " [paused]"
+                self._put(h-3, f"[{bar}] {times}")
             else:
-                if self.player.loading:
-                    self.stdscr.addstr(h-3, 0, "[Loading...]".ljust(w-1), curses.color_pair(2))
+                if snap.loading:
+                    self._put(h-3, "[Loading...]", curses.color_pair(2))
                 else:
-                    self.stdscr.addstr(h-3, 0, "[--:--/--:--]".ljust(w-1))
+                    self._put(h-3, "[--:--/--:--]")
+        else:
+            self._put(h-4, "")
+            self._put(h-3, "")
 
     def draw_message(self, h, w):
-        if self.message:
-            self.stdscr.addstr(h-2, 0, self.message[:w-1], curses.color_pair(4))
+        self._put(h-2, self.message, curses.color_pair(4))
+
+    def draw_controls(self, h, w):
+        self._put(h-1, CONTROLS, curses.color_pair(5))
+
+    def draw_debug(self, h, w):
+        if not self.debug:
+            self._put(h-5, "")
+            return
+        st = self.stats
+        self._put(h-5, f"[debug] frames {st['frames']} wakeups {st['wakeups']} idle {st['idle_wakeups']} "
+                       f"lines {st['lines']} frame {st['frame_ms']:.2f}ms avg {st['frame_ms_avg']:.2f}ms "
+                       f"max {st['frame_ms_max']:.2f}ms rss {(rss_bytes() or 0) / 1e6:.1f}MB", curses.color_pair(2))
+
+    def _body_end(self, h):
+        # first row below the body; the perf panel takes the rows above debug
+        return h-5 - (len(SPANS) + 1 if self.perf else 0)
+
+    def draw_perf(self, h, w):
+        if not self.perf:
+            return
+        y = self._body_end(h)
+        if y < 2:
+            return      # terminal too small for the panel
+        summary = self.player.metrics.summary()
+        self._put(y, f"[perf] {'span':<14}{'n':>6}{'p50':>9}{'p95':>9}{'max':>9}{'last':>9}", curses.color_pair(1))
+        for i, name in enumerate(SPANS, 1):
+            st = summary.get(name)
+            if not st or not st["count"]:
+                self._put(y + i, f"       {name:<14}{0:>6}", curses.color_pair(2))
+                continue
+            vals = "".join(f"{st[k] * 1000:>7.0f}ms" for k in ("p50", "p95", "max", "last"))
+            self._put(y + i, f"       {name:<14}{st['count']:>6}{vals}", curses.color_pair(2))
+
+    def draw_jump(self, rows, h, w):
+        rows[1] = (f"Jump: {self.jump_query}_  (type to filter, ↑↓ pick, Enter go, Esc cancel)", curses.color_pair(1))
+        q = self.player.snapshot().queue
+        if self.jump_query and not self.jump_results:
+            rows[3] = ("  no match", curses.color_pair(2))
+        for k, (_, i) in enumerate(self.jump_results[:self._body_end(h) - 4]):
+            if i >= len(q):
+                continue
+            marker = "➤ " if k == self.jump_sel else "  "
+            color = curses.color_pair(3) if k == self.jump_sel else curses.color_pair(2)
+            rows[3 + k] = (f"{marker}{i+1:>6}. {clip(q[i].title, w-16)}", color)
+
+    def draw_search(self, rows, h, w):
+        if self.search_typing:
+            rows[2] = (f"Search: {self.search_query}_  (type to search, Enter done, Esc cancel)", curses.color_pair(1))
+        else:
+            rows[2] = (f"Search results for '{self.search_query}' (press numbers to toggle select, A to add, / edit)", curses.color_pair(1))
+        if self.search_busy:
+            rows[3] = ("  searching...", curses.color_pair(2))
+        sel = self.search_selected
+        view = self.search_view.rows(self.search_results, w, self._body_end(h) - 4,
+                                     lambda i: (i, i in sel))
+        for i, text in view:
+            rows[4 + i - self.search_view.top] = (text, curses.color_pair(2))
+
+    def render(self):
+        t0 = time.perf_counter()
+        if self._resized:
+            self._resized = False
+            try:
+                cols, lines = os.get_terminal_size(0)
+                curses.resizeterm(lines, cols)
+            except OSError:
+                pass
+        size = self.stdscr.getmaxyx()
+        if size != self._size:
+            self._size = size
+            self.invalidate()
+        h, w = size
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        if self.debug:
+            dirty.add("debug")
+        if self.perf:
+            dirty.add("perf")
+        for region in REGIONS:
+            if region in dirty:
+                self._drawing = region
+                self._marquee_regions.discard(region)
+                getattr(self, self._DRAW[region])(h, w)
+        self._drawing = None
+        self.stdscr.noutrefresh()
+        curses.doupdate()
+        ms = (time.perf_counter() - t0) * 1000
+        st = self.stats
+        st["frames"] += 1
+        st["frame_ms"] = ms
+        st["frame_ms_avg"] = ms if st["frames"] == 1 else st["frame_ms_avg"] * 0.9 + ms * 0.1
+        st["frame_ms_max"] = max(st["frame_ms_max"], ms)
 
-    def draw_search(self, h, w):
-        self.stdscr.addstr(2, 0, f"Search results for '{self.search_query}' (press numbers to toggle select, A to add)".ljust(w), curses.color_pair(1))
-        for i, item in enumerate(self.search_results):
-            mark = "[x]" if i in self.search_selected else "[ ]"
-            t, d, u = item  # tuple
-            line = f"{i+1}. {mark} {t} ({d})"
-            self.stdscr.addstr(4+i, 0, line[:w-1], curses.color_pair(2))
+    def _drain_wake(self):
+        try:
+            while os.read(self._wake_r, 512):
+                pass
+        except (BlockingIOError, OSError):
+            pass
 
     def loop(self):
-        last_check = 0
-        while self.running:
-            self.stdscr.erase()
-            h, w = self.stdscr.getmaxyx()
-            self.stdscr.addstr(0, 0, "🎵 Termux Music Player (Home L:Queue A:Add /:Search Q:Quit)".ljust(w), curses.color_pair(1))
-
-            if self.screen == "home":
-                self.draw_home(h, w)
-            elif self.screen == "queue":
-                self.draw_queue(h, w)
-            elif self.screen == "search":
-                self.draw_search(h, w)
-
-            self.draw_playing_bar(h, w)
-            controls = "Controls: L Queue | A Add | / Search | Space Pause | Enter Play | N Next | B Prev | R RepeatSong | T RepeatPlaylist | H Shuffle | V Volume | S Save | O Load | Q Quit"
-            self.stdscr.addstr(h-1, 0, controls[:w-1], curses.color_pair(5))
-            self.draw_message(h, w)
-            self.stdscr.refresh()
-
-            now = time.time()
-            if now - last_check > 0.4:
-                last_check = now
-                if not self.player.playing and not self.player.loading and self.player.idx != -1:
-                    if self.player.repeat_song:
-                        self.player.play_index(self.player.idx)
-                    elif self.player.idx + 1 < len(self.player.queue):
-                        self.player.play_index(self.player.idx + 1)
-                    elif self.player.repeat_playlist and self.player.queue:
-                        self.player.play_index(0)
-                for k in list(self.marquee_offsets.keys()):
-                    self.marquee_offsets[k] = (self.marquee_offsets.get(k,0)+1) % 200
+        sel = selectors.DefaultSelector()
+        sel.register(0, selectors.EVENT_READ, "input")
+        sel.register(self._wake_r, selectors.EVENT_READ, "wake")
+        warmed = False
+        try:
+            while self.running:
+                if self._resized:
+                    self.mark(*REGIONS)
+                if self._dirty:
+                    self.render()
+                if not warmed:
+                    warmed = True
+                    self.player.warm()
+                timeout = MARQUEE_INTERVAL if self._marquee_regions else None
+                events = sel.select(timeout)
+                self.stats["wakeups"] += 1
+                if not events:
+                    self._tick_marquee()
+                for key, _ in events:
+                    if key.data == "wake":
+                        self._drain_wake()
+                    else:
+                        self._read_input()
+                if not self._dirty:
+                    self.stats["idle_wakeups"] += 1
+        finally:
+            sel.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
 
+    def _read_input(self):
+        while self.running:
             try:
-                ch = self.stdscr.getch()
-            except Exception:
-                ch = -1
-            if ch == -1:
-                time.sleep(0.05)
+                ch = self.stdscr.get_wch()
+            except curses.error:
+                return
+            if isinstance(ch, str) and self.search_typing:
+                self.handle_search_char(ch)
+                continue
+            if self.jump_typing:
+                self.handle_jump_char(ch)
                 continue
+            if isinstance(ch, str):
+                if len(ch) != 1:
+                    continue
+                ch = ord(ch)
+            if self.search_typing and ch in (curses.KEY_BACKSPACE, curses.KEY_DC):
+                self.handle_search_char("\x7f")
+                continue
+            self.handle_key(ch)
 
-            if ch in (ord('q'), ord('Q')):
-                self.player.stop()
-                self.running = False
-                break
-            elif ch in (ord('l'), ord('L')):
-                self.screen = "queue"
-            elif ch in (ord('h'), ord('H')):
-                self.player.shuffle = not self.player.shuffle
-                if self.player.shuffle:
-                    random.shuffle(self.player.queue)
-                self.message = f"Shuffle = {self.player.shuffle}"
-            elif ch in (ord('a'), ord('A')):
+    # --- playlists (off the ui thread) ---
+    def save_playlist(self, pth, queue):
+        prev_path, prev_queue = self._saved_playlist
+        previous = prev_queue if prev_path == pth else None
+        self.message = f"Saving {pth}..."
+        def save_worker():
+            try:
+                out = save_playlist_to(pth, queue, previous=previous)
+            except OSError as e:
+                self.message = f"Save failed: {e}"
+                return
+            self._saved_playlist = (pth, queue)
+            self.message = f"Saved {out}"
+        threading.Thread(target=save_worker, daemon=True).start()
+
+    def load_playlist(self, pth):
+        # first batch replaces the queue right away, the rest streams in behind it
+        self.cancel_import()
+        self._load_gen += 1
+        gen = self._load_gen
+        self.message = f"Loading {pth}..."
+        def load_worker():
+            n = 0
+            try:
+                for batch in iter_playlist_batches(pth):
+                    if gen != self._load_gen:
+                        return
+                    if n == 0:
+                        self.player.set_queue(batch)
+                    else:
+                        self.player.append_entries(batch)
+                    n += len(batch)
+                    self.message = f"Loading {pth}... {n} items"
+            except (OSError, UnicodeDecodeError, ValueError):
+                pass
+            if gen == self._load_gen:
+                self.message = f"Loaded {n} items" if n else "Load failed/empty"
+        threading.Thread(target=load_worker, daemon=True).start()
+
+    # --- playlist / channel import ---
+    def import_collection(self, url):
+        self.cancel_import()
+        self.message = "Importing..."
+        self._import = CollectionImport(self.player, url, on_progress=self._on_import_progress).start()
+
+    def cancel_import(self):
+        imp, self._import = self._import, None
+        if imp is not None and not imp.done:
+            imp.cancel()
+            self.message = f"Import cancelled ({imp.added} added)"
+
+    def _on_import_progress(self, imp):
+        # import thread
+        if imp is not self._import:
+            return
+        name = imp.title or imp.url
+        dupes = f", {imp.dupes} already queued" if imp.dupes else ""
+        if not imp.done:
+            self.message = f"Importing {name}: {imp.added} added{dupes} (C cancels)"
+        elif imp.error and not imp.added:
+            self.message = f"Import failed: {imp.error}"
+        else:
+            self.message = f"Imported {imp.added} from {name}{dupes}"
+
+    # --- offline downloads ---
+    def download_offline(self, pth, queue):
+        # a saved playlist (read off the ui thread) or the queue as it is now
+        self.message = f"Reading {pth}..." if pth else "Queueing downloads..."
+        def worker():
+            tracks = load_playlist_from(pth) if pth else queue
+            if not tracks:
+                self.message = f"Offline: nothing to download in {pth}" if pth else "Offline: queue is empty"
+                return
+            n = self.player.download_offline(tracks)
+            if not n:
+                self.message = f"Offline: all {len(tracks)} already downloaded"
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _on_download_progress(self):
+        # player owner thread (or the daemon connection)
+        st = self.player.download_status()
+        if not st or not st["total"]:
+            return
+        finished = st["done"] + st["failed"]
+        failed = f", {st['failed']} failed" if st["failed"] else ""
+        if st["queued"] or st["active"]:
+            self.message = (f"Offline: {finished}/{st['total']}{failed}, {st['rate'] / 1e6:.2f} MB/s, "
+                            f"{len(st['active'])} active (X stops)")
+        else:
+            err = f" (last error: {st['error']})" if st.get("error") else ""
+            self.message = f"Offline: {st['done']}/{st['total']} downloaded{failed}{err}"
+
+    # --- type-ahead search ---
+    def _on_search_update(self, query, results, done):
+        # searcher thread
+        if query != self.search_query:
+            return
+        self.search_results = list(results)
+        self.search_selected = {i for i in self.search_selected if i < len(results)}
+        self.search_busy = not done
+        if done:
+            self.message = f"Found {len(results)} results"
+        self.wake("body")
+
+    def handle_search_char(self, ch):
+        self.mark("body")
+        if ch in ("\n", "\r"):
+            self.search_typing = False
+            return
+        if ch == "\x1b":
+            self.search_typing = False
+            if not self.search_results:
+                self.searcher.cancel()
+                self.search_busy = False
                 self.screen = "home"
-                curses.echo()
-                self.stdscr.nodelay(False)
-                self.stdscr.addstr(4,0,"Enter URL or Title: ")
-                q = self.stdscr.getstr(4, 22).decode("utf-8").strip()
-                self.stdscr.nodelay(True)
-                curses.noecho()
-                if q:
-                    self.message = "Searching..."
-                    def add_worker():
-                        items = self.player.fetch_info(q, max_results=1)
-                        if items:
-                            self.player.add_top(items[0])
-                            self.message = f"Added: {items[0][0]}"
-                        else:
-                            self.message = "Not found."
-                    threading.Thread(target=add_worker, daemon=True).start()
-            elif ch == ord('/'):
-                self.screen = "search"
-                curses.echo()
-                self.stdscr.nodelay(False)
-                self.stdscr.addstr(4,0,"Enter search query: ")
-                sq = self.stdscr.getstr(4, 20).decode("utf-8").strip()
-                curses.noecho()
-                self.stdscr.nodelay(True)
-                self.search_query = sq
-                self.search_results = []
-                self.search_selected = set()
+            return
+        if ch in ("\x7f", "\b"):
+            q = self.search_query[:-1]
+        elif ch.isprintable():
+            q = self.search_query + ch
+        else:
+            return
+        if q == self.search_query:
+            return
+        self.search_query = q
+        self.search_selected = set()
+        self.search_busy = bool(q.strip())
+        self.searcher.request(q)
+
+    # --- fuzzy jump ---
+    def _run_jump(self):
+        self.jump_results = self.jump_index.search(self.jump_query, limit=200)
+        self.jump_sel = 0
+
+    def _close_jump(self):
+        self.jump_typing = False
+        self.screen = "queue"
+        if self.lazy_index:
+            self._index_dirty.set()     # the index thread drops it
+
+    def handle_jump_char(self, ch):
+        # ch: str from get_wch, or an int key code
+        self.mark("body")
+        if ch in ("\n", "\r", curses.KEY_ENTER):
+            self._close_jump()
+            if self.jump_sel < len(self.jump_results):
+                i = self.jump_results[self.jump_sel][1]
+                if i < len(self.player.snapshot().queue):
+                    self.cursor = i
+            return
+        if ch == "\x1b":
+            self._close_jump()
+            return
+        if ch in (curses.KEY_UP, curses.KEY_DOWN):
+            step = -1 if ch == curses.KEY_UP else 1
+            self.jump_sel = max(0, min(len(self.jump_results) - 1, self.jump_sel + step))
+            return
+        if ch in ("\x7f", "\b", curses.KEY_BACKSPACE, curses.KEY_DC):
+            q = self.jump_query[:-1]
+        elif isinstance(ch, str) and ch.isprintable():
+            q = self.jump_query + ch
+        else:
+            return
+        self.jump_query = q
+        self._run_jump()
+
+    def _prompt(self, y, x, label):
+        curses.echo()
+        self.stdscr.nodelay(False)
+        self.stdscr.addstr(y, 0, label)
+        try:
+            text = self.stdscr.getstr(y, x).decode("utf-8").strip()
+        finally:
+            self.stdscr.nodelay(True)
+            curses.noecho()
+            self.invalidate()
+        return text
+
+    def handle_key(self, ch):
+        h, w = self.stdscr.getmaxyx()
+        snap = self.player.snapshot()
+        self.mark("body")
+        if ch == curses.KEY_RESIZE:
+            self._resized = True
+            self.mark(*REGIONS)
+        elif ch in (ord('q'), ord('Q')):
+            if self.stop_on_quit:
+                self.player.stop()
+            self.running = False
+        elif ch in (ord('d'), ord('D')):
+            self.debug = not self.debug
+            self.mark("debug")
+        elif ch in (ord('m'), ord('M')):
+            self.perf = not self.perf
+            self.mark("body", "perf")
+        elif ch in (ord('c'), ord('C')):
+            self.cancel_import()
+        elif ch in (ord('l'), ord('L')):
+            self.screen = "queue"
+        elif ch in (ord('f'), ord('F')):
+            self.screen = "jump"
+            self.jump_typing = True
+            self.jump_query = ""
+            self.jump_results = []
+            self.jump_sel = 0
+            if self.lazy_index:
+                self._index_dirty.set()
+        elif ch in (ord('h'), ord('H')):
+            self.player.set_shuffle(not snap.shuffle)
+            self.message = f"Shuffle = {not snap.shuffle}"
+        elif ch in (ord('a'), ord('A')) and self.screen != "search":
+            self.screen = "home"
+            q = self._prompt(4, 22, "Enter URL or Title: ")
+            if q and is_collection_url(q):
+                self.import_collection(q)
+            elif q:
                 self.message = "Searching..."
-                def search_worker():
-                    res = self.player.fetch_info(sq, max_results=8)
-                    self.search_results = res
-                    self.message = f"Found {len(res)} results"
-                threading.Thread(target=search_worker, daemon=True).start()
-            elif self.screen == "search" and ch in (ord('a'), ord('A')):
-                sel = sorted(list(self.search_selected))
-                if not sel and self.search_results:
-                    sel = [0]
-                items = [self.search_results[i] for i in sel if i < len(self.search_results)]
-                self.player.add_items(items)
-                self.message = f"Added {len(items)} items"
-                self.search_selected = set()
-                self.screen = "home"
-            elif self.screen == "search" and ord('1') <= ch <= ord('8'):
-                idx = ch - ord('1')
-                if 0 <= idx < len(self.search_results):
-                    if idx in self.search_selected:
-                        self.search_selected.remove(idx)
+                def add_worker():
+                    items = self.player.fetch_info(q, max_results=1)
+                    if items:
+                        self.player.add_top(items[0])
+                        self.message = f"Added: {items[0][0]}"
                     else:
-                        self.search_selected.add(idx)
-            elif self.screen == "queue":
-                if ch in (curses.KEY_DOWN, ord('j')):
-                    if self.cursor + 1 < len(self.player.queue):
-                        self.cursor += 1
-                elif ch in (curses.KEY_UP, ord('k')):
-                    if self.cursor > 0:
-                        self.cursor -= 1
-                elif ch in (10, 13):
-                    self.player.play_index(self.cursor)
-                elif ch in (ord('n'), ord('N')):
-                    self.player.next()
-                elif ch in (ord('b'), ord('B')):
-                    self.player.prev()
-                elif ch == ord(' '):
-                    self.player.toggle_pause()
-                elif ch in (ord('r'), ord('R')):
-                    self.player.repeat_song = not self.player.repeat_song
-                    self.message = f"RepeatSong = {self.player.repeat_song}"
-                elif ch in (ord('t'), ord('T')):
-                    self.player.repeat_playlist = not self.player.repeat_playlist
-                    self.message = f"RepeatPlaylist = {self.player.repeat_playlist}"
-                elif ch in (ord('v'), ord('V')):
-                    curses.echo()
-                    self.stdscr.nodelay(False)
-                    self.stdscr.addstr(h-6,0,"Set volume 0-100: ")
-                    v = self.stdscr.getstr(h-6, 18).decode("utf-8").strip()
-                    self.stdscr.nodelay(True)
-                    curses.noecho()
-                    try:
-                        vol = int(v)
-                        self.player.set_volume(vol)
-                        self.message = f"Volume set {vol}"
-                    except:
-                        self.message = "Invalid volume"
-                elif ch in (ord('s'), ord('S')):
-                    curses.echo()
-                    self.stdscr.nodelay(False)
-                    self.stdscr.addstr(h-6,0,"Save playlist path: ")
-                    pth = self.stdscr.getstr(h-6, 25).decode("utf-8").strip()
-                    self.stdscr.nodelay(True)
-                    curses.noecho()
-                    if pth:
-                        save_playlist_to(pth, self.player.queue)
-                        self.message = f"Saved {pth}"
-                elif ch in (ord('o'), ord('O')):
-                    curses.echo()
-                    self.stdscr.nodelay(False)
-                    self.stdscr.addstr(h-6,0,"Load playlist path: ")
-                    pth = self.stdscr.getstr(h-6, 25).decode("utf-8").strip()
-                    self.stdscr.nodelay(True)
-                    curses.noecho()
-                    if pth:
-                        loaded = load_playlist_from(pth)
-                        if loaded:
-                            self.player.queue = loaded
-                            self.message = f"Loaded {len(loaded)} items"
-                        else:
-                            self.message = "Load failed/empty"
+                        self.message = "Not found."
+                threading.Thread(target=add_worker, daemon=True).start()
+        elif ch == ord('/'):
+            if self.screen != "search":
+                self.search_query = ""
+                self.search_results = []
+                self.search_selected = set()
+            self.screen = "search"
+            self.search_typing = True
+        elif self.screen == "search" and ch in (ord('a'), ord('A')):
+            sel = sorted(list(self.search_selected))
+            if not sel and self.search_results:
+                sel = [0]
+            items = [self.search_results[i] for i in sel if i < len(self.search_results)]
+            self.player.add_items(items)
+            self.message = f"Added {len(items)} items"
+            self.search_selected = set()
+            self.screen = "home"
+        elif self.screen == "search" and ord('1') <= ch <= ord('8'):
+            idx = ch - ord('1')
+            if 0 <= idx < len(self.search_results):
+                if idx in self.search_selected:
+                    self.search_selected.remove(idx)
+                else:
+                    self.search_selected.add(idx)
+        elif self.screen == "queue":
+            if ch in (curses.KEY_DOWN, ord('j')):
+                if self.cursor + 1 < len(snap.queue):
+                    self.cursor += 1
+            elif ch in (curses.KEY_UP, ord('k')):
+                if self.cursor > 0:
+                    self.cursor -= 1
+            elif ch in (10, 13):
+                self.player.play_index(self.cursor)
+            elif ch in (ord('n'), ord('N')):
+                self.player.next()
+            elif ch in (ord('b'), ord('B')):
+                self.player.prev()
+            elif ch == ord(' '):
+                self.player.toggle_pause()
+            elif ch in (ord('r'), ord('R')):
+                self.player.set_repeat_song(not snap.repeat_song)
+                self.message = f"RepeatSong = {not snap.repeat_song}"
+            elif ch in (ord('t'), ord('T')):
+                self.player.set_repeat_playlist(not snap.repeat_playlist)
+                self.message = f"RepeatPlaylist = {not snap.repeat_playlist}"
+            elif ch in (ord('e'), ord('E')):
+                self.player.set_radio(not snap.radio)
+                self.message = f"Radio = {not snap.radio}"
+            elif ch in (ord('v'), ord('V')):
+                v = self._prompt(h-6, 18, "Set volume 0-100: ")
+                try:
+                    vol = int(v)
+                    self.player.set_volume(vol)
+                    self.message = f"Volume set {vol}"
+                except:
+                    self.message = "Invalid volume"
+            elif ch in (ord('s'), ord('S')):
+                pth = self._prompt(h-6, 25, "Save playlist path: ")
+                if pth:
+                    self.save_playlist(pth, snap.queue)
+            elif ch in (ord('o'), ord('O')):
+                pth = self._prompt(h-6, 25, "Load playlist path: ")
+                if pth:
+                    self.load_playlist(pth)
+            elif ch in (ord('w'), ord('W')):
+                pth = self._prompt(h-6, 47, "Download offline, playlist path (Enter: queue): ")
+                self.download_offline(pth, snap.queue)
+            elif ch in (ord('x'), ord('X')):
+                self.player.cancel_downloads()
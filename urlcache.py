@@ -0,0 +1,113 @@
+# urlcache.py
+import re
+import time
+import json
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+from utils import safe_write_json
+
+# kalau url gak punya expire= (bukan googlevideo), anggap valid segini
+DEFAULT_TTL = 3 * 3600
+
+_EXPIRE_PATH_RE = re.compile(r"/expire/(\d+)")
+
+def url_expiry(stream_url, default_ttl=DEFAULT_TTL):
+    # googlevideo puts expire= in the query, manifest urls put it in the path
+    parsed = urlparse(stream_url)
+    exp = parse_qs(parsed.query).get("expire")
+    if not exp:
+        m = _EXPIRE_PATH_RE.search(parsed.path)
+        exp = [m.group(1)] if m else None
+    if exp:
+        try:
+            return float(exp[0])
+        except ValueError:
+            pass
+    return time.time() + default_ttl
+
+
+class StreamCache:
+    # video id -> (stream_url, expire_ts), LRU bounded
+    def __init__(self, maxsize=256, margin=300, path=None):
+        self.maxsize = maxsize
+        self.margin = margin
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if path:
+            self.load()
+
+    def get(self, key):
+        with self._lock:
+            ent = self._entries.get(key)
+            if ent is not None:
+                if ent[1] - self.margin > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return ent[0]
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, stream_url, expire=None):
+        if expire is None:
+            expire = url_expiry(stream_url)
+        with self._lock:
+            self._entries[key] = (stream_url, expire)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        self.save()
+
+    def invalidate(self, key):
+        with self._lock:
+            removed = self._entries.pop(key, None) is not None
+        if removed:
+            self.save()
+
+    def __contains__(self, key):
+        with self._lock:
+            ent = self._entries.get(key)
+            return ent is not None and ent[1] - self.margin > time.time()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+    # --- persistence ---
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        now = time.time()
+        with self._lock:
+            for key, url, expire in data if isinstance(data, list) else []:
+                if expire - self.margin > now:
+                    self._entries[key] = (url, expire)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = [[k, u, e] for k, (u, e) in self._entries.items()]
+        with self._save_lock:
+            try:
+                safe_write_json(self.path, data)
+            except Exception:
+                pass
@@ -1,8 +1,12 @@
 # utils.py
 import time
 import os
+import re
 import tempfile
 import json
+import traceback
+
+APPNAME = "mpv_music_tui"
 
 def format_time(seconds):
     if seconds is None:
@@ -11,13 +15,43 @@ def format_time(seconds):
     m, s = divmod(seconds, 60)
     return f"{m:02d}:{s:02d}"
 
-def get_socket_path(appname="mpv_music_tui"):
+def get_socket_path(appname=APPNAME):
     # choose a socket in tempdir that hopefully works in Termux
     fn = f"{appname}_{os.getuid()}.sock"
     return os.path.join(tempfile.gettempdir(), fn)
 
+def get_config_dir(appname=APPNAME):
+    base = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    return os.path.join(base, appname)
+
+def get_cache_dir(appname=APPNAME):
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, appname)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+# only on youtube's own hosts: "v=" alone also matches "?dev=" on any site
+_VID_RE = re.compile(
+    r"^(?:https?://)?(?:(?:www|m|music)\.)?"
+    r"(?:youtube\.com/(?:watch\?(?:[^#]*&)?v=|shorts/|embed/|live/)|youtu\.be/)"
+    r"([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])", re.IGNORECASE)
+
+def video_id(url):
+    # youtube video id, or the url itself for anything else
+    m = _VID_RE.match(url or "")
+    return m.group(1) if m else url
+
 def safe_write_json(path, data):
     tmp = path + ".tmp"
     with open(tmp, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
     os.replace(tmp, path)
+
+def log_error(what):
+    # traceback of the exception being handled -> <cache>/player.log;
+    # stdout belongs to curses while the tui runs
+    try:
+        with open(os.path.join(get_cache_dir(), "player.log"), "a", encoding="utf-8") as f:
+            f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {what}\n{traceback.format_exc()}\n")
+    except OSError:
+        pass